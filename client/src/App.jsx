@@ -108,7 +108,8 @@ function MainApp() {
       console.log('Sending request to:', QUERY_URL);
       console.log('Request payload:', payload);
 
-      const response = await fetch(QUERY_URL, {
+      // Article bodies are loaded from /source when an article is opened
+      const response = await fetch(`${QUERY_URL}?fields=summary`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
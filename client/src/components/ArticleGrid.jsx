@@ -1,7 +1,7 @@
 import React, { useState } from 'react';
 import { BsBookmark, BsBookmarkFill } from 'react-icons/bs';
 
-const ArticleCard = ({ article, onArticleClick }) => {
+const ArticleCard = ({ article, copies = [], onArticleClick }) => {
   const { _id, title, source_name, political_leaning, political_score, published_date, favicon_url, og_image, url, metadata, text } = article;
   const [isBookmarked, setIsBookmarked] = useState(false);
 
@@ -169,11 +169,60 @@ const ArticleCard = ({ article, onArticleClick }) => {
             </div>
           )}
         </div>
+        {/* Near-identical copies of this article (syndicated wire stories) from other outlets */}
+        {copies.length > 0 && (
+          <div className="mt-2 text-xs text-neutral-400">
+            +{copies.length} similar:{' '}
+            {copies.map((copy, index) => (
+              <span key={copy._id || copy.url}>
+                {index > 0 && ', '}
+                <a
+                  href={copy.url}
+                  target="_blank"
+                  rel="noopener noreferrer"
+                  className="hover:text-blue-400 hover:underline"
+                  onClick={(e) => e.stopPropagation()}
+                >
+                  {cleanSourceName(copy.source_name)}
+                </a>
+              </span>
+            ))}
+          </div>
+        )}
       </div >
     </div >
   );
 };
 
+// Group near-duplicates (duplicate_of) of the same article within a column: under that
+// article when it is in the column, under the first of its copies otherwise
+const groupCopies = (articles) => {
+  const byId = new Map(articles.map(article => [article._id, article]));
+  const isCopy = (article) => Boolean(article.duplicate_of) && byId.has(article.duplicate_of);
+  const groupOf = (article) => {
+    let root = article;
+    for (let hops = 0; isCopy(root) && hops < 4; hops++) {
+      root = byId.get(root.duplicate_of);
+    }
+    return root.duplicate_of || root._id;
+  };
+  const groups = new Map();
+  articles.forEach(article => {
+    const key = groupOf(article);
+    const group = groups.get(key);
+    if (!group) {
+      groups.set(key, { article, copies: [] });
+    } else if (!isCopy(article) && isCopy(group.article)) {
+      // The group's own article comes before its copies
+      group.copies.push(group.article);
+      group.article = article;
+    } else {
+      group.copies.push(article);
+    }
+  });
+  return [...groups.values()];
+};
+
 const ArticleGrid = ({ results, isVisible, onArticleClick }) => {
   if (!results) return null;
 
@@ -186,18 +235,18 @@ const ArticleGrid = ({ results, isVisible, onArticleClick }) => {
   });
 
   // Group articles by political leaning
-  const leftArticles = filteredSources.filter(article => article.political_leaning === "left")
-    .sort((a, b) => (a.political_score || 0) - (b.political_score || 0));
+  const leftArticles = groupCopies(filteredSources.filter(article => article.political_leaning === "left"))
+    .sort((a, b) => (a.article.political_score || 0) - (b.article.political_score || 0));
 
-  const centerArticles = filteredSources.filter(article => article.political_leaning === "center")
-    .sort((a, b) => (a.political_score || 0) - (b.political_score || 0));
+  const centerArticles = groupCopies(filteredSources.filter(article => article.political_leaning === "center"))
+    .sort((a, b) => (a.article.political_score || 0) - (b.article.political_score || 0));
 
-  const rightArticles = filteredSources.filter(article => article.political_leaning === "right")
-    .sort((a, b) => (a.political_score || 0) - (b.political_score || 0));
+  const rightArticles = groupCopies(filteredSources.filter(article => article.political_leaning === "right"))
+    .sort((a, b) => (a.article.political_score || 0) - (b.article.political_score || 0));
 
   // Recalculate statistics after filtering
   const filteredStatistics = {
-    total: filteredSources.length,
+    total: leftArticles.length + centerArticles.length + rightArticles.length,
     left_count: leftArticles.length,
     center_count: centerArticles.length,
     right_count: rightArticles.length
@@ -229,10 +278,11 @@ const ArticleGrid = ({ results, isVisible, onArticleClick }) => {
           <div className="space-y-6">
             <h3 className="text-blue-500 font-medium border-b border-blue-500/50 pb-1 mb-4">Left-leaning</h3>
             {leftArticles.length > 0 ? (
-              leftArticles.map((article, index) => (
+              leftArticles.map(({ article, copies }, index) => (
                 <ArticleCard
                   key={`left-${index}`}
                   article={article}
+                  copies={copies}
                   onArticleClick={onArticleClick}
                 />
               ))
@@ -245,10 +295,11 @@ const ArticleGrid = ({ results, isVisible, onArticleClick }) => {
           <div className="space-y-6">
             <h3 className="text-purple-500 font-medium border-b border-purple-500/50 pb-1 mb-4">Center</h3>
             {centerArticles.length > 0 ? (
-              centerArticles.map((article, index) => (
+              centerArticles.map(({ article, copies }, index) => (
                 <ArticleCard
                   key={`center-${index}`}
                   article={article}
+                  copies={copies}
                   onArticleClick={onArticleClick}
                 />
               ))
@@ -261,10 +312,11 @@ const ArticleGrid = ({ results, isVisible, onArticleClick }) => {
           <div className="space-y-6">
             <h3 className="text-red-500 font-medium border-b border-red-500/50 pb-1 mb-4">Right-leaning</h3>
             {rightArticles.length > 0 ? (
-              rightArticles.map((article, index) => (
+              rightArticles.map(({ article, copies }, index) => (
                 <ArticleCard
                   key={`right-${index}`}
                   article={article}
+                  copies={copies}
                   onArticleClick={onArticleClick}
                 />
               ))
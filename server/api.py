@@ -2,27 +2,45 @@ import asyncio
 import hashlib
 import logging
 import os
-import random
 import re
+import time
+import uuid
+from contextlib import asynccontextmanager, suppress
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Optional, Tuple
 from urllib.parse import urlparse
 import bcrypt
-import httpx
-import nest_asyncio
-from bs4 import BeautifulSoup
 from dotenv import load_dotenv
-from fastapi import Body, FastAPI, HTTPException
+from fastapi import APIRouter, Body, FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
-import asyncio
-from bs4 import BeautifulSoup
-import hashlib
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
+import bson
+import orjson
 from bson.objectid import ObjectId
 
-# Enable nested asyncio for concurrent scraping
-nest_asyncio.apply()
+import cassette
+from bias_index import band_midpoint, leaning_for
+from compression import CompressionMiddleware
+from deadline import current as current_deadline, deadline_scope, stage_timeout
+from fingerprint import NearDuplicates, bands as simhash_bands
+import job_queue
+from leases import Lease
+import metrics
+from perplexity_gateway import PerplexityError, PerplexityGateway
+from perplexity_parser import parse_articles
+from prewarm import Prewarmer
+from profiling import RequestProfiler
+from query_cache import cache_key
+import query_jobs
+import server_timing
+from resources import Resources
+import scraper
+from scraper import LLM_TIMEOUT, SCRAPE_TIMEOUT
+from scrape_scheduler import LatencyTracker, ScrapeScheduler
+from shared_scrapes import SharedScrapes
+from singleflight import SingleFlight
+from url_canonical import canonical_url
 
 # Set up logging
 logging.basicConfig(
@@ -30,16 +48,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Try to use nest_asyncio if compatible with the current event loop
-try:
-    import nest_asyncio
-    nest_asyncio.apply()
-    logger_nest = logging.getLogger("nest_asyncio")
-    logger_nest.info("Successfully applied nest_asyncio")
-except (ImportError, ValueError) as e:
-    logger_nest = logging.getLogger("nest_asyncio")
-    logger_nest.warning(f"Could not apply nest_asyncio: {str(e)}. Concurrent operations may be limited.")
-
 # Load environment variables
 load_dotenv()
 
@@ -48,6 +56,87 @@ PERPLEXITY_API_KEY = os.getenv("PERPLEXITY_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 MONGODB_URL = os.getenv("MONGODB_URL")
 
+# Default end-to-end budget for /query; requests may ask for less (or more, up to the max)
+QUERY_DEADLINE_SECONDS = float(os.getenv("QUERY_DEADLINE_SECONDS", "30"))
+QUERY_DEADLINE_MAX_SECONDS = float(os.getenv("QUERY_DEADLINE_MAX_SECONDS", "120"))
+
+# Perplexity endpoint and client-side pacing per API key, for the whole server; each of the
+# WEB_CONCURRENCY workers paces itself to its share
+PERPLEXITY_API_URL = os.getenv("PERPLEXITY_API_URL", "https://api.perplexity.ai/chat/completions")
+PERPLEXITY_RATE_PER_SECOND = float(os.getenv("PERPLEXITY_RATE_PER_SECOND", "1.0"))
+PERPLEXITY_BURST = int(os.getenv("PERPLEXITY_BURST", "6"))
+PERPLEXITY_MAX_RETRIES = int(os.getenv("PERPLEXITY_MAX_RETRIES", "3"))
+
+# Opt-in request profiling: requests sending PROFILING_TOKEN in the X-Panorama-Profile header run under cProfile
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# Upstream traffic capture: "record" saves each request's outbound HTTP exchanges to CASSETTE_DIR,
+# "replay" answers them from the cassette named in the X-Panorama-Cassette header
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").lower()
+CASSETTE_DIR = os.getenv("CASSETTE_DIR", "cassettes")
+# "recorded" replays with the original latencies, "fast" without waiting
+CASSETTE_REPLAY_TIMING = os.getenv("CASSETTE_REPLAY_TIMING", "recorded")
+
+# Sources store the extracted article body as text; also keep the whole page's text as raw_text
+STORE_RAW_TEXT = os.getenv("STORE_RAW_TEXT", "false").lower() == "true"
+
+# Responses at least this large are sent brotli- or gzip-compressed to clients that accept it
+COMPRESSION_MINIMUM_BYTES = int(os.getenv("COMPRESSION_MINIMUM_BYTES", "1024"))
+# Compress source text still stored as plain text in the background at startup
+TEXT_MIGRATION_ENABLED = os.getenv("TEXT_MIGRATION_ENABLED", "true").lower() == "true"
+
+# Hand page scrapes to scrape_worker.py processes through the MongoDB job queue instead of
+# scraping in the API process
+SCRAPE_QUEUE_ENABLED = os.getenv("SCRAPE_QUEUE_ENABLED", "false").lower() == "true"
+
+# Submitted queries (POST /queries): how often event streams check for new sources, and how
+# long they may stay quiet before a keep-alive comment
+QUERY_EVENTS_POLL_INTERVAL = float(os.getenv("QUERY_EVENTS_POLL_INTERVAL", "0.5"))
+QUERY_EVENTS_KEEPALIVE = 15.0
+
+# "per_leaning" asks Perplexity once per leaning; "single" asks once for a broad pool and
+# balances it with the domain bias index, re-querying only leanings that come up short
+PERPLEXITY_MODE = os.getenv("PERPLEXITY_MODE", "per_leaning").lower()
+# Extra domain bias tables (JSON or CSV), comma-separated; later ones override the bundled table
+DOMAIN_BIAS_FILES = [path for path in os.getenv("DOMAIN_BIAS_FILES", "").split(",") if path.strip()]
+
+# Cached /query results are served for this long; 0 turns the cache off
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "900"))
+# Pre-warming: every PREWARM_INTERVAL_SECONDS, refresh up to PREWARM_BUDGET hot or recurring
+# searches whose cached result is older than PREWARM_REFRESH_AGE_SECONDS
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "false").lower() == "true"
+PREWARM_INTERVAL_SECONDS = float(os.getenv("PREWARM_INTERVAL_SECONDS", "300"))
+PREWARM_BUDGET = int(os.getenv("PREWARM_BUDGET", "10"))
+PREWARM_REFRESH_AGE_SECONDS = float(os.getenv("PREWARM_REFRESH_AGE_SECONDS", "600"))
+
+# Batch searches (POST /batch_query): queries per batch, queries run at a time, and page
+# scrapes run at a time across the whole batch
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "100"))
+BATCH_QUERY_CONCURRENCY = int(os.getenv("BATCH_QUERY_CONCURRENCY", "8"))
+BATCH_SCRAPE_CONCURRENCY = int(os.getenv("BATCH_SCRAPE_CONCURRENCY", "32"))
+
+# Articles are checked for near-duplicates among the sources stored this many hours back,
+# to reuse their enrichment and text; 0 only compares articles within a search or batch
+NEAR_DUPLICATE_WINDOW_HOURS = float(os.getenv("NEAR_DUPLICATE_WINDOW_HOURS", "48"))
+
+# Per-worker pools: connections for page fetches, and threads for blocking work (password hashing,
+# cassette files, compressing large responses); unset THREAD_POOL_SIZE leaves Python's default
+SCRAPE_CONNECTIONS = int(os.getenv("SCRAPE_CONNECTIONS", "100"))
+THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", "0")) or None
+# Worker processes; set it wherever several are started so per-worker limits are divided up
+# (python api.py and the Docker image use it to start them)
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+# Per-stage timeouts, each further capped by the request's remaining budget (page fetch and
+# LLM timeouts live in scraper.py)
+PERPLEXITY_TIMEOUT = 30.0
+# Share of the remaining budget a single Perplexity call may use
+PERPLEXITY_BUDGET_SHARE = 0.5
+# Leaning of candidates from the broad single-query pool, before they are classified
+ANY_LEANING = "any"
+
 if not PERPLEXITY_API_KEY:
     logger.warning("PERPLEXITY_API_KEY environment variable not set")
 if not OPENAI_API_KEY:
@@ -55,45 +144,129 @@ if not OPENAI_API_KEY:
 if not MONGODB_URL:
     logger.warning("MONGODB_URL environment variable not set")
 
-try:
-    # Import metadata extraction module
-    from metadata_extraction import extract_metadata
+# Shared, rate-limited Perplexity client; the token buckets live in this worker, so each
+# worker gets an equal share of the configured rate
+perplexity = PerplexityGateway(
+    PERPLEXITY_API_URL,
+    rate_per_second=PERPLEXITY_RATE_PER_SECOND / WEB_CONCURRENCY,
+    burst=max(1, PERPLEXITY_BURST // WEB_CONCURRENCY),
+    max_retries=PERPLEXITY_MAX_RETRIES,
+)
 
-    logger.info("Imported metadata extraction module")
-except ImportError:
-    logger.warning(
-        "Could not import metadata extraction module, will use basic extraction"
-    )
+def perplexity_gateway_metrics():
+    """Export the Perplexity gateway's own counters."""
+    yield "# HELP panorama_perplexity_gateway_events_total Perplexity gateway events by kind"
+    yield "# TYPE panorama_perplexity_gateway_events_total counter"
+    for event, count in perplexity.metrics.items():
+        yield f'panorama_perplexity_gateway_events_total{{event="{event}"}} {count}'
+    yield "# HELP panorama_perplexity_circuits_open Perplexity API keys with an open circuit breaker"
+    yield "# TYPE panorama_perplexity_circuits_open gauge"
+    open_circuits = sum(1 for state in perplexity.breaker_states().values() if state == "open")
+    yield f"panorama_perplexity_circuits_open {open_circuits}"
 
-    async def extract_metadata(text, title, url, api_key):
-        return {"title": title, "url": url}
 
+metrics.register_collector(perplexity_gateway_metrics)
 
-# Initialize FastAPI app
-app = FastAPI()
+profiler = RequestProfiler(PROFILE_DIR, PROFILING_TOKEN, enabled=PROFILING_ENABLED)
+
+# MongoDB, HTTP pools, the OpenAI client and stores; opened per worker by the lifespan
+resources = Resources()
+
+router = APIRouter()
 
-# Enable CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
-# Initialize MongoDB connection
-try:
-    mongo_client = AsyncIOMotorClient(MONGODB_URL)
-    db = mongo_client.get_default_database()  # or client['your_db_name']
-    sources_collection = db.sources  # Collection to store news responses
-    queries_collection = db.queries  # Collection to store queries
-    users_collection = db.users  # Collection to store users
-    users_collection = db.users
-    search_history_collection = db.searchHistory
-    logger.info(f"Connected to MongoDB database: {db.name}")
-except Exception as e:
-    logger.error(f"Failed to connect to MongoDB: {str(e)}")
-    raise
+async def timing_and_profiling(request: Request, call_next):
+    """Add a Server-Timing breakdown to every response and profile requests that ask for it."""
+    timing = server_timing.start()
+    profile_id = None
+    if profiler.authorized(request.headers.get("X-Panorama-Profile")):
+        response, profile_id = await profiler.run(lambda: call_next(request))
+    else:
+        response = await call_next(request)
+
+    response.headers[server_timing.HEADER] = timing.header_value()
+    response.headers["Timing-Allow-Origin"] = "*"
+    if profile_id:
+        response.headers["X-Profile-Id"] = profile_id
+    return response
+
+
+async def record_and_replay(request: Request, call_next):
+    """Capture or replay a request's upstream HTTP traffic, depending on CASSETTE_MODE."""
+    if CASSETTE_MODE == "record" and request.method == "POST":
+        tape = cassette.Cassette.new(request.method, request.url.path, await request.body())
+        with cassette.recording(tape):
+            response = await call_next(request)
+        if tape.interactions:
+            try:
+                await asyncio.to_thread(tape.save, CASSETTE_DIR)
+                response.headers[cassette.RESPONSE_HEADER] = tape.id
+            except OSError as e:
+                logger.error(f"Could not save cassette {tape.id}: {str(e)}")
+        return response
+
+    cassette_id = request.headers.get(cassette.REQUEST_HEADER)
+    if CASSETTE_MODE == "replay" and cassette_id:
+        try:
+            tape = await asyncio.to_thread(cassette.Cassette.load, CASSETTE_DIR, cassette_id)
+        except (OSError, ValueError):
+            return JSONResponse(status_code=404, content={"detail": f"Cassette not found: {cassette_id}"})
+        realtime = request.headers.get(cassette.TIMING_HEADER, CASSETTE_REPLAY_TIMING) != "fast"
+        with cassette.replaying(tape, realtime=realtime):
+            response = await call_next(request)
+        if tape.unmatched:
+            logger.warning(f"Replay of cassette {tape.id} made {tape.unmatched} requests it has no recording for")
+        response.headers[cassette.RESPONSE_HEADER] = tape.id
+        return response
+
+    return await call_next(request)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open this worker's resources, start background maintenance, and close it all on shutdown."""
+    await resources.open(
+        MONGODB_URL,
+        openai_api_key=OPENAI_API_KEY,
+        scrape_connections=SCRAPE_CONNECTIONS,
+        threads=THREAD_POOL_SIZE,
+        scrape_timeout=SCRAPE_TIMEOUT,
+        query_cache_ttl=QUERY_CACHE_TTL_SECONDS,
+        near_duplicate_window=NEAR_DUPLICATE_WINDOW_HOURS * 3600,
+        domain_bias_files=DOMAIN_BIAS_FILES,
+    )
+    text_migration = None
+    if TEXT_MIGRATION_ENABLED:
+        # Compress sources still stored as plain text, without holding up startup; one worker does it
+        lease = Lease(resources.leases_collection, "text_migration")
+        text_migration = asyncio.create_task(resources.text_store.maintain(resources.sources_collection, lease))
+    prewarming = None
+    if PREWARM_ENABLED and PERPLEXITY_API_KEY and QUERY_CACHE_TTL_SECONDS > 0:
+        # Refreshes run on the server's API key, from one worker at a time
+        prewarm_lease = Lease(resources.leases_collection, "prewarm", ttl=2 * PREWARM_INTERVAL_SECONDS)
+        prewarmer = Prewarmer(
+            resources.query_cache,
+            resources.users_collection,
+            refresh_cached_query,
+            normalize_query,
+            prewarm_lease,
+            interval=PREWARM_INTERVAL_SECONDS,
+            budget=PREWARM_BUDGET,
+            refresh_age=PREWARM_REFRESH_AGE_SECONDS,
+        )
+        prewarming = asyncio.create_task(prewarmer.run())
+    try:
+        yield
+    finally:
+        for task in (text_migration, prewarming):
+            if task is not None:
+                task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+        if prewarming is not None:
+            await prewarm_lease.release()
+        await perplexity.aclose()
+        await resources.aclose()
 
 
 # Define request and response models
@@ -102,12 +275,23 @@ class NewsRequest(BaseModel):
     limit: Optional[int] = 27  # Default to 12 articles
     api_key: Optional[str] = None
     user_id: Optional[str] = None
+    deadline_ms: Optional[int] = None  # Response time budget; server default if unset
+    incremental: bool = True  # Serve the cached result or reuse its still-valid sources; False rebuilds
+
+class BatchNewsRequest(BaseModel):
+    queries: List[str] = Field(min_length=1, max_length=BATCH_MAX_QUERIES)
+    limit: Optional[int] = 27  # Articles per query
+    api_key: Optional[str] = None
+    deadline_ms: Optional[int] = None  # Time budget of each query
 
 class FollowUpRequest(BaseModel):
     question: str
 
 
 class NewsSource(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: Optional[str] = Field(default=None, alias="_id")  # For /source/{id}
     title: str
     url: str
     source_name: str
@@ -120,6 +304,7 @@ class NewsSource(BaseModel):
     og_image: Optional[str] = None
     text: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = None
+    duplicate_of: Optional[str] = None  # Source this one is a near-duplicate of, sharing its text
 
 
 class NewsResponse(BaseModel):
@@ -127,6 +312,7 @@ class NewsResponse(BaseModel):
     sources: List[NewsSource]
     statistics: Dict[str, int]
     timeline_positioning: Optional[Dict[str, float]] = None
+    partial: bool = False  # Deadline cut scraping short or skipped some enrichment
 
 class RegisterRequest(BaseModel):
     email: str
@@ -208,34 +394,34 @@ def clean_source_formatting(source_data: Dict[str, Any]) -> Dict[str, Any]:
     return cleaned
 
 
-@app.get("/")
+@router.get("/")
 async def root():
     return {"message": "News Political Spectrum API", "status": "running"}
 
 
-@app.get("/debug/mongodb")
+@router.get("/debug/mongodb")
 async def check_mongodb_connection():
     """Test MongoDB connection and return database stats."""
     try:
         # Check if we can connect
-        await mongo_client.admin.command("ping")
+        await resources.mongo_client.admin.command("ping")
 
         # Get database stats
-        stats = await db.command("dbStats")
+        stats = await resources.db.command("dbStats")
 
         # Get collection names
-        collections = await db.list_collection_names()
+        collections = await resources.db.list_collection_names()
 
         # Count documents in each collection
         collection_counts = {}
         for collection_name in collections:
-            collection = db[collection_name]
+            collection = resources.db[collection_name]
             count = await collection.count_documents({})
             collection_counts[collection_name] = count
 
         return {
             "status": "MongoDB connection successful",
-            "database_name": db.name,
+            "database_name": resources.db.name,
             "stats": stats,
             "collections": collections,
             "collection_counts": collection_counts,
@@ -245,237 +431,135 @@ async def check_mongodb_connection():
         return {"status": "MongoDB connection failed", "error": str(e)}
 
 
-async def scrape_website(url: str) -> Dict[str, Any]:
-    """Scrape a website and extract its content and metadata."""
+@router.get("/metrics")
+async def get_metrics():
+    """Pipeline metrics in the Prometheus text format."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@router.get("/debug/profiles/{profile_id}")
+async def get_profile(profile_id: str, request: Request, raw: bool = False, sort: str = "cumulative"):
+    """A saved request profile, as pstats text or as the raw .prof file."""
+    if not profiler.authorized(request.headers.get("X-Panorama-Profile")):
+        raise HTTPException(status_code=403, detail="Profiling is disabled or the token is wrong")
+    if not profiler.exists(profile_id):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if raw:
+        return FileResponse(profiler.path(profile_id), filename=f"{profile_id}.prof")
     try:
-        logger.info(f"Scraping website: {url}")
-        async with httpx.AsyncClient(timeout=15.0, follow_redirects=True) as client:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
-            response = await client.get(url, headers=headers)
-            if response.status_code != 200:
-                logger.warning(f"Failed to fetch URL: {url} - Status code: {response.status_code}")
-                return {
-                    "success": False,
-                    "error": f"Failed to fetch URL: {response.status_code}",
-                    "status_code": response.status_code,
-                    "url": url
-                }
-            
-            html = response.text
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # Extract text content
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.extract()
-            
-            # Get text
-            text = soup.get_text(separator=' ', strip=True)
-            
-            # Extract title using multiple sources in order of preference
-            title = None
-            title_debug = {}
-            
-            # Check for domain-specific patterns first
-            domain = urlparse(url).netloc.lower()
-            
-            # Fathom Journal specific pattern (based on screenshots)
-            if "fathomjournal.org" in domain:
-                fathom_title_element = soup.select_one('div.the-title h2')
-                if fathom_title_element and fathom_title_element.get_text(strip=True):
-                    title = fathom_title_element.get_text(strip=True)
-                    title_debug["selected_from"] = "fathom_journal_specific"
-                    title_debug["fathom_title"] = title
-            
-            # If no domain-specific match, try generic patterns
-            if not title:
-                # 1. Check for article/post specific title elements with more specific selectors
-                article_title_candidates = [
-                    # Common article title classes
-                    soup.find(class_=lambda c: c and any(x in str(c).lower() for x in ['article-title', 'post-title', 'entry-title', 'headline', 'title-text', 'the-title'])),
-                    # Look for h2 inside div.the-title (common pattern)
-                    soup.select_one('div.the-title h2'),
-                    # Look for h1 inside article
-                    soup.find('article').find('h1') if soup.find('article') else None,
-                    # Look for h1 inside main
-                    soup.find('main').find('h1') if soup.find('main') else None,
-                    # Look for h1 inside header
-                    soup.find('header').find('h1') if soup.find('header') else None,
-                    # Look for first h1
-                    soup.find('h1'),
-                    # Look for first h2
-                    soup.find('h2'),
-                    # Look for specific div with title class
-                    soup.find('div', class_='the-title'),
-                ]
-                
-                # Try to extract title from each candidate
-                for i, candidate in enumerate(article_title_candidates):
-                    if candidate and candidate.get_text(strip=True):
-                        candidate_text = candidate.get_text(strip=True)
-                        title_debug[f"candidate_{i}"] = candidate_text
-                        if not title and len(candidate_text) > 5:
-                            title = candidate_text
-                            title_debug["selected_from"] = f"candidate_{i}"
-            
-            # 2. Check Open Graph metadata
-            og_title_tag = soup.find("meta", attrs={"property": "og:title"})
-            if og_title_tag and og_title_tag.get("content"):
-                og_title = og_title_tag.get("content")
-                title_debug["og_title"] = og_title
-                if (not title or len(title) < 10) and len(og_title) > 5:
-                    title = og_title
-                    title_debug["selected_from"] = "og_title"
-
-            # 3. Fallback to page title
-            if soup.title and soup.title.string:
-                page_title = soup.title.string
-                title_debug["page_title"] = page_title
-                if (not title or len(title) < 10) and len(page_title) > 5:
-                    title = page_title
-                    title_debug["selected_from"] = "page_title"
-
-            # 4. Try to extract from URL if still no title
-            if not title or len(title) < 5:
-                # Extract potential title from URL path
-                path = urlparse(url).path
-                if path:
-                    path_parts = path.strip("/").split("/")
-                    if path_parts:
-                        last_part = path_parts[-1]
-                        # Convert slug to readable title
-                        if last_part and "-" in last_part:
-                            url_title = " ".join(
-                                word.capitalize()
-                                for word in re.sub(r"\d+$", "", last_part).split("-")
-                            )
-                            title_debug["url_title"] = url_title
-                            title = url_title
-                            title_debug["selected_from"] = "url_title"
-
-            # Log title extraction debug info
-            logger.info(f"Title extraction debug for {url}: {title_debug}")
-
-            # Extract Open Graph metadata
-            og_title = None
-            og_description = None
-            og_image = None
-            og_site_name = None
-
-            og_title_tag = soup.find("meta", attrs={"property": "og:title"})
-            if og_title_tag:
-                og_title = og_title_tag.get("content")
-
-            og_desc_tag = soup.find("meta", attrs={"property": "og:description"})
-            if og_desc_tag:
-                og_description = og_desc_tag.get("content")
-
-            og_image_tag = soup.find("meta", attrs={"property": "og:image"})
-            if og_image_tag:
-                og_image = og_image_tag.get("content")
-
-            og_site_tag = soup.find("meta", attrs={"property": "og:site_name"})
-            if og_site_tag:
-                og_site_name = og_site_tag.get("content")
-
-            # Extract favicon
-            favicon = None
-            favicon_tag = soup.find(
-                "link", rel=lambda rel: rel and "icon" in rel.lower()
-            )
-            if favicon_tag:
-                favicon = favicon_tag.get("href")
-                # Handle relative URLs
-                if favicon and not favicon.startswith(("http://", "https://")):
-                    # Extract domain from URL
-                    domain_match = re.search(r"https?://(?:www\.)?([^/]+)", url)
-                    if domain_match:
-                        domain = domain_match.group(0)
-                        favicon = f"{domain.rstrip('/')}/{favicon.lstrip('/')}"
-
-            # Extract publication date
-            published_date = None
-            try:
-                date_tag = soup.find(
-                    "meta", attrs={"property": "article:published_time"}
-                )
-                if date_tag:
-                    published_date = date_tag.get("content")
-
-                if not published_date:
-                    # Try other common date meta tags
-                    date_tags = [
-                        soup.find("meta", attrs={"property": "article:published_time"}),
-                        soup.find("meta", attrs={"name": "publication_date"}),
-                        soup.find("meta", attrs={"name": "publish_date"}),
-                        soup.find("meta", attrs={"name": "date"}),
-                        soup.find("time"),
-                    ]
-
-                    for tag in date_tags:
-                        if tag:
-                            date_content = tag.get("content") or tag.get("datetime")
-                            if date_content:
-                                published_date = date_content
-                                break
-            except Exception as e:
-                logger.warning(f"Error extracting publication date: {str(e)}")
-
-            # Extract domain
-            domain = None
-            domain_match = re.search(r"https?://(?:www\.)?([^/]+)", url)
-            if domain_match:
-                domain = domain_match.group(1)
-
-            # Basic metadata dictionary
-            metadata = {
-                "title": title or og_title,
-                "description": og_description,
-                "site_name": og_site_name,
-                "processed_date": datetime.now().isoformat(),
-            }
+        return PlainTextResponse(profiler.report(profile_id, sort=sort))
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown sort key: {sort}")
 
-            # Skip OpenAI processing if no API key or if text is too short
-            if OPENAI_API_KEY and len(text) > 200:
-                try:
-                    # Use the external metadata extraction function if imported
-                    advanced_metadata = await extract_metadata(
-                        text=text[:5000],  # Limit text to avoid token limits
-                        title=title or og_title or "Untitled",
-                        url=url,
-                        api_key=OPENAI_API_KEY,
-                    )
 
-                    # Merge with basic metadata
-                    metadata.update(advanced_metadata)
-                    logger.info(f"Extracted advanced metadata for {url}")
-                except Exception as e:
-                    logger.error(f"Error extracting advanced metadata: {str(e)}")
-                    metadata["extraction_error"] = str(e)
+@router.get("/debug/perplexity")
+async def get_perplexity_status():
+    """Perplexity gateway counters and circuit breaker states per API key."""
+    return {"metrics": perplexity.metrics, "circuits": perplexity.breaker_states()}
 
-            return {
-                "success": True,
-                "url": url,
-                "title": title or og_title or "Untitled",
-                "text": text,
-                "og_image": og_image,
-                "favicon_url": favicon
-                or f"https://www.google.com/s2/favicons?domain={domain}&sz=128",
-                "published_date": published_date,
-                "domain": domain,
-                "metadata": metadata,
-            }
+
+@router.get("/debug/domain-health")
+async def get_domain_health(limit: int = 100):
+    """List the least healthy news domains seen by the scraper."""
+    await resources.domain_health.load()
+    return resources.domain_health.snapshot(limit)
+
+
+async def scrape_website(url: str, priority: int = job_queue.PRIORITY_INTERACTIVE) -> Dict[str, Any]:
+    """Scrape a website and extract its content and metadata, here or on a scrape worker, without enrichment."""
+    # Recorded and replayed traffic has to go through this process's transports
+    if SCRAPE_QUEUE_ENABLED and cassette.active_id() is None:
+        return await scrape_on_worker(url, priority)
+    return await scraper.scrape_website(url, resources.http, store_raw_text=STORE_RAW_TEXT)
+
+
+async def scrape_and_enrich(
+    url: str, enrichments: NearDuplicates, priority: int = job_queue.PRIORITY_INTERACTIVE
+) -> Dict[str, Any]:
+    """
+    Scrape a website and enrich the article with the LLM.
+
+    A near-duplicate of an article enriched earlier in the same search or
+    batch (``enrichments``, fingerprint -> future enrichment) or stored
+    recently gets that enrichment instead of an LLM call of its own; a
+    recent stored copy is named in the result's ``duplicate_of``.
+    """
+    result = await scrape_website(url, priority)
+    if not result["success"] or resources.openai is None or len(result["text"]) <= scraper.MIN_ENRICHMENT_CHARS:
+        return result
+    fingerprint = result.get("simhash")
+
+    if fingerprint is not None:
+        shared = enrichments.find(fingerprint)
+        if shared is not None:
+            # Shielded: giving up on this scrape mustn't cancel the copy's enrichment
+            enrichment = await asyncio.shield(shared)
+            if enrichment is not None:
+                metrics.NEAR_DUPLICATES.labels(found_in="search").inc()
+                result["metadata"].update(enrichment)
+                return result
+
+    pending = asyncio.get_running_loop().create_future()
+    if fingerprint is not None:
+        enrichments.add(fingerprint, pending)
+    enrichment = None
+    try:
+        copy = await recent_duplicate(fingerprint) if fingerprint is not None else None
+        if copy is None:
+            enrichment = await scraper.enrich(resources.openai, result["text"], result["title"], url)
+        else:
+            metrics.NEAR_DUPLICATES.labels(found_in="corpus").inc()
+            enrichment = scraper.shared_enrichment(copy["metadata"])
+            result["duplicate_of"] = copy.get("duplicate_of") or str(copy["_id"])
+            logger.info(f"Reusing the enrichment of source {result['duplicate_of']} for near-duplicate {url}")
+    finally:
+        # Copies waiting on a cancelled enrichment enrich themselves
+        pending.set_result(None if enrichment is None else scraper.shared_enrichment(enrichment))
+    result["metadata"].update(enrichment)
+    return result
+
+
+async def recent_duplicate(fingerprint: int) -> Optional[Dict[str, Any]]:
+    """A recently stored, enriched near-duplicate of an article, if there is one."""
+    try:
+        with server_timing.stage("mongo"):
+            return await resources.recent_duplicates.find(fingerprint)
     except Exception as e:
-        logger.error(f"Error scraping website {url}: {str(e)}")
+        logger.error(f"Error looking up near-duplicate sources: {str(e)}")
+        return None
+
+
+async def scrape_on_worker(url: str, priority: int) -> Dict[str, Any]:
+    """Queue a scrape job and wait for a scrape worker to run it, within the request's deadline."""
+    request_deadline = current_deadline()
+    timeout = request_deadline.usable() if request_deadline else SCRAPE_TIMEOUT + LLM_TIMEOUT
+    try:
+        job = await resources.jobs.run(
+            "scrape",
+            {"url": url, "store_raw_text": STORE_RAW_TEXT, "enrich": False},
+            priority=priority,
+            timeout=timeout,
+        )
+    except asyncio.TimeoutError:
+        logger.warning(f"Scrape job for {url} didn't finish in {timeout:.1f}s")
+        return {"success": False, "error": "Scrape job timed out", "status_code": 504, "url": url, "error_type": "TimeoutError"}
+    except Exception as e:
+        logger.error(f"Error queueing scrape job for {url}: {str(e)}")
+        return {"success": False, "error": str(e), "status_code": 500, "url": url, "error_type": type(e).__name__}
+
+    if job["status"] != job_queue.DONE:
         return {
             "success": False,
-            "error": str(e),
-            "status_code": 500,  # Internal error as default
+            "error": job.get("error") or f"Scrape job {job['status']}",
+            "status_code": 500,
             "url": url,
-            "error_type": type(e).__name__
+            "error_type": "ScrapeJobError",
         }
+    result = job["result"]
+    # The worker's stage timings, so Server-Timing still shows fetch, parse and LLM time
+    for stage, seconds in result.pop("timings", {}).items():
+        server_timing.record(stage, seconds)
+    return result
 
 
 async def get_articles_from_perplexity(
@@ -487,6 +571,7 @@ async def get_articles_from_perplexity(
     try:
         # Improved queries for better political balancing
         leaning_queries = {
+            ANY_LEANING: [f"{query} from a wide range of news sources across the political spectrum, left, center and right, with at least 20 articles"],
             "left": [f"{query} from left-leaning or progressive news sources"],
             "center": [f"{query} from center or neutral news sources"],
             "right": [f"{query} from right-leaning or conservative news sources"],
@@ -503,139 +588,38 @@ async def get_articles_from_perplexity(
                 f"Querying Perplexity for {political_leaning}-leaning sources with query: '{leaning_query}'"
             )
 
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                headers = {
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json",
-                }
+            try:
+                with server_timing.stage("perplexity", metrics.PERPLEXITY_SECONDS.labels(leaning=political_leaning)):
+                    data = await perplexity.chat_completion(
+                        api_key,
+                        {
+                            "model": "sonar",
+                            "messages": [
+                                {
+                                    "role": "system",
+                                    "content": "You are a news collection assistant. Find recent news articles on the given topic. Include only factual articles from established news outlets. For each article, provide: 1) The exact article title, 2) The source name, 3) The complete article URL, and 4) A brief snippet or summary. Format each article as a separate bullet point or numbered item. Provide at least 10 articles if available. Focus on diversity of sources within the specified political leaning category. Do not repeat articles from the same source. Prioritize articles published within the last year, and do not include sources older than 5 years unless absolutely necessary. Focus on the most recent, relevant sources available.",
+                                },
+                                {"role": "user", "content": leaning_query},
+                            ],
+                        },
+                        timeout=stage_timeout(PERPLEXITY_TIMEOUT, PERPLEXITY_BUDGET_SHARE),
+                    )
+            except PerplexityError as e:
+                logger.error(str(e))
+                continue
 
-                response = await client.post(
-                    "https://api.perplexity.ai/chat/completions",
-                    headers=headers,
-                    json={
-                        "model": "sonar",
-                        "messages": [
-                            {
-                                "role": "system",
-                                "content": "You are a news collection assistant. Find recent news articles on the given topic. Include only factual articles from established news outlets. For each article, provide: 1) The exact article title, 2) The source name, 3) The complete article URL, and 4) A brief snippet or summary. Format each article as a separate bullet point or numbered item. Provide at least 10 articles if available. Focus on diversity of sources within the specified political leaning category. Do not repeat articles from the same source. Prioritize articles published within the last year, and do not include sources older than 5 years unless absolutely necessary. Focus on the most recent, relevant sources available.",
-                            },
-                            {"role": "user", "content": leaning_query},
-                        ],
-                    },
-                )
+            content = (
+                data.get("choices", [{}])[0].get("message", {}).get("content", "")
+            )
 
-                if response.status_code != 200:
-                    logger.error(f"Error from Perplexity API: {response.status_code}")
-                    logger.error(response.text)
-                    continue
+            # Log the raw response for debugging
+            logger.debug(
+                f"Perplexity response for {political_leaning}: {content[:200]}..."
+            )
 
-                data = response.json()
-                content = (
-                    data.get("choices", [{}])[0].get("message", {}).get("content", "")
-                )
-
-                # Log the raw response for debugging
-                logger.debug(
-                    f"Perplexity response for {political_leaning}: {content[:200]}..."
-                )
-
-                # Extract URLs from the content
-                url_pattern = re.compile(r"(https?://[^\s)\]]+)")
-                urls = url_pattern.findall(content)
-
-                # Process each URL to get context
-                for url in urls:
-                    # Get surrounding context
-                    start_idx = max(0, content.find(url) - 300)
-                    end_idx = min(len(content), content.find(url) + len(url) + 300)
-                    context = content[start_idx:end_idx]
-
-                    # Try to find title
-                    title = ""
-                    title_match = re.search(r"\*\*([^*]+)\*\*", context)
-                    if title_match:
-                        title = title_match.group(1).strip()
-
-                    # If no title in bold, look for potential title in the vicinity
-                    if not title:
-                        title_search = re.search(
-                            r"(?:^|\n|\*)([A-Z][^.\n]{10,100}(?:\.|\n|$))",
-                            context[: context.find(url)],
-                        )
-                        if title_search:
-                            title = title_search.group(1).strip()
-
-                    # Last resort for title
-                    if not title:
-                        title = f"Article about {query}"
-
-                    # Try to find source name
-                    source = ""
-                    source_match = re.search(
-                        r"(?:source|source\s*name)[\s:]+([^,\n]+)",
-                        context,
-                        re.IGNORECASE,
-                    )
-                    if source_match:
-                        source = source_match.group(1).strip()
-
-                    # If no explicit source, try to extract from URL
-                    if not source:
-                        domain_match = re.search(r"https?://(?:www\.)?([^/]+)", url)
-                        if domain_match:
-                            source = domain_match.group(1)
-
-                    # Extract snippet
-                    snippet = ""
-                    snippet_match = re.search(
-                        r"snippet[\s:]+([^\n]+)", context, re.IGNORECASE
-                    )
-                    if snippet_match:
-                        snippet = snippet_match.group(1).strip()
-
-                    # If no explicit snippet, use some text after the URL
-                    if not snippet:
-                        after_url = context[content.find(url) + len(url) :]
-                        snippet_text = after_url[: min(150, len(after_url))]
-                        if snippet_text:
-                            snippet = snippet_text.strip()
-
-                    # Clean up the title, source name, and snippet
-                    # Remove common prefixes from title
-                    title = re.sub(
-                        r"^(Article Title:?\s*|Title:?\s*)", "", title
-                    ).strip()
-
-                    # Remove common prefixes from source name
-                    source = re.sub(r"^(Name:?\s*\*\*|Source:?\s*)", "", source).strip()
-                    # Remove trailing asterisks if any
-                    source = re.sub(r"\*\*$", "", source).strip()
-
-                    # Clean up snippet - remove markdown formatting
-                    snippet = re.sub(
-                        r"\*\*(Summary|Brief Summary):?\s*\*\*", "", snippet
-                    ).strip()
-                    snippet = re.sub(r"\*\*([^*]+)\*\*", "\1", snippet).strip()
-
-                    # If we have at least a URL, add to articles
-                    if url:
-                        # Extract domain for favicon
-                        domain = ""
-                        domain_match = re.search(r"https?://(?:www\.)?([^/]+)", url)
-                        if domain_match:
-                            domain = domain_match.group(1)
-
-                        article = {
-                            "title": title,
-                            "url": url,
-                            "source_name": source or "Unknown Source",
-                            "snippet": snippet or "",
-                            "domain": domain,
-                            "favicon_url": f"https://www.google.com/s2/favicons?domain={domain}&sz=128",
-                            "political_leaning": political_leaning,
-                        }
-
-                        all_articles.append(article)
+            # Split the markdown list into items and parse each one
+            with server_timing.stage("parse", metrics.PARSE_SECONDS.labels(kind="perplexity")):
+                all_articles.extend(parse_articles(content, query, political_leaning))
 
         logger.info(f"Found {len(all_articles)} {political_leaning}-leaning articles")
         return all_articles
@@ -645,460 +629,1060 @@ async def get_articles_from_perplexity(
         return []
 
 
-@app.post("/query", response_model=NewsResponse)
-async def query(request: NewsRequest):
+# Political leanings in display order
+LEANINGS = ["left", "center", "right"]
+
+
+def classify_candidate(article: Dict[str, Any]) -> bool:
     """
-    Fetch news articles from across the political spectrum based on the query.
+    Place a candidate on the spectrum; False if it can't be placed.
+
+    Rated domains get their score from the bias index and the leaning
+    that score falls in. Others keep the leaning of the Perplexity query
+    that found them, at the middle of its band; candidates from the broad
+    single-query pool have none.
     """
-    logger.info(f"Received query request: {request.query}")
-    logger.info(f"Request details: limit={request.limit}, api_key_provided={'Yes' if request.api_key else 'No'}")
-    
+    score = resources.bias_index.score(article["url"])
+    if score is not None:
+        article["political_score"] = score
+        article["political_leaning"] = leaning_for(score)
+        return True
+    if article["political_leaning"] in LEANINGS:
+        article["political_score"] = band_midpoint(article["political_leaning"])
+        return True
+    return False
+
+# Max concurrent scrapes per query to avoid overwhelming servers
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "8"))
+# Extra candidates per leaning scraped speculatively alongside the needed ones
+SCRAPE_SURPLUS = int(os.getenv("SCRAPE_SURPLUS", "2"))
+# Scrapes slower than this percentile of recent scrapes launch another candidate early
+SCRAPE_EARLY_LAUNCH_PERCENTILE = float(os.getenv("SCRAPE_EARLY_LAUNCH_PERCENTILE", "90"))
+# Near-duplicates point at the source holding their text, at most this many links away
+MAX_DUPLICATE_HOPS = 4
+
+scrape_latency = LatencyTracker(percentile=SCRAPE_EARLY_LAUNCH_PERCENTILE)
+
+
+def record_scrape_outcome(url: str, scrape_result: Dict[str, Any], latency: float):
+    """Feed a scrape outcome into the domain health table."""
+    status_code = 200 if scrape_result["success"] else scrape_result.get("status_code", 0)
+    metrics.SCRAPE_OUTCOMES.labels(status=str(status_code)).inc()
+    # Replayed outcomes say nothing about how the domain is doing now, nor do
+    # fetches that only timed out because the request's deadline left them little time
+    if not cassette.is_replaying() and not scrape_result.get("deadline_timeout"):
+        resources.domain_health.record(url, status_code, latency)
+
+
+def build_source_document(source: Dict[str, Any], scrape_result: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge a Perplexity candidate with its scrape result into a cleaned source document."""
+    if scrape_result["success"]:
+        document = {
+            "title": scrape_result["title"] or source["title"],
+            "url": scrape_result.get("canonical_url") or source["url"],
+            # The candidate's URL, which the next run of the query finds it under
+            "requested_url": source["url"],
+            "source_name": source["source_name"],
+            "political_leaning": source["political_leaning"],
+            "political_score": source["political_score"],
+            "snippet": source["snippet"],
+            "text": scrape_result["text"],
+            "published_date": scrape_result.get("published_date"),
+            "domain": scrape_result.get("domain") or source.get("domain"),
+            "favicon_url": scrape_result.get("favicon_url")
+            or source.get("favicon_url"),
+            "og_image": scrape_result.get("og_image"),
+            "metadata": scrape_result.get("metadata", {}),
+        }
+        if scrape_result.get("raw_text"):
+            document["raw_text"] = scrape_result["raw_text"]
+        if scrape_result.get("simhash") is not None:
+            document["simhash"] = scrape_result["simhash"]
+            document["simhash_bands"] = simhash_bands(scrape_result["simhash"])
+    else:
+        # Fallback source with error information
+        document = {
+            "title": source["title"],
+            "url": source["url"],
+            "source_name": source["source_name"],
+            "political_leaning": source["political_leaning"],
+            "political_score": source["political_score"],
+            "snippet": source["snippet"],
+            "domain": source.get("domain"),
+            "favicon_url": source.get("favicon_url"),
+            "text": None,
+            "metadata": {
+                "error": scrape_result.get("error", "Unknown error"),
+                "status_code": scrape_result.get("status_code", 0),
+                "error_type": scrape_result.get("error_type", "ScrapingError"),
+            },
+        }
+
+    return clean_source_formatting(document)
+
+
+def reuse_source(source: NewsSource, candidate: Dict[str, Any]) -> NewsSource:
+    """A previously stored source, placed on the spectrum where this run's candidate puts it."""
+    if (source.political_leaning, source.political_score) == (candidate["political_leaning"], candidate["political_score"]):
+        return source
+    return source.model_copy(
+        update={"political_leaning": candidate["political_leaning"], "political_score": candidate["political_score"]}
+    )
+
+
+async def store_source(document: Dict[str, Any], duplicate_of: Optional[str] = None) -> NewsSource:
+    """
+    Insert a source document into MongoDB and return it as a NewsSource.
+
+    A near-duplicate of a stored source (``duplicate_of``) is stored
+    without its text, which is read from that source instead.
+    """
+    if duplicate_of is not None:
+        document["duplicate_of"] = duplicate_of
     try:
-        # Use API key from request if provided, otherwise use environment variable
-        api_key = request.api_key or PERPLEXITY_API_KEY
+        await resources.text_store.load()
+        stored = document
+        if duplicate_of is not None:
+            stored = {key: value for key, value in document.items() if key not in ("text", "raw_text")}
+        with server_timing.stage("mongo", metrics.MONGO_WRITE_SECONDS.labels(collection="sources")):
+            result = await resources.sources_collection.insert_one(resources.text_store.pack(stored))
+        source_id = str(result.inserted_id)
 
-        if not api_key:
-            raise HTTPException(status_code=401, detail="API key is required")
+        # Convert MongoDB _id to string for response
+        document["_id"] = source_id
+        logger.info(f"Stored source in MongoDB with ID: {source_id}")
+    except Exception as e:
+        logger.error(f"Error storing source in MongoDB: {str(e)}")
+        # Still include the source in response even if MongoDB storage fails
+        document["_id"] = "temp_" + hashlib.md5(document["url"].encode()).hexdigest()
 
-        # If no cached results, proceed with API calls and scraping
-        logger.info(f"Fetching new results for query: {request.query}")
+    return NewsSource(**document)
 
-        # Initialize stats at the start of the function
-        stats = {
-            "total": 0,
-            "left_count": 0,
-            "center_count": 0,
-            "right_count": 0,
-        }
 
-        # Initialize timeline_positioning
-        political_scores = []
-        min_score = 1.0
-        max_score = 10.0
-        timeline_positioning = {"min_score": min_score, "max_score": max_score}
+def query_budget(request: NewsRequest) -> float:
+    """Seconds a query may take: its ``deadline_ms`` or the default, within the allowed range."""
+    budget = QUERY_DEADLINE_SECONDS
+    if request.deadline_ms:
+        budget = request.deadline_ms / 1000
+    return max(0.1, min(budget, QUERY_DEADLINE_MAX_SECONDS))
 
-        # Fetch articles from different political perspectives
-        leanings = ["left", "center", "right"]
-        all_articles = []
 
-        # Fetch sources from Perplexity in parallel
-        tasks = [
-            get_articles_from_perplexity(request.query, leaning, api_key)
-            for leaning in leanings
-        ]
-        results = await asyncio.gather(*tasks)
-
-        # Combine results
-        for i, leaning_articles in enumerate(results):
-            for article in leaning_articles:
-                article["political_leaning"] = leanings[i]
-                all_articles.append(article)
-
-        # Remove duplicates based on URL
-        unique_articles = []
-        seen_urls = set()
-        for article in all_articles:
-            if article["url"] not in seen_urls:
-                seen_urls.add(article["url"])
+async def run_query_pipeline(
+    request: NewsRequest,
+    api_key: str,
+    on_source: Optional[Callable[[NewsSource], Awaitable[None]]] = None,
+    scrapes: Optional[SharedScrapes] = None,
+    previous: Optional[Dict[str, NewsSource]] = None,
+) -> NewsResponse:
+    """
+    Fetch, balance, scrape and store sources for a query.
 
-                # Assign political_score based on leaning
-                if article["political_leaning"] == "left":
-                    article["political_score"] = random.uniform(1.0, 4.0)
-                elif article["political_leaning"] == "center":
-                    article["political_score"] = random.uniform(4.0, 7.0)
-                else:
-                    article["political_score"] = random.uniform(7.0, 10.0)
+    ``on_source`` is awaited with each source as soon as it is stored.
+    Queries of a batch pass the batch's ``scrapes`` to share page scrapes.
+    Candidates found in ``previous`` (stored sources by URL) are reused
+    instead of being scraped and stored again.
+    """
+    # If no cached results, proceed with API calls and scraping
+    logger.info(f"Fetching new results for query: {request.query}")
+    await resources.domain_health.load()
+    metrics.QUERIES_IN_FLIGHT.inc()
+    try:
+        return await _run_query_pipeline(request, api_key, on_source, scrapes, previous or {})
+    finally:
+        metrics.QUERIES_IN_FLIGHT.dec()
+
+
+async def _run_query_pipeline(
+    request: NewsRequest,
+    api_key: str,
+    on_source: Optional[Callable[[NewsSource], Awaitable[None]]],
+    scrapes: Optional[SharedScrapes],
+    previous: Dict[str, NewsSource],
+) -> NewsResponse:
+    # Initialize stats at the start of the function
+    stats = {
+        "total": 0,
+        "left_count": 0,
+        "center_count": 0,
+        "right_count": 0,
+    }
+
+    # Initialize timeline_positioning
+    political_scores = []
+    min_score = 1.0
+    max_score = 10.0
+    timeline_positioning = {"min_score": min_score, "max_score": max_score}
+
+    # Everything below shares the request's time budget
+    budget = query_budget(request)
+
+    with deadline_scope(budget, reserve=min(1.0, budget * 0.1)) as deadline:
+        # The pipeline runs as streaming stages connected by queues:
+        #   Perplexity (one producer per leaning) -> balancer -> scrapers -> storer
+        # so a leaning's candidates start scraping as soon as its Perplexity
+        # call returns instead of waiting for the slowest leaning.
+        per_category = max(1, request.limit // 3)
+        # Minimum articles per category before a leaning is re-queried
+        min_per_category = max(1, request.limit // 6)
 
-                unique_articles.append(article)
+        candidate_queue: asyncio.Queue = asyncio.Queue()
+        scraped_queue: asyncio.Queue = asyncio.Queue()
 
-        logger.info(f"Found {len(unique_articles)} unique articles")
+        seen_urls = set()
+        unique_counts = {leaning: 0 for leaning in LEANINGS}
+        # Candidates on domains that are backing off, used only as a last resort
+        deferred = {leaning: [] for leaning in LEANINGS}
+        stored = {}  # slot -> NewsSource
+        reused_slots = set()  # Slots filled from the previous result
+        # Near-duplicates of a source kept for the same leaning are grouped under it without taking
+        # a slot; any copy of a stored source is stored without its text
+        kept_copies = {leaning: NearDuplicates() for leaning in LEANINGS}  # fingerprint -> URL
+        kept_ids = {leaning: set() for leaning in LEANINGS}  # Reused sources and the ones they copy
+        kept_pages = set()  # Canonical URLs of the pages kept, as fetched
+        repeated = set()  # Candidate URLs whose page was already kept under another URL
+        grouped = {}  # URL of a near-duplicate -> URL of the source it's grouped under
+        stored_copies = NearDuplicates()  # fingerprint -> id of the stored source with the text
+        stored_ids = {}  # URL -> stored source id
+
+        async def query_candidates(query_text, leaning):
+            articles = await get_articles_from_perplexity(query_text, leaning, api_key)
+            # Healthy domains first, so they take the first scrape slots
+            articles.sort(key=lambda a: -resources.domain_health.priority(a["url"]))
+            for article in articles:
+                candidate_queue.put_nowait(article)
+
+        async def requery_if_short(leaning, minimum):
+            # Let the balancer dedupe what we have before deciding to re-query
+            await candidate_queue.join()
+            if unique_counts[leaning] < minimum:
+                logger.info(f"Not enough {leaning} sources ({unique_counts[leaning]}), will re-query")
+                # Use a more targeted query to try to get more results
+                targeted_query = f"{request.query} from established {leaning}-leaning news sources only"
+                await query_candidates(targeted_query, leaning)
 
-        # Balance the sources across political leanings
-        left_sources = [s for s in unique_articles if s["political_leaning"] == "left"]
-        center_sources = [
-            s for s in unique_articles if s["political_leaning"] == "center"
-        ]
-        right_sources = [
-            s for s in unique_articles if s["political_leaning"] == "right"
-        ]
+        async def fetch_candidates(leaning):
+            """Stream one leaning's Perplexity results into the candidate queue."""
+            try:
+                await query_candidates(request.query, leaning)
+                await requery_if_short(leaning, min_per_category)
+            finally:
+                candidate_queue.put_nowait(None)
 
-        logger.info(
-            f"Article distribution - Left: {len(left_sources)}, Center: {len(center_sources)}, Right: {len(right_sources)}"
+        async def fetch_pool():
+            """Stream one broad Perplexity query, classified locally; only short leanings are queried again."""
+            try:
+                await query_candidates(request.query, ANY_LEANING)
+                # The pool is all a leaning gets otherwise, so it must fill the leaning on its own
+                await asyncio.gather(*(requery_if_short(leaning, per_category) for leaning in LEANINGS))
+            finally:
+                candidate_queue.put_nowait(None)
+
+        def is_duplicate(candidate, scrape_result):
+            """
+            Whether a scraped article is a near-duplicate of one already kept for its leaning,
+            or the same page as one already kept under another URL (dropped by the storer).
+            """
+            page = scrape_result["reused"].url if "reused" in scrape_result else scrape_result.get("canonical_url")
+            if page is not None:
+                if page in kept_pages:
+                    repeated.add(candidate["url"])
+                    return True
+                kept_pages.add(page)
+            if "reused" in scrape_result:
+                # Reused sources were grouped when they were stored
+                source = scrape_result["reused"]
+                group = {source.id, source.duplicate_of} - {None}
+                if group & kept_ids[candidate["political_leaning"]]:
+                    return True
+                kept_ids[candidate["political_leaning"]].update(group)
+                return False
+            fingerprint = scrape_result.get("simhash")
+            if fingerprint is None:
+                return False
+            copies = kept_copies[candidate["political_leaning"]]
+            primary = copies.find(fingerprint)
+            if primary is None:
+                copies.add(fingerprint, candidate["url"])
+                return False
+            grouped[candidate["url"]] = primary
+            return True
+
+        async def store_scraped():
+            """Store scrape results as they arrive."""
+            while True:
+                item = await scraped_queue.get()
+                if item is None:
+                    return
+                slot, source, scrape_result = item
+                if source["url"] in repeated:
+                    logger.info(f"Dropping {source['url']}: the same page as a source already kept")
+                    continue
+                if "reused" in scrape_result:
+                    reused_slots.add(slot)
+                    stored[slot] = reuse_source(scrape_result["reused"], source)
+                else:
+                    # Grouped copies point at their group's source; others at any copy stored before them
+                    fingerprint = scrape_result.get("simhash")
+                    duplicate_of = stored_ids.get(grouped.get(source["url"]))
+                    if duplicate_of is None and fingerprint is not None:
+                        duplicate_of = stored_copies.find(fingerprint)
+                    duplicate_of = duplicate_of or scrape_result.get("duplicate_of")
+                    stored[slot] = await store_source(build_source_document(source, scrape_result), duplicate_of)
+                    if not stored[slot].id.startswith("temp_"):
+                        stored_ids[source["url"]] = stored[slot].id
+                        if fingerprint is not None and stored_copies.find(fingerprint) is None:
+                            stored_copies.add(fingerprint, duplicate_of or stored[slot].id)
+                if on_source is not None:
+                    await on_source(stored[slot])
+
+        # Scrape a few surplus candidates per leaning and keep the first successes;
+        # a batch shares enrichment between its queries through ``scrapes``
+        enrichments = NearDuplicates()
+        scheduler = ScrapeScheduler(
+            scrape_fn=scrapes.scrape if scrapes else lambda url: scrape_and_enrich(url, enrichments),
+            on_result=lambda slot, source, result: scraped_queue.put((slot, source, result)),
+            leanings=LEANINGS,
+            target=per_category,
+            surplus=SCRAPE_SURPLUS,
+            concurrency=SCRAPE_CONCURRENCY,
+            latency=scrape_latency,
+            # Shared scrapes record their outcome once, however many queries use them
+            on_outcome=None if scrapes else record_scrape_outcome,
+            is_duplicate=is_duplicate,
         )
+        storer = asyncio.create_task(store_scraped())
+        if PERPLEXITY_MODE == "single":
+            producers = [asyncio.create_task(fetch_pool())]
+        else:
+            producers = [asyncio.create_task(fetch_candidates(leaning)) for leaning in LEANINGS]
+
+        async def balance_and_scrape():
+            # Balance incrementally: candidates go to their leaning's scheduler
+            # queue in arrival order as they come in.
+            open_producers = len(producers)
+            while open_producers:
+                article = await candidate_queue.get()
+                candidate_queue.task_done()
+                if article is None:
+                    open_producers -= 1
+                    continue
+                if article["url"] in seen_urls:
+                    continue
+                seen_urls.add(article["url"])
 
-        # Define minimum articles per category to ensure balanced distribution
-        min_per_category = max(1, request.limit // 6)  # At least 1/6 of requested limit per category
-        
-        # Check if any category has fewer articles than the minimum threshold
-        needs_requery = False
-        requery_leanings = []
-        
-        if len(left_sources) < min_per_category:
-            needs_requery = True
-            requery_leanings.append("left")
-            logger.info(f"Not enough left-leaning sources ({len(left_sources)}), will re-query")
-            
-        if len(center_sources) < min_per_category:
-            needs_requery = True
-            requery_leanings.append("center")
-            logger.info(f"Not enough center sources ({len(center_sources)}), will re-query")
-            
-        if len(right_sources) < min_per_category:
-            needs_requery = True
-            requery_leanings.append("right")
-            logger.info(f"Not enough right-leaning sources ({len(right_sources)}), will re-query")
-        
-        # Only perform additional queries if necessary
-        if needs_requery:
-            logger.info(f"Re-querying for additional sources in categories: {requery_leanings}")
-            
-            # Use a more specific query to try to get more results
-            requery_tasks = []
-            for leaning in requery_leanings:
-                # Create a more targeted query for the specific leaning
-                targeted_query = f"{request.query} from established {leaning}-leaning news sources only"
-                requery_tasks.append(get_articles_from_perplexity(targeted_query, leaning, api_key))
-            
-            if requery_tasks:
-                requery_results = await asyncio.gather(*requery_tasks)
-                
-                # Process and add new articles
-                for i, leaning_articles in enumerate(requery_results):
-                    leaning = requery_leanings[i]
-                    for article in leaning_articles:
-                        article["political_leaning"] = leaning
-                        if article["url"] not in seen_urls:
-                            seen_urls.add(article["url"])
-                            
-                            # Assign political_score based on leaning
-                            if leaning == "left":
-                                article["political_score"] = random.uniform(1.0, 4.0)
-                            elif leaning == "center":
-                                article["political_score"] = random.uniform(4.0, 7.0)
-                            else:
-                                article["political_score"] = random.uniform(7.0, 10.0)
-                                
-                            unique_articles.append(article)
-                
-                # Update the source lists
-                left_sources = [s for s in unique_articles if s["political_leaning"] == "left"]
-                center_sources = [s for s in unique_articles if s["political_leaning"] == "center"]
-                right_sources = [s for s in unique_articles if s["political_leaning"] == "right"]
-                
-                logger.info(
-                    f"Updated article distribution after re-query - Left: {len(left_sources)}, Center: {len(center_sources)}, Right: {len(right_sources)}"
-                )
+                if not classify_candidate(article):
+                    logger.info(f"Skipping candidate on an unrated domain: {article['url']}")
+                    continue
+                leaning = article["political_leaning"]
 
-        # Calculate how many of each to include to ensure balance
-        per_category = max(1, request.limit // 3)
+                # Still in the news since the last run: keep the stored source
+                if article["url"] in previous:
+                    unique_counts[leaning] += 1
+                    await scheduler.accept(leaning, article, {"success": True, "reused": previous[article["url"]]})
+                    continue
 
-        balanced_sources = []
-        balanced_sources.extend(left_sources[:per_category])
-        balanced_sources.extend(center_sources[:per_category])
-        balanced_sources.extend(right_sources[:per_category])
-
-        # Fill up to the limit with any remaining sources
-        remaining_slots = request.limit - len(balanced_sources)
-        if remaining_slots > 0:
-            all_remaining = (
-                left_sources[per_category:]
-                + center_sources[per_category:]
-                + right_sources[per_category:]
+                # Skip domains known to be failing right now
+                if resources.domain_health.is_blocked(article["url"]):
+                    logger.info(f"Deferring candidate on backed-off domain: {article['url']}")
+                    deferred[leaning].append(article)
+                    continue
+
+                unique_counts[leaning] += 1
+                scheduler.add(leaning, article, priority=resources.domain_health.priority(article["url"]))
+
+            logger.info(
+                f"Article distribution - Left: {unique_counts['left']}, Center: {unique_counts['center']}, Right: {unique_counts['right']}"
             )
-            balanced_sources.extend(all_remaining[:remaining_slots])
 
-        # Scrape content and metadata for each source - this can take time
-        logger.info(f"Scraping content for {len(balanced_sources)} sources")
+            # Fall back to backed-off domains only where a leaning would come up short
+            for leaning in LEANINGS:
+                shortfall = -scheduler.spare(leaning)
+                for article in deferred[leaning][:max(0, shortfall)]:
+                    scheduler.add(leaning, article, priority=-1.0)
+
+            # Fill up to the limit with any remaining sources
+            remaining_slots = request.limit - per_category * len(LEANINGS)
+            for leaning in LEANINGS:
+                extra = min(remaining_slots, max(0, scheduler.spare(leaning)))
+                if extra:
+                    scheduler.raise_target(leaning, extra)
+                    remaining_slots -= extra
+
+            scheduler.close()
+            await scheduler.wait()
+
+        # Past the deadline, cancel outstanding work and keep what is complete
+        deadline_reached = False
+        try:
+            await asyncio.wait_for(balance_and_scrape(), timeout=deadline.usable())
+            logger.info(
+                f"Scraping finished with {scheduler.early_launches} early and {scheduler.cancelled} cancelled fetches, "
+                f"{scheduler.duplicates} near-duplicates grouped"
+            )
+        except asyncio.TimeoutError:
+            deadline_reached = True
+            logger.warning(
+                f"Query deadline of {deadline.budget:.1f}s reached, returning partial results"
+            )
+        finally:
+            scheduler.cancel()
+            for task in producers:
+                task.cancel()
+            await scraped_queue.put(None)
+            await storer
+
+        enriched_sources = [stored[slot] for slot in sorted(stored)]
+        if previous:
+            logger.info(f"Reused {len(reused_slots)} of {len(enriched_sources)} sources from the last result")
+
+    partial = deadline_reached or any(
+        (s.metadata or {}).get("enrichment_missing") for s in enriched_sources
+    )
 
-        # Limit concurrent scraping to avoid overwhelming servers
-        semaphore = asyncio.Semaphore(5)  # Max 5 concurrent requests
+    # Calculate statistics
+    left_count = sum(1 for s in enriched_sources if s.political_leaning == "left")
+    center_count = sum(1 for s in enriched_sources if s.political_leaning == "center")
+    right_count = sum(1 for s in enriched_sources if s.political_leaning == "right")
+
+    stats = {
+        "total": len(enriched_sources),
+        "left_count": left_count,
+        "center_count": center_count,
+        "right_count": right_count,
+        "near_duplicates": scheduler.duplicates - len(repeated),
+    }
+
+    # Calculate timeline positioning
+    political_scores = [
+        s.political_score for s in enriched_sources if s.political_score is not None
+    ]
+    min_score = min(political_scores) if political_scores else 1.0
+    max_score = max(political_scores) if political_scores else 10.0
+
+    timeline_positioning = {"min_score": min_score, "max_score": max_score}
+
+    # Ensure stats is logged after it is defined
+    logger.info(f"Returning {len(enriched_sources)} sources with stats: {stats}")
+
+    response = NewsResponse(
+        query=request.query,
+        sources=enriched_sources,
+        statistics=stats,
+        timeline_positioning=timeline_positioning,
+        partial=partial,
+    )
 
-        async def scrape_with_semaphore(source):
-            async with semaphore:
-                return await scrape_website(source["url"])
+    logger.info(f"Query response generated successfully with {len(enriched_sources)} sources")
 
-        # Use semaphore to limit concurrent scraping
-        scrape_tasks = [scrape_with_semaphore(source) for source in balanced_sources]
-        scrape_results = await asyncio.gather(*scrape_tasks)
+    return response
 
-        # Combine scraped data with source info
-        enriched_sources = []
-        source_ids = []
-        failed_sources = []  # Track sources that failed due to HTTP errors
-        
-        for i, (source, scrape_result) in enumerate(zip(balanced_sources, scrape_results)):
-            if scrape_result["success"]:
-                # Merge source info with scraped data
-                enriched_source = {
-                    "title": scrape_result["title"] or source["title"],
-                    "url": source["url"],
-                    "source_name": source["source_name"],
-                    "political_leaning": source["political_leaning"],
-                    "political_score": source["political_score"],
-                    "snippet": source["snippet"],
-                    "text": scrape_result["text"],
-                    "published_date": scrape_result.get("published_date"),
-                    "domain": scrape_result.get("domain") or source.get("domain"),
-                    "favicon_url": scrape_result.get("favicon_url")
-                    or source.get("favicon_url"),
-                    "og_image": scrape_result.get("og_image"),
-                    "metadata": scrape_result.get("metadata", {}),
-                }
 
-                # Clean up formatting
-                cleaned_source = clean_source_formatting(enriched_source)
-
-                try:
-                    # Store in MongoDB
-                    result = await sources_collection.insert_one(cleaned_source)
-                    source_id = str(result.inserted_id)
-                    source_ids.append(source_id)
-
-                    # Convert MongoDB _id to string for response
-                    cleaned_source["_id"] = source_id
-                    enriched_sources.append(NewsSource(**cleaned_source))
-                    logger.info(f"Stored source in MongoDB with ID: {source_id}")
-                except Exception as e:
-                    logger.error(f"Error storing source in MongoDB: {str(e)}")
-                    # Still include the source in response even if MongoDB storage fails
-                    cleaned_source["_id"] = (
-                        "temp_" + hashlib.md5(source["url"].encode()).hexdigest()
-                    )
-                    enriched_sources.append(NewsSource(**cleaned_source))
-            else:
-                # If scraping failed, check for specific HTTP error codes
-                error_msg = scrape_result.get('error', 'Unknown error')
-                status_code = scrape_result.get('status_code', 0)
-                
-                logger.warning(f"Scraping failed for {source['url']}: {error_msg} (Status code: {status_code})")
-                
-                # For 404 and 403 errors, we'll completely skip this source and not include it in the response
-                if status_code in [404, 403]:
-                    logger.info(f"Dropping source with {status_code} error: {source['url']}")
-                    # Track failed sources by political leaning for potential replacement
-                    failed_sources.append({
-                        "index": i,
-                        "political_leaning": source["political_leaning"],
-                        "status_code": status_code
-                    })
-                    continue  # Skip this source entirely
-                
-                # Track other error types for potential replacement
-                if status_code in [429, 500, 502, 503, 504]:
-                    failed_sources.append({
-                        "index": i,
-                        "political_leaning": source["political_leaning"],
-                        "status_code": status_code
-                    })
-                
-                # Create fallback source with error information for non-404 errors
-                fallback_source = {
-                    "title": source["title"],
-                    "url": source["url"],
-                    "source_name": source["source_name"],
-                    "political_leaning": source["political_leaning"],
-                    "political_score": source["political_score"],
-                    "snippet": source["snippet"],
-                    "domain": source.get("domain"),
-                    "favicon_url": source.get("favicon_url"),
-                    "text": None,
-                    "metadata": {
-                        "error": error_msg,
-                        "status_code": status_code,
-                        "error_type": scrape_result.get("error_type", "ScrapingError")
+async def record_search_history(user_id: str, query_text: str, response: NewsResponse):
+    """Append a search and its results to a user's search history."""
+    try:
+        # Validate user_id format
+        if not ObjectId.is_valid(user_id):
+            logger.warning(f"Invalid user ID format: {user_id}")
+        else:
+            user = await resources.users_collection.find_one({"_id": ObjectId(user_id)})
+            if user:
+                # Create a serializable version of sources (without Pydantic models)
+                serializable_sources = []
+                for source in response.sources:
+                    # Convert each source to a dict for serialization
+                    source_dict = {
+                        "title": source.title,
+                        "url": source.url,
+                        "source_name": source.source_name,
+                        "political_leaning": source.political_leaning,
+                        "political_score": source.political_score,
+                        "snippet": source.snippet,
+                        "domain": source.domain,
+                        "favicon_url": source.favicon_url,
+                        # Include other fields that are serializable
+                    }
+                    serializable_sources.append(source_dict)
+
+                # Create search entry with serializable data
+                search_entry = {
+                    "_id": hashlib.md5(f"{query_text}-{datetime.now().isoformat()}".encode()).hexdigest(),
+                    "query": query_text,
+                    "timestamp": datetime.now().isoformat(),
+                    "sources": serializable_sources,
+                    "statistics": {
+                        "total": response.statistics["total"],
+                        "left_count": response.statistics["left_count"], 
+                        "center_count": response.statistics["center_count"],
+                        "right_count": response.statistics["right_count"]
+                    },
+                    "timeline_positioning": response.timeline_positioning,
+                    "resultCount": len(serializable_sources),
+                    # Add fields with names matching frontend expectations
+                    "stats": {
+                        "total": response.statistics["total"],
+                        "leftCount": response.statistics["left_count"],
+                        "centerCount": response.statistics["center_count"],
+                        "rightCount": response.statistics["right_count"]
                     }
                 }
 
-                # Clean up formatting
-                cleaned_source = clean_source_formatting(fallback_source)
-
-                try:
-                    # Store in MongoDB
-                    result = await sources_collection.insert_one(cleaned_source)
-                    source_id = str(result.inserted_id)
-                    source_ids.append(source_id)
-
-                    # Convert MongoDB _id to string for response
-                    cleaned_source["_id"] = source_id
-                    enriched_sources.append(NewsSource(**cleaned_source))
-                except Exception as e:
-                    logger.error(f"Error storing fallback source in MongoDB: {str(e)}")
-                    # Still include the source in response even if MongoDB storage fails
-                    cleaned_source["_id"] = (
-                        "temp_" + hashlib.md5(source["url"].encode()).hexdigest()
+                # Append the new search entry
+                search_history = user.get("searchHistory", [])
+                search_history.append(search_entry)
+
+                # Update the user's document
+                with server_timing.stage("mongo", metrics.MONGO_WRITE_SECONDS.labels(collection="users")):
+                    await resources.users_collection.update_one(
+                        {"_id": ObjectId(user_id)},
+                        {"$set": {"searchHistory": search_history}}
                     )
-                    enriched_sources.append(NewsSource(**cleaned_source))
-        
-        # If we have failed sources and we have extra sources available, try to replace them
-        if failed_sources and len(all_articles) > len(balanced_sources):
-            logger.info(f"Attempting to replace {len(failed_sources)} failed sources")
-            
-            # Group remaining articles by political leaning
-            remaining_articles = {}
-            for article in all_articles:
-                if article["url"] not in [source["url"] for source in balanced_sources]:
-                    leaning = article["political_leaning"]
-                    if leaning not in remaining_articles:
-                        remaining_articles[leaning] = []
-                    remaining_articles[leaning].append(article)
-            
-            # Try to replace each failed source with another from the same political leaning
-            for failed in failed_sources:
-                leaning = failed["political_leaning"]
-                if leaning in remaining_articles and remaining_articles[leaning]:
-                    replacement = remaining_articles[leaning].pop(0)
-                    logger.info(f"Replacing failed source ({failed['status_code']}) with alternative from same '{leaning}' leaning")
-                    
-                    # Scrape the replacement source
-                    try:
-                        replacement_result = await scrape_website(replacement["url"])
-                        if replacement_result["success"]:
-                            # Create enriched source from replacement
-                            replacement_enriched = {
-                                "title": replacement_result["title"] or replacement["title"],
-                                "url": replacement["url"],
-                                "source_name": replacement["source_name"],
-                                "political_leaning": replacement["political_leaning"],
-                                "political_score": replacement["political_score"],
-                                "snippet": replacement["snippet"],
-                                "text": replacement_result["text"],
-                                "published_date": replacement_result.get("published_date"),
-                                "domain": replacement_result.get("domain") or replacement.get("domain"),
-                                "favicon_url": replacement_result.get("favicon_url") or replacement.get("favicon_url"),
-                                "og_image": replacement_result.get("og_image"),
-                                "metadata": replacement_result.get("metadata", {})
-                            }
-                            
-                            # Clean up formatting
-                            cleaned_replacement = clean_source_formatting(replacement_enriched)
-                            
-                            try:
-                                # Store in MongoDB
-                                result = await sources_collection.insert_one(cleaned_replacement)
-                                source_id = str(result.inserted_id)
-                                source_ids.append(source_id)
-                                
-                                # Convert MongoDB _id to string for response
-                                cleaned_replacement["_id"] = source_id
-                                
-                                # Replace the failed source with this one
-                                enriched_sources[failed["index"]] = NewsSource(**cleaned_replacement)
-                                logger.info(f"Successfully replaced failed source with ID: {source_id}")
-                            except Exception as e:
-                                logger.error(f"Error storing replacement source in MongoDB: {str(e)}")
-                                # Still include the source in response even if MongoDB storage fails
-                                cleaned_replacement["_id"] = "temp_" + hashlib.md5(replacement["url"].encode()).hexdigest()
-                                enriched_sources[failed["index"]] = NewsSource(**cleaned_replacement)
-                    except Exception as e:
-                        logger.error(f"Error scraping replacement source: {str(e)}")
-        
-    
-        # Calculate statistics
-        left_count = sum(1 for s in enriched_sources if s.political_leaning == "left")
-        center_count = sum(1 for s in enriched_sources if s.political_leaning == "center")
-        right_count = sum(1 for s in enriched_sources if s.political_leaning == "right")
-
-        stats = {
-            "total": len(enriched_sources),
-            "left_count": left_count,
-            "center_count": center_count,
-            "right_count": right_count,
-        }
+                logger.info(f"Updated search history for user: {user_id}")
+    except Exception as e:
+        # Log the error but don't fail the entire request
+        logger.error(f"Error updating search history: {str(e)}")
+        # Continue with the response even if search history update fails
 
-        # Calculate timeline positioning
-        political_scores = [
-            s.political_score for s in enriched_sources if s.political_score is not None
-        ]
-        min_score = min(political_scores) if political_scores else 1.0
-        max_score = max(political_scores) if political_scores else 10.0
 
-        timeline_positioning = {"min_score": min_score, "max_score": max_score}
+# Identical searches in flight at the same time share one pipeline run
+query_flights = SingleFlight()
 
-        # Ensure stats is logged after it is defined
-        logger.info(f"Returning {len(enriched_sources)} sources with stats: {stats}")
-        
-        response = NewsResponse(
-            query=request.query,
-            sources=enriched_sources,
-            statistics=stats,
-            timeline_positioning=timeline_positioning,
+
+def query_flight_key(request: NewsRequest) -> Tuple:
+    """
+    The key under which identical /query requests share one pipeline run.
+
+    The deadline bounds the whole shared run, so only requests with the same
+    budget coalesce. Requests bringing their own API key, or recording or
+    replaying traffic, only coalesce with each other.
+    """
+    return (
+        normalize_query(request.query),
+        request.limit,
+        request.incremental,
+        query_budget(request),
+        request.api_key,
+        cassette.active_id(),
+    )
+
+
+def normalize_query(query_text: str) -> str:
+    """Normalize a search query so trivially different spellings share results."""
+    return " ".join(query_text.casefold().split())
+
+
+async def log_query(key: str, request: NewsRequest) -> None:
+    """Count a search in the query log that pre-warming picks hot and recurring queries from."""
+    try:
+        await resources.query_cache.log(key, request.query, request.limit)
+    except Exception as e:
+        logger.error(f"Error logging query: {str(e)}")
+
+
+async def load_sources(source_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Stored source documents by id, with their text decompressed; missing ids are left out."""
+    ids = [ObjectId(source_id) for source_id in source_ids if ObjectId.is_valid(source_id)]
+    documents = {}
+    async for document in resources.sources_collection.find({"_id": {"$in": ids}}, {"raw_text": 0, "raw_text_z": 0}):
+        document["_id"] = str(document["_id"])
+        documents[document["_id"]] = await resources.text_store.unpack(document)
+    # Near-duplicates are usually loaded with the source holding their text
+    for document in documents.values():
+        if document.get("text") is None and document.get("duplicate_of"):
+            primary = documents.get(document["duplicate_of"])
+            if primary is not None and primary.get("text") is not None:
+                document["text"] = primary["text"]
+            else:
+                document["text"] = await source_text(document)
+    return documents
+
+
+async def source_text(document: Dict[str, Any]) -> Optional[str]:
+    """A stored source's text, read from the source it is a near-duplicate of when it has none."""
+    text = await resources.text_store.read(document)
+    for _ in range(MAX_DUPLICATE_HOPS):
+        if text is not None or not ObjectId.is_valid(document.get("duplicate_of") or ""):
+            break
+        document = await resources.sources_collection.find_one(
+            {"_id": ObjectId(document["duplicate_of"])}, {"text": 1, "text_z": 1, "duplicate_of": 1}
         )
-        
-        logger.info(f"Query response generated successfully with {len(enriched_sources)} sources")
+        if document is None:
+            break
+        text = await resources.text_store.read(document)
+    return text
 
-        # Append search to user's search history
-        if request.user_id:
-            try:
-                # Validate user_id format
-                if not ObjectId.is_valid(request.user_id):
-                    logger.warning(f"Invalid user ID format: {request.user_id}")
-                else:
-                    user = await users_collection.find_one({"_id": ObjectId(request.user_id)})
-                    if user:
-                        # Create a serializable version of sources (without Pydantic models)
-                        serializable_sources = []
-                        for source in enriched_sources:
-                            # Convert each source to a dict for serialization
-                            source_dict = {
-                                "title": source.title,
-                                "url": source.url,
-                                "source_name": source.source_name,
-                                "political_leaning": source.political_leaning,
-                                "political_score": source.political_score,
-                                "snippet": source.snippet,
-                                "domain": source.domain,
-                                "favicon_url": source.favicon_url,
-                                # Include other fields that are serializable
-                            }
-                            serializable_sources.append(source_dict)
-                        
-                        # Create search entry with serializable data
-                        search_entry = {
-                            "_id": hashlib.md5(f"{request.query}-{datetime.now().isoformat()}".encode()).hexdigest(),
-                            "query": request.query,
-                            "timestamp": datetime.now().isoformat(),
-                            "sources": serializable_sources,
-                            "statistics": {
-                                "total": stats["total"],
-                                "left_count": stats["left_count"], 
-                                "center_count": stats["center_count"],
-                                "right_count": stats["right_count"]
-                            },
-                            "timeline_positioning": timeline_positioning,
-                            "resultCount": len(serializable_sources),
-                            # Add fields with names matching frontend expectations
-                            "stats": {
-                                "total": stats["total"],
-                                "leftCount": stats["left_count"],
-                                "centerCount": stats["center_count"],
-                                "rightCount": stats["right_count"]
-                            }
-                        }
-                        
-                        # Append the new search entry
-                        search_history = user.get("searchHistory", [])
-                        search_history.append(search_entry)
-                        
-                        # Update the user's document
-                        await users_collection.update_one(
-                            {"_id": ObjectId(request.user_id)},
-                            {"$set": {"searchHistory": search_history}}
-                        )
-                        logger.info(f"Updated search history for user: {request.user_id}")
-            except Exception as e:
-                # Log the error but don't fail the entire request
-                logger.error(f"Error updating search history: {str(e)}")
-                # Continue with the response even if search history update fails
 
+async def previous_sources(key: str) -> Dict[str, NewsSource]:
+    """
+    Sources of the last result cached for a query, however old, by URL.
+
+    Sources are keyed by the candidate URL they were scraped from, not the
+    page's rel=canonical URL they are stored under, since that is what the
+    next run's candidates are matched against. Only sources that were
+    scraped successfully are worth reusing; failed ones are tried again.
+    """
+    try:
+        entry = await resources.query_cache.latest(key)
+        if entry is None:
+            return {}
+        documents = await load_sources(entry["source_ids"])
+    except Exception as e:
+        logger.error(f"Error loading the previous result of a query: {str(e)}")
+        return {}
+    return {
+        document.get("requested_url") or canonical_url(document["url"]): NewsSource(**document)
+        for document in documents.values()
+        if document.get("text") and not (document.get("metadata") or {}).get("error")
+    }
+
+
+async def cached_response(key: str, request: NewsRequest) -> Tuple[Optional[NewsResponse], float]:
+    """A fresh cached result for the query, rebuilt from its stored sources, and its age in seconds."""
+    try:
+        entry = await resources.query_cache.get(key)
+        if entry is None:
+            return None, 0.0
+        documents = await load_sources(entry["source_ids"])
+        # A source that is gone makes the whole entry a miss
+        if len(documents) != len(entry["source_ids"]):
+            return None, 0.0
+        await resources.query_cache.record_hit(key)
+    except Exception as e:
+        logger.error(f"Error reading cached query result: {str(e)}")
+        return None, 0.0
+
+    response = NewsResponse(
+        query=request.query,
+        sources=[NewsSource(**documents[source_id]) for source_id in entry["source_ids"]],
+        statistics=entry["statistics"],
+        timeline_positioning=entry["timeline_positioning"],
+        partial=False,
+    )
+    logger.info(f"Served query from cache, refreshed {entry['age']:.0f}s ago: {request.query}")
+    return response, entry["age"]
+
+
+async def cache_query_result(key: str, request: NewsRequest, response: NewsResponse, seconds: float, refreshed_by: str):
+    """Cache a search result, unless it is partial or has sources that were not stored."""
+    source_ids = [source.id for source in response.sources]
+    if response.partial or any(not source_id or source_id.startswith("temp_") for source_id in source_ids):
+        return
+    try:
+        await resources.query_cache.put(
+            key,
+            request.query,
+            request.limit,
+            source_ids,
+            response.statistics,
+            response.timeline_positioning,
+            seconds,
+            refreshed_by,
+        )
+    except Exception as e:
+        logger.error(f"Error caching query result: {str(e)}")
+
+
+async def run_and_cache_query(request: NewsRequest, api_key: str, key: Optional[str]) -> NewsResponse:
+    """
+    Run the pipeline for a query and cache its result under ``key``, if given.
+
+    Incremental requests only scrape the candidates that were not in the
+    query's last cached result.
+    """
+    started = time.perf_counter()
+    previous = await previous_sources(key) if key is not None and request.incremental else None
+    response = await run_query_pipeline(request, api_key, previous=previous)
+    if key is not None:
+        await cache_query_result(key, request, response, time.perf_counter() - started, "query")
+    return response
+
+
+async def refresh_cached_query(query_text: str, limit: int):
+    """
+    Refresh a query's cached result ahead of demand, scraping at background priority.
+
+    The refresh runs as a /query flight: a user running the same search
+    meanwhile joins it, and a refresh that comes due while a user's search
+    is in flight joins that search instead of running its own.
+    """
+    request = NewsRequest(query=query_text, limit=limit)
+    key = cache_key(normalize_query(query_text), limit)
+
+    async def refresh() -> NewsResponse:
+        enrichments = NearDuplicates()
+        scrapes = SharedScrapes(
+            lambda url: scrape_and_enrich(url, enrichments, job_queue.PRIORITY_BACKGROUND),
+            SCRAPE_CONCURRENCY,
+            on_outcome=record_scrape_outcome,
+        )
+        started = time.perf_counter()
+        previous = await previous_sources(key)
+        response = await run_query_pipeline(request, PERPLEXITY_API_KEY, scrapes=scrapes, previous=previous)
+        await cache_query_result(key, request, response, time.perf_counter() - started, "prewarm")
         return response
+
+    _, shared = await query_flights.do(query_flight_key(request), refresh)
+    if shared:
+        logger.info(f"Pre-warm of {query_text!r} joined a search already in flight")
+
+
+class ModelResponse(Response):
+    """JSON straight from an already built model, skipping FastAPI's re-validation and re-encoding."""
+
+    media_type = "application/json"
+
+    def render(self, content: BaseModel) -> bytes:
+        return content.model_dump_json(by_alias=True).encode("utf-8")
+
+
+# Metadata the results grid uses; fields=summary responses keep only these keys
+SUMMARY_METADATA_KEYS = ("error", "status_code", "error_type", "enrichment_missing")
+
+
+def summary_source(source: NewsSource) -> Dict[str, Any]:
+    """A source without its article body and with only error metadata."""
+    data = source.model_dump(mode="json", by_alias=True, exclude={"text"})
+    metadata = data.get("metadata") or {}
+    data["metadata"] = {key: metadata[key] for key in SUMMARY_METADATA_KEYS if key in metadata}
+    return data
+
+
+def summary_response(response: NewsResponse) -> Dict[str, Any]:
+    """A NewsResponse without article bodies, for clients that load them from /source/{id}."""
+    data = response.model_dump(mode="json", by_alias=True, exclude={"sources"})
+    data["sources"] = [summary_source(source) for source in response.sources]
+    return data
+
+
+@router.post("/query", response_model=NewsResponse)
+async def query(request: NewsRequest, fields: Literal["full", "summary"] = "full"):
+    """
+    Fetch news articles from across the political spectrum based on the query.
+
+    With fields=summary, sources come without their text and with only
+    error metadata.
+    """
+    logger.info(f"Received query request: {request.query}")
+    logger.info(f"Request details: limit={request.limit}, api_key_provided={'Yes' if request.api_key else 'No'}")
+    # Every response is timed, whether it came from the cache, another request's run or its own
+    query_started = time.perf_counter()
+    served_from = "error"
+
+    try:
+        # Use API key from request if provided, otherwise use environment variable
+        api_key = request.api_key or PERPLEXITY_API_KEY
+
+        if not api_key:
+            raise HTTPException(status_code=401, detail="API key is required")
+
+        key = cache_key(normalize_query(request.query), request.limit)
+        # Recorded and replayed requests always run the pipeline; incremental: false asks for a
+        # fresh search, which skips the cached result but still refreshes it
+        use_cache = QUERY_CACHE_TTL_SECONDS > 0 and cassette.active_id() is None
+        response = None
+        if use_cache:
+            with server_timing.stage("cache"):
+                await log_query(key, request)
+                if request.incremental:
+                    response, age = await cached_response(key, request)
+            if request.incremental:
+                metrics.CACHE_REQUESTS.labels(cache="results", result="miss" if response is None else "hit").inc()
+
+        if response is not None:
+            served_from = "cache"
+            server_timing.note("cache", f"hit, refreshed {age:.0f}s ago")
+            headers = {"Age": str(int(age))}
+        else:
+            headers = None
+            started = time.perf_counter()
+            response, shared = await query_flights.do(
+                query_flight_key(request), lambda: run_and_cache_query(request, api_key, key if use_cache else None)
+            )
+            server_timing.record("pipeline", time.perf_counter() - started)
+            served_from = "in_flight" if shared else "pipeline"
+            metrics.CACHE_REQUESTS.labels(cache="in_flight", result="hit" if shared else "miss").inc()
+            if shared:
+                # The stages ran under the request that started the pipeline
+                server_timing.note("coalesced", "joined an in-flight query")
+                logger.info(f"Served query from in-flight request: {request.query}")
+                response = response.model_copy(update={"query": request.query})
+
+        # Per-user side effects happen for every caller, shared or not
+        if request.user_id:
+            with server_timing.stage("history"):
+                await record_search_history(request.user_id, request.query, response)
+
+        if fields == "summary":
+            return ORJSONResponse(summary_response(response), headers=headers)
+        return ModelResponse(response, headers=headers)
+    except HTTPException:
+        served_from = "error"
+        raise
     except Exception as e:
+        served_from = "error"
         logger.error(f"Error processing query: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+    finally:
+        metrics.QUERY_SECONDS.labels(served_from=served_from).observe(time.perf_counter() - query_started)
+
+
+@router.post("/batch_query")
+async def batch_query(request: BatchNewsRequest, fields: Literal["full", "summary"] = "full"):
+    """
+    Run many searches through one shared pipeline, streaming each result as it finishes.
+
+    The response is newline-delimited JSON: one line per query, in the order
+    they finish, with its ``index`` in the request and either the /query
+    response or an ``error``; then a last line with ``"done": true`` and
+    how many scrapes the batch shared. Queries of a batch scrape each URL
+    once between them, repeated queries run once, and at most
+    BATCH_QUERY_CONCURRENCY queries and BATCH_SCRAPE_CONCURRENCY page
+    scrapes run at a time.
+    """
+    api_key = request.api_key or PERPLEXITY_API_KEY
+    if not api_key:
+        raise HTTPException(status_code=401, detail="API key is required")
+    logger.info(f"Received batch of {len(request.queries)} queries")
+
+    # Repeated queries run once and answer for each of their positions
+    positions: Dict[str, List[int]] = {}
+    for index, query_text in enumerate(request.queries):
+        positions.setdefault(normalize_query(query_text), []).append(index)
+
+    # Wire copies found by one query of the batch are enriched once for all of them
+    enrichments = NearDuplicates()
+    scrapes = SharedScrapes(
+        lambda url: scrape_and_enrich(url, enrichments), BATCH_SCRAPE_CONCURRENCY, on_outcome=record_scrape_outcome
+    )
+    running = asyncio.Semaphore(BATCH_QUERY_CONCURRENCY)
 
+    async def run_one(indexes: List[int]) -> Tuple[List[int], Any]:
+        news_request = NewsRequest(
+            query=request.queries[indexes[0]], limit=request.limit, deadline_ms=request.deadline_ms
+        )
+        async with running:
+            try:
+                return indexes, await run_query_pipeline(news_request, api_key, scrapes=scrapes)
+            except Exception as e:
+                logger.error(f"Error processing batch query {news_request.query!r}: {str(e)}")
+                return indexes, e
+
+    def result_lines(indexes: List[int], result: Any) -> bytes:
+        lines = []
+        for index in indexes:
+            if isinstance(result, Exception):
+                line = {"index": index, "query": request.queries[index], "error": str(result)}
+            elif fields == "summary":
+                line = dict(summary_response(result), index=index, query=request.queries[index])
+            else:
+                line = dict(result.model_dump(mode="json", by_alias=True), index=index, query=request.queries[index])
+            lines.append(orjson.dumps(line) + b"\n")
+        return b"".join(lines)
+
+    async def stream():
+        tasks = [asyncio.create_task(run_one(indexes)) for indexes in positions.values()]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield result_lines(*await finished)
+            stats = dict(scrapes.stats(), queries=len(request.queries), queries_run=len(tasks))
+            logger.info(f"Batch finished: {stats}")
+            yield orjson.dumps({"done": True, "statistics": stats}) + b"\n"
+        finally:
+            # The client went away: stop the queries still running
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+def query_job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """The client-facing part of a query job document."""
+    view = {
+        "query_id": job["_id"],
+        "status": job["status"],
+        "query": job["request"]["query"],
+        "source_count": job.get("source_count", 0),
+        "created": job["created"].isoformat(),
+    }
+    for key in ("sources", "statistics", "timeline_positioning", "partial", "error"):
+        if key in job:
+            view[key] = job[key]
+    return view
+
+
+async def run_query_job(job_id: str, request: NewsRequest, api_key: str):
+    """Run a submitted query, saving each source to its job as it lands."""
+    jobs = resources.query_jobs
+    # Sources keep the order they landed in, so that ?since=N stays valid once the job is done
+    landed: List[Dict[str, Any]] = []
+
+    async def save_source(source: NewsSource):
+        landed.append(summary_source(source))
+        try:
+            await jobs.add_source(job_id, landed[-1])
+        except Exception as e:
+            logger.error(f"Error saving a source of query job {job_id}: {str(e)}")
 
-@app.get("/source/{source_id}")
-async def get_source(source_id: str):
-    """Retrieve a specific news source by ID."""
+    try:
+        response = await run_query_pipeline(request, api_key, on_source=save_source)
+        if request.user_id:
+            await record_search_history(request.user_id, request.query, response)
+        summary = summary_response(response)
+        await jobs.finish(
+            job_id,
+            query_jobs.DONE,
+            sources=landed,
+            statistics=summary["statistics"],
+            timeline_positioning=summary["timeline_positioning"],
+            partial=summary["partial"],
+        )
+    except asyncio.CancelledError:
+        await asyncio.shield(jobs.finish(job_id, query_jobs.CANCELLED))
+        raise
+    except Exception as e:
+        logger.error(f"Error running query job {job_id}: {str(e)}")
+        await jobs.finish(job_id, query_jobs.FAILED, error=str(e))
+
+
+@router.post("/queries", status_code=202)
+async def submit_query(
+    request: NewsRequest, response: Response, idempotency_key: Optional[str] = Header(None, max_length=200)
+):
+    """
+    Start a search in the background and return its query id at once.
+
+    Follow it with GET /queries/{id} or the GET /queries/{id}/events stream.
+    Resubmitting with the same Idempotency-Key returns the same query,
+    restarting it only if it failed or was cancelled.
+    """
+    api_key = request.api_key or PERPLEXITY_API_KEY
+    if not api_key:
+        raise HTTPException(status_code=401, detail="API key is required")
+
+    # API keys are only ever kept in memory
+    stored_request = request.model_dump(exclude={"api_key"})
+    request_hash = hashlib.sha1(request.model_dump_json(exclude={"api_key"}).encode()).hexdigest()
+    job, start = await resources.query_jobs.create(uuid.uuid4().hex, stored_request, request_hash, idempotency_key)
+    if job is None or job["request_hash"] != request_hash:
+        raise HTTPException(status_code=409, detail="Idempotency-Key was already used for a different query")
+    if start:
+        resources.query_jobs.start(job["_id"], run_query_job(job["_id"], request, api_key))
+    else:
+        response.status_code = 200
+
+    response.headers["Location"] = f"/queries/{job['_id']}"
+    view = query_job_view(job)
+    view.pop("sources", None)
+    return view
+
+
+@router.get("/queries/{query_id}")
+async def get_query_job(query_id: str, since: int = 0):
+    """A submitted query's status and sources so far; ``since`` skips sources already seen."""
+    job = await resources.query_jobs.get(query_id, since=max(0, since))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Query not found")
+    return query_job_view(job)
+
+
+def server_sent_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+
+@router.get("/queries/{query_id}/events")
+async def query_job_events(query_id: str, request: Request):
+    """
+    Server-sent events for a submitted query: a ``source`` event per source
+    as it lands, then one ``done``, ``failed`` or ``cancelled`` event with the
+    final statistics. Subscribing keeps the query from being abandoned.
+    """
+    if await resources.query_jobs.get(query_id) is None:
+        raise HTTPException(status_code=404, detail="Query not found")
+
+    async def events():
+        sent = 0
+        last_write = time.monotonic()
+        while True:
+            job = await resources.query_jobs.get(query_id, since=sent)
+            if job is None:
+                return
+            for source in job["sources"]:
+                yield server_sent_event("source", source)
+                sent += 1
+                last_write = time.monotonic()
+            if job["status"] != query_jobs.RUNNING:
+                view = query_job_view(job)
+                view.pop("sources", None)
+                yield server_sent_event(job["status"], view)
+                return
+            if await request.is_disconnected():
+                return
+            if time.monotonic() - last_write > QUERY_EVENTS_KEEPALIVE:
+                # Keeps proxies from closing a quiet stream
+                yield ": keep-alive\n\n"
+                last_write = time.monotonic()
+            await asyncio.sleep(QUERY_EVENTS_POLL_INTERVAL)
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.delete("/queries/{query_id}")
+async def cancel_query_job(query_id: str):
+    """Cancel a submitted query, wherever it runs; sources stored so far stay available."""
+    job = await resources.query_jobs.request_cancel(query_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Query not found")
+    return query_job_view(job)
+
+
+def source_etag(document: Dict[str, Any]) -> str:
+    """ETag of a stored source document, as read with a given projection."""
+    return f'W/"{hashlib.sha1(bson.encode(document)).hexdigest()[:20]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag.removeprefix("W/") for tag in if_none_match.split(","))
+
+
+def source_projection(fields: Optional[str]) -> Dict[str, int]:
+    """
+    Mongo projection for a /source request's ``fields`` list.
+
+    Only the named fields are read, with the compressed copies they may be
+    stored as. The whole page's text is left out unless ``raw_text`` is
+    named; with no list, everything else is returned.
+    """
+    names = {name.strip() for name in (fields or "").split(",") if name.strip()}
+    if not names:
+        return {"raw_text": 0, "raw_text_z": 0}
+    projection = {name: 1 for name in names}
+    if "text" in names:
+        projection["text_z"] = 1
+        projection["duplicate_of"] = 1
+    if "raw_text" in names:
+        projection["raw_text_z"] = 1
+    return projection
+
+
+@router.get("/source/{source_id}")
+async def get_source(
+    source_id: str,
+    response: Response,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Retrieve a specific news source by ID.
+
+    ``fields`` is an optional comma-separated list of fields to return.
+    Responses carry an ETag; a matching If-None-Match gets a 304.
+    """
     try:
         logger.info(f"Fetching source with ID: {source_id}")
 
@@ -1115,23 +1699,34 @@ async def get_source(source_id: str):
         object_id = ObjectId(source_id)
 
         # Try to find the source
-        source = await sources_collection.find_one({"_id": object_id})
+        projection = source_projection(fields)
+        source = await resources.sources_collection.find_one({"_id": object_id}, projection)
 
         if not source:
             logger.warning(f"Source not found with ID: {source_id}")
             return None
 
+        # Compare before decompressing anything
+        etag = source_etag(source)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+
         # Convert MongoDB _id to string for response
         source["_id"] = str(source["_id"])
+        await resources.text_store.unpack(source)
+        if source.get("duplicate_of") and ("text" in projection or "raw_text" in projection):
+            source["text"] = await source_text(source)
 
-        logger.info(f"Successfully retrieved source: {source['title']}")
+        logger.info(f"Successfully retrieved source: {source.get('title')}")
         return source
     except Exception as e:
         logger.error(f"Unexpected error in get_source: {str(e)}")
         return None
 
 
-@app.post("/followup/{source_id}")
+@router.post("/followup/{source_id}")
 async def follow_up_question(source_id: str, request: FollowUpRequest):
     """Answer a follow-up question about a specific source using its content."""
     try:
@@ -1157,7 +1752,7 @@ async def follow_up_question(source_id: str, request: FollowUpRequest):
             }
 
         # Retrieve the source from MongoDB
-        source = await sources_collection.find_one({"_id": ObjectId(source_id)})
+        source = await resources.sources_collection.find_one({"_id": ObjectId(source_id)}, {"raw_text": 0, "raw_text_z": 0})
 
         if not source:
             logger.warning(f"Source not found with ID: {source_id}")
@@ -1168,7 +1763,8 @@ async def follow_up_question(source_id: str, request: FollowUpRequest):
             }
 
         # If the source has no text content, we can't answer questions
-        if not source.get("text"):
+        text = await source_text(source)
+        if not text:
             logger.warning(f"No text content for source: {source_id}")
             return {
                 "question": request.question,
@@ -1179,7 +1775,7 @@ async def follow_up_question(source_id: str, request: FollowUpRequest):
             }
 
         # Simple keyword-based answering if OpenAI API key is not available
-        if not OPENAI_API_KEY:
+        if resources.openai is None:
             logger.info("Using keyword-based answering (no OpenAI API key)")
 
             # Convert question to keywords
@@ -1205,7 +1801,6 @@ async def follow_up_question(source_id: str, request: FollowUpRequest):
             ]
 
             # Find paragraphs containing keywords
-            text = source.get("text", "")
             paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
 
             relevant_paragraphs = []
@@ -1236,19 +1831,13 @@ async def follow_up_question(source_id: str, request: FollowUpRequest):
             logger.info("Using OpenAI for follow-up question")
 
             try:
-                # Import OpenAI client
-                from openai import OpenAI
-
-                # Initialize client
-                client = OpenAI(api_key=OPENAI_API_KEY)
-
                 # Create prompt for OpenAI
                 prompt = f"""
                 Answer the following question based ONLY on the information in the text below.
                 If the answer cannot be determined from the text, say so clearly.
                 
                 TEXT:
-                {source.get("text")[:4000]}
+                {text[:4000]}
                 
                 QUESTION: {request.question}
                 
@@ -1256,18 +1845,19 @@ async def follow_up_question(source_id: str, request: FollowUpRequest):
                 """
 
                 # Call OpenAI API
-                response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You are a helpful assistant that answers questions based solely on the provided text.",
-                        },
-                        {"role": "user", "content": prompt},
-                    ],
-                    temperature=0.1,
-                    max_tokens=300,
-                )
+                with server_timing.stage("llm", metrics.LLM_SECONDS.labels(operation="followup")):
+                    response = await resources.openai.chat.completions.create(
+                        model="gpt-3.5-turbo",
+                        messages=[
+                            {
+                                "role": "system",
+                                "content": "You are a helpful assistant that answers questions based solely on the provided text.",
+                            },
+                            {"role": "user", "content": prompt},
+                        ],
+                        temperature=0.1,
+                        max_tokens=300,
+                    )
 
                 # Extract answer from response
                 answer = response.choices[0].message.content.strip()
@@ -1298,21 +1888,24 @@ async def follow_up_question(source_id: str, request: FollowUpRequest):
             "source_id": source_id,
         }
 
-@app.post("/register")
+@router.post("/register")
 async def register(request: RegisterRequest):
     """Register a new user."""
     try:
         # Check if user already exists
-        existing_user = await users_collection.find_one({"email": request.email})
+        existing_user = await resources.users_collection.find_one({"email": request.email})
 
         if existing_user:
             return {"error": "User already exists"}
 
         # Hash the password
-        hashed_password = bcrypt.hashpw(request.password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        # bcrypt is slow by design; hash in a thread so other requests keep being served
+        hashed_password = (
+            await asyncio.to_thread(bcrypt.hashpw, request.password.encode('utf-8'), bcrypt.gensalt())
+        ).decode('utf-8')
 
         # Store the new user
-        result = await users_collection.insert_one({
+        result = await resources.users_collection.insert_one({
             "email": request.email,
             "password": hashed_password,
             "theme": "light",  # Default theme preference
@@ -1326,18 +1919,18 @@ async def register(request: RegisterRequest):
         logger.error(f"Error registering user: {str(e)}")
         return {"error": "Failed to register user"}
 
-@app.post("/login")
+@router.post("/login")
 async def login(request: LoginRequest):
     """Login a user."""
     try:
         # Check if user exists
-        user = await users_collection.find_one({"email": request.email})
+        user = await resources.users_collection.find_one({"email": request.email})
 
         if not user:
             return {"error": "User not found"}
 
         # Check password
-        if not bcrypt.checkpw(request.password.encode('utf-8'), user["password"].encode('utf-8')):
+        if not await asyncio.to_thread(bcrypt.checkpw, request.password.encode('utf-8'), user["password"].encode('utf-8')):
             return {"error": "Invalid password"}
         
         return {"message": "Login successful", "userId": str(user["_id"])}
@@ -1345,7 +1938,7 @@ async def login(request: LoginRequest):
         logger.error(f"Error logging in: {str(e)}")
         return {"error": "Failed to login"}
 
-@app.get("/user/{user_id}/history")
+@router.get("/user/{user_id}/history")
 async def get_user_history(user_id: str):
     """Retrieve a user's search history."""
     try:
@@ -1353,7 +1946,7 @@ async def get_user_history(user_id: str):
         if not ObjectId.is_valid(user_id):
             raise HTTPException(status_code=400, detail="Invalid user ID format")
             
-        user = await users_collection.find_one({"_id": ObjectId(user_id)})
+        user = await resources.users_collection.find_one({"_id": ObjectId(user_id)})
         
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
@@ -1393,7 +1986,7 @@ async def get_user_history(user_id: str):
         logger.error(f"Error retrieving user history: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to retrieve history: {str(e)}")
 
-@app.delete("/user/{user_id}/history")
+@router.delete("/user/{user_id}/history")
 async def delete_all_user_history(user_id: str):
     """Delete all search history for a user."""
     try:
@@ -1401,13 +1994,13 @@ async def delete_all_user_history(user_id: str):
         if not ObjectId.is_valid(user_id):
             raise HTTPException(status_code=400, detail="Invalid user ID format")
             
-        user = await users_collection.find_one({"_id": ObjectId(user_id)})
+        user = await resources.users_collection.find_one({"_id": ObjectId(user_id)})
         
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
             
         # Update user document to clear search history
-        result = await users_collection.update_one(
+        result = await resources.users_collection.update_one(
             {"_id": ObjectId(user_id)},
             {"$set": {"searchHistory": []}}
         )
@@ -1422,7 +2015,7 @@ async def delete_all_user_history(user_id: str):
         logger.error(f"Error deleting user history: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to delete history: {str(e)}")
 
-@app.delete("/user/{user_id}/history/{history_id}")
+@router.delete("/user/{user_id}/history/{history_id}")
 async def delete_specific_history(user_id: str, history_id: str):
     """Delete a specific history item for a user."""
     try:
@@ -1430,7 +2023,7 @@ async def delete_specific_history(user_id: str, history_id: str):
         if not ObjectId.is_valid(user_id):
             raise HTTPException(status_code=400, detail="Invalid user ID format")
             
-        user = await users_collection.find_one({"_id": ObjectId(user_id)})
+        user = await resources.users_collection.find_one({"_id": ObjectId(user_id)})
         
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
@@ -1461,7 +2054,7 @@ async def delete_specific_history(user_id: str, history_id: str):
             raise HTTPException(status_code=404, detail="History item not found")
             
         # Update user document with filtered history
-        result = await users_collection.update_one(
+        result = await resources.users_collection.update_one(
             {"_id": ObjectId(user_id)},
             {"$set": {"searchHistory": filtered_history}}
         )
@@ -1476,7 +2069,7 @@ async def delete_specific_history(user_id: str, history_id: str):
         logger.error(f"Error deleting history item: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to delete history item: {str(e)}")
 
-@app.post("/user/{user_id}/theme")
+@router.post("/user/{user_id}/theme")
 async def set_user_theme(user_id: str, request: ThemePreferenceRequest):
     """Set a user's theme preference."""
     try:
@@ -1488,13 +2081,13 @@ async def set_user_theme(user_id: str, request: ThemePreferenceRequest):
         if request.theme not in ["light", "dark"]:
             raise HTTPException(status_code=400, detail="Theme must be 'light' or 'dark'")
             
-        user = await users_collection.find_one({"_id": ObjectId(user_id)})
+        user = await resources.users_collection.find_one({"_id": ObjectId(user_id)})
         
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
             
         # Update user's theme preference
-        result = await users_collection.update_one(
+        result = await resources.users_collection.update_one(
             {"_id": ObjectId(user_id)},
             {"$set": {"theme": request.theme}}
         )
@@ -1509,7 +2102,7 @@ async def set_user_theme(user_id: str, request: ThemePreferenceRequest):
         logger.error(f"Error setting user theme: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to set theme preference: {str(e)}")
 
-@app.get("/user/{user_id}/theme")
+@router.get("/user/{user_id}/theme")
 async def get_user_theme(user_id: str):
     """Get a user's theme preference."""
     try:
@@ -1517,7 +2110,7 @@ async def get_user_theme(user_id: str):
         if not ObjectId.is_valid(user_id):
             raise HTTPException(status_code=400, detail="Invalid user ID format")
             
-        user = await users_collection.find_one({"_id": ObjectId(user_id)})
+        user = await resources.users_collection.find_one({"_id": ObjectId(user_id)})
         
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
@@ -1532,13 +2125,13 @@ async def get_user_theme(user_id: str):
         logger.error(f"Error retrieving user theme: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get theme preference: {str(e)}")
 
-@app.post("/bookmark")
+@router.post("/bookmark")
 async def add_bookmark(request: BookmarkRequest):
     try:
         news_source_dict = request.news_source.dict()
         
         # Update the user's bookmarks array using $addToSet to prevent duplicates
-        await users_collection.update_one(
+        await resources.users_collection.update_one(
             {"_id": ObjectId(request.user_id)},
             {"$addToSet": {"bookmarks": news_source_dict}},
         )
@@ -1547,7 +2140,7 @@ async def add_bookmark(request: BookmarkRequest):
         logger.error(f"Error adding bookmark: {str(e)}")
         raise HTTPException(status_code=500, detail="Error adding bookmark")
 
-@app.get("/user/{user_id}/bookmarks")
+@router.get("/user/{user_id}/bookmarks")
 async def get_bookmarks(user_id: str):
     """Retrieve a user's bookmarks."""
     try:
@@ -1555,7 +2148,7 @@ async def get_bookmarks(user_id: str):
         if not ObjectId.is_valid(user_id):
             raise HTTPException(status_code=400, detail="Invalid user ID format")
             
-        user = await users_collection.find_one({"_id": ObjectId(user_id)})
+        user = await resources.users_collection.find_one({"_id": ObjectId(user_id)})
         
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
@@ -1571,9 +2164,30 @@ async def get_bookmarks(user_id: str):
 
 
 
+def create_app() -> FastAPI:
+    """Build the API app; each worker process opens its own resources when it starts serving."""
+    app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+    # Innermost, so it sees responses whole rather than re-chunked by the middleware below
+    app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MINIMUM_BYTES)
+    app.middleware("http")(timing_and_profiling)
+    app.middleware("http")(record_and_replay)
+    # Enable CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.include_router(router)
+    return app
+
+
+# For `uvicorn api:app`; multi-worker launches use `uvicorn api:create_app --factory --workers N`
+app = create_app()
 
 
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run("api:create_app", factory=True, host="0.0.0.0", port=8000, workers=WEB_CONCURRENCY)
@@ -0,0 +1 @@
+"""Offline benchmarks for the Panorama server. Run from the server directory."""
@@ -0,0 +1,91 @@
+"""
+Micro-benchmark for the Perplexity response parser.
+
+Parses every saved response in fixtures/perplexity, then parses synthetic
+responses built by repeating those fixtures with unique URLs to check that
+parse time grows linearly with response size.
+
+Usage (from the server directory):
+    python -m benchmarks.bench_perplexity_parser [--repeat 200] [--json]
+"""
+
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from perplexity_parser import URL_PATTERN, parse_articles
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "perplexity"
+SCALES = [1, 4, 16, 64]
+
+
+def load_fixtures() -> Dict[str, str]:
+    return {path.stem: path.read_text() for path in sorted(FIXTURE_DIR.glob("*.md"))}
+
+
+def scaled_response(content: str, scale: int) -> str:
+    """Repeat a response ``scale`` times, giving every copy its own URLs."""
+    copies = []
+    for i in range(scale):
+        copies.append(URL_PATTERN.sub(lambda m: f"{m.group(0).rstrip('/')}-{i}", content))
+    return "\n\n".join(copies)
+
+
+def time_parse(content: str, repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse_articles(content, "benchmark", "center")
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def run(repeat: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    fixtures = load_fixtures()
+    combined = "\n\n".join(fixtures.values())
+
+    for name, content in fixtures.items():
+        timings = time_parse(content, repeat)
+        results[name] = {
+            "bytes": len(content.encode()),
+            "articles": len(parse_articles(content, "benchmark", "center")),
+            "median_us": statistics.median(timings) * 1e6,
+        }
+
+    for scale in SCALES:
+        content = scaled_response(combined, scale)
+        timings = time_parse(content, max(1, repeat // scale))
+        median = statistics.median(timings)
+        results[f"scaled_x{scale}"] = {
+            "bytes": len(content.encode()),
+            "articles": len(parse_articles(content, "benchmark", "center")),
+            "median_us": median * 1e6,
+            "us_per_kb": median * 1e6 / (len(content.encode()) / 1024),
+        }
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200, help="parses per fixture")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'case':<28}{'bytes':>10}{'articles':>10}{'median us':>12}{'us/KB':>10}")
+    for name, row in results.items():
+        per_kb = f"{row['us_per_kb']:.1f}" if "us_per_kb" in row else ""
+        print(f"{name:<28}{row['bytes']:>10}{row['articles']:>10}{row['median_us']:>12.1f}{per_kb:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+Offline benchmark for the scrape/extract pipeline.
+
+Serves the saved news pages in fixtures/html and the saved Perplexity
+responses in fixtures/perplexity from a local HTTP stand-in, then measures
+
+  - scrape_website: pages/s at a fixed concurrency, p50/p99 latency per
+    page, median latency and stored text size per fixture and the process's
+    peak RSS,
+  - get_articles_from_perplexity: time per call against the stand-in,
+    which is dominated by parsing the response,
+  - clean_source_formatting: time per source document.
+
+Metadata enrichment is skipped (no OpenAI key), so only our own code and
+the local HTTP round trip are measured.
+
+Results can be saved with --output and compared against an earlier run with
+--baseline; the exit code is 1 if any timing got worse by more than
+--tolerance. Keep baselines outside the repo or name them *.json, which git
+ignores; numbers are only comparable on the same machine.
+
+Usage (from the server directory):
+    python -m benchmarks.bench_pipeline [--rounds 5] [--concurrency 8]
+        [--output results.json] [--baseline baseline.json] [--tolerance 0.15]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List
+
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017/panorama_benchmark")
+
+import api  # noqa: E402
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures"
+HTML_DIR = FIXTURE_DIR / "html"
+PERPLEXITY_DIR = FIXTURE_DIR / "perplexity"
+
+# Metrics where a larger number is an improvement; everything else is a cost
+HIGHER_IS_BETTER = ("pages_per_s",)
+
+
+def load_pages() -> Dict[str, bytes]:
+    return {path.stem: path.read_bytes() for path in sorted(HTML_DIR.glob("*.html"))}
+
+
+def load_responses() -> Dict[str, str]:
+    return {path.stem: path.read_text() for path in sorted(PERPLEXITY_DIR.glob("*.md"))}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class StandIn:
+    """Local HTTP server playing both the news sites and the Perplexity API."""
+
+    def __init__(self, pages: Dict[str, bytes], responses: Dict[str, str]):
+        self.pages = pages
+        self.responses = responses
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def _handler(self):
+        pages, responses = self.pages, self.responses
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately; don't let Nagle delay the body
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                name = self.path.strip("/").split("/")[-1]
+                if name in pages:
+                    self._send(200, pages[name], "text/html")
+                else:
+                    self._send(404, b"Not found", "text/plain")
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                # The query names the fixture to answer with
+                question = payload["messages"][-1]["content"]
+                name = next((n for n in responses if question.startswith(n)), None)
+                if name is None:
+                    self._send(404, b"{}", "application/json")
+                    return
+                body = {"choices": [{"message": {"content": responses[name]}}]}
+                self._send(200, json.dumps(body).encode(), "application/json")
+
+        return Handler
+
+    def __enter__(self) -> "StandIn":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+async def bench_scrape(stand_in: StandIn, rounds: int, concurrency: int) -> Dict[str, Any]:
+    names = list(stand_in.pages)
+    per_page: Dict[str, List[float]] = {name: [] for name in names}
+    text_chars: Dict[str, int] = {}
+
+    # Warm up imports, parser caches and the connection path
+    for name in names:
+        result = await api.scrape_website(f"{stand_in.url}/news/{name}")
+        text_chars[name] = len(result.get("text") or "")
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def scrape(name: str) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            result = await api.scrape_website(f"{stand_in.url}/news/{name}")
+            per_page[name].append(time.perf_counter() - started)
+            if not result["success"]:
+                raise RuntimeError(f"Scraping fixture {name} failed: {result.get('error')}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(scrape(name) for _ in range(rounds) for name in names))
+    elapsed = time.perf_counter() - started
+
+    latencies = [seconds for timings in per_page.values() for seconds in timings]
+    return {
+        "pages": len(latencies),
+        "pages_per_s": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+        "median_ms": {
+            name: statistics.median(timings) * 1000 for name, timings in per_page.items()
+        },
+        "text_chars": text_chars,
+    }
+
+
+async def bench_perplexity(stand_in: StandIn, rounds: int) -> Dict[str, Any]:
+    # A gateway without client-side pacing, pointed at the stand-in
+    api.perplexity = api.PerplexityGateway(
+        f"{stand_in.url}/chat/completions", rate_per_second=1e6, burst=10 ** 6
+    )
+    results = {}
+    for name in stand_in.responses:
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            articles = await api.get_articles_from_perplexity(name, "center", "benchmark-key")
+            timings.append(time.perf_counter() - started)
+        results[name] = {"articles": len(articles), "median_us": statistics.median(timings) * 1e6}
+    await api.perplexity.aclose()
+    return results
+
+
+def source_documents(pages: Dict[str, bytes], responses: Dict[str, str]) -> List[Dict[str, Any]]:
+    """Raw source documents as the pipeline builds them before cleaning."""
+    candidates = []
+    for name, content in responses.items():
+        candidates.extend(api.parse_articles(content, name, "center"))
+    texts = [page.decode("utf-8", errors="replace")[:20000] for page in pages.values()]
+
+    documents = []
+    for i, candidate in enumerate(candidates):
+        document = dict(candidate, political_score=5.0, text=texts[i % len(texts)], metadata={})
+        # Every other document carries the formatting noise the cleaner exists for
+        if i % 2:
+            document["title"] = f"Article Title: {document['title']}"
+            document["source_name"] = f"Source: **{document['source_name']}**"
+            document["snippet"] = f"**Summary:** {document['snippet']} **Key point** here"
+        documents.append(document)
+    return documents
+
+
+def bench_clean(documents: List[Dict[str, Any]], rounds: int) -> Dict[str, Any]:
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for document in documents:
+            api.clean_source_formatting(document)
+        timings.append((time.perf_counter() - started) / len(documents))
+    return {"documents": len(documents), "median_us": statistics.median(timings) * 1e6}
+
+
+def run(rounds: int, concurrency: int) -> Dict[str, Any]:
+    pages = load_pages()
+    responses = load_responses()
+
+    async def main():
+        # Without an OpenAI key, so only extraction is measured; MongoDB is never reached
+        await api.resources.open(os.environ["MONGODB_URL"], scrape_timeout=api.SCRAPE_TIMEOUT)
+        try:
+            with StandIn(pages, responses) as stand_in:
+                return {
+                    "scrape_website": await bench_scrape(stand_in, rounds, concurrency),
+                    "get_articles_from_perplexity": await bench_perplexity(stand_in, rounds * 20),
+                }
+        finally:
+            await api.resources.aclose()
+
+    results = asyncio.run(main())
+    results["clean_source_formatting"] = bench_clean(source_documents(pages, responses), rounds * 20)
+    return results
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, float):
+            flat[name] = value
+    return flat
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Describe every timing that is worse than the baseline by more than ``tolerance``."""
+    regressions = []
+    current = flatten(results)
+    for name, before in flatten(baseline).items():
+        after = current.get(name)
+        if after is None or before <= 0:
+            continue
+        change = (after - before) / before
+        if name.endswith(HIGHER_IS_BETTER):
+            change = -change
+        if change > tolerance:
+            regressions.append(f"{name}: {before:.2f} -> {after:.2f} ({change:+.0%} worse)")
+    return regressions
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    scrape = results["scrape_website"]
+    print(
+        f"scrape_website: {scrape['pages']} pages, {scrape['pages_per_s']:.1f} pages/s, "
+        f"p50 {scrape['p50_ms']:.1f} ms, p99 {scrape['p99_ms']:.1f} ms, peak RSS {scrape['peak_rss_mb']:.0f} MB"
+    )
+    for name, median in scrape["median_ms"].items():
+        size = (HTML_DIR / f"{name}.html").stat().st_size
+        text = scrape["text_chars"].get(name, 0)
+        print(f"  {name:<28}{size:>10} B{median:>10.2f} ms{text:>10} chars of text")
+
+    print("get_articles_from_perplexity:")
+    for name, row in results["get_articles_from_perplexity"].items():
+        print(f"  {name:<28}{row['articles']:>6} articles{row['median_us']:>10.0f} us")
+
+    clean = results["clean_source_formatting"]
+    print(f"clean_source_formatting: {clean['median_us']:.1f} us per document ({clean['documents']} documents)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5, help="scrapes per page fixture")
+    parser.add_argument("--concurrency", type=int, default=api.SCRAPE_CONCURRENCY)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against results saved with --output")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown, as a fraction")
+    args = parser.parse_args()
+
+    # Per-page INFO logs would dominate the timings
+    logging.disable(logging.INFO)
+
+    results = run(args.rounds, args.concurrency)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
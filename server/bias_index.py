@@ -0,0 +1,138 @@
+"""
+Domain bias index: where a news outlet sits on the 1-10 political scale.
+
+Scores come from a versioned table of domains, domain_bias.json next to
+this file, optionally extended or overridden by external files (later
+files win). Domains are looked up by their registrable domain (eTLD+1),
+so ``edition.cnn.com`` and ``www.cnn.com`` both find ``cnn.com``; an entry
+for a full host name takes precedence over its registrable domain.
+
+External files are JSON in the same format as the bundled table
+(``{"version": ..., "domains": {"example.com": 4.5}}``) or CSV with
+``domain,score`` rows.
+
+Registrable domains use tldextract's bundled public suffix list when it is
+installed, and a short list of the multi-label suffixes common among news
+sites otherwise.
+"""
+
+import csv
+import json
+import logging
+import os
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+try:
+    import tldextract
+
+    # The snapshot shipped with the package; never fetched at runtime
+    _extract = tldextract.TLDExtract(suffix_list_urls=())
+except ImportError:
+    _extract = None
+
+logger = logging.getLogger(__name__)
+
+BUNDLED_TABLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "domain_bias.json")
+
+# Score bands of the leanings, on the scale the timeline uses
+LEANING_BANDS = {
+    "left": (1.0, 4.0),
+    "center": (4.0, 7.0),
+    "right": (7.0, 10.0),
+}
+
+# Public suffixes of more than one label, for when tldextract is not installed
+MULTI_LABEL_SUFFIXES = {
+    "co.uk", "org.uk", "ac.uk", "gov.uk", "ltd.uk", "plc.uk", "me.uk",
+    "com.au", "net.au", "org.au", "gov.au", "co.nz", "org.nz", "govt.nz",
+    "co.in", "net.in", "org.in", "co.jp", "ne.jp", "or.jp", "co.kr", "or.kr",
+    "co.za", "org.za", "co.il", "org.il", "com.br", "com.mx", "com.ar",
+    "com.co", "com.pe", "com.sg", "com.hk", "com.tw", "com.cn", "com.tr",
+    "com.pk", "com.ng", "com.eg", "com.sa", "com.my", "com.ph", "co.ke",
+}
+
+
+def registrable_domain(url_or_host: str) -> str:
+    """The eTLD+1 of a URL or host name, lowercased and without a port."""
+    host = url_or_host
+    if "//" in host:
+        host = urlparse(host).hostname or ""
+    host = host.split(":")[0].strip(".").lower()
+    if _extract is not None:
+        parts = _extract(host)
+        if parts.domain and parts.suffix:
+            return f"{parts.domain}.{parts.suffix}"
+        return host
+    labels = host.split(".")
+    if len(labels) > 2 and ".".join(labels[-2:]) in MULTI_LABEL_SUFFIXES:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+def leaning_for(score: float) -> str:
+    """The leaning whose band holds ``score``."""
+    if score < LEANING_BANDS["left"][1]:
+        return "left"
+    if score < LEANING_BANDS["center"][1]:
+        return "center"
+    return "right"
+
+
+def band_midpoint(leaning: str) -> float:
+    low, high = LEANING_BANDS[leaning]
+    return (low + high) / 2
+
+
+class BiasIndex:
+    """Bias scores by domain, looked up in constant time."""
+
+    def __init__(self, scores: Dict[str, float], version: str):
+        self._scores = scores
+        self.version = version
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def score(self, url: str) -> Optional[float]:
+        """The bias score of the site ``url`` is on, or None if the site isn't rated."""
+        host = (urlparse(url).hostname or "").lower()
+        if host.startswith("www."):
+            host = host[4:]
+        score = self._scores.get(host)
+        if score is None:
+            score = self._scores.get(registrable_domain(host))
+        return score
+
+    @classmethod
+    def load(cls, extra_files: Iterable[str] = ()) -> "BiasIndex":
+        """The bundled table, then each of ``extra_files`` on top of it."""
+        scores: Dict[str, float] = {}
+        versions: List[str] = []
+        for path in [BUNDLED_TABLE, *extra_files]:
+            try:
+                version, table = _read_table(path)
+            except Exception as e:
+                logger.error(f"Could not load domain bias table {path}: {str(e)}")
+                continue
+            for domain, score in table.items():
+                domain = domain.strip().lower()
+                if domain.startswith("www."):
+                    domain = domain[4:]
+                scores[domain] = min(10.0, max(1.0, float(score)))
+            versions.append(version)
+        index = cls(scores, "+".join(versions))
+        logger.info(f"Loaded domain bias index {index.version} with {len(index)} domains")
+        return index
+
+
+def _read_table(path: str):
+    if path.endswith(".csv"):
+        with open(path, newline="") as f:
+            rows = [row for row in csv.reader(f) if row and not row[0].startswith("#")]
+        if rows and rows[0][0].strip().lower() == "domain":
+            rows = rows[1:]
+        return os.path.basename(path), {row[0]: row[1] for row in rows}
+    with open(path) as f:
+        data = json.load(f)
+    return str(data.get("version", os.path.basename(path))), data["domains"]
@@ -0,0 +1,312 @@
+"""
+Record and replay of outbound HTTP traffic.
+
+Every upstream HTTP client (Perplexity, page scraping, OpenAI) is built on
+``AsyncTransport``. Normally it passes requests straight through. While a request to this API is being recorded, each outbound
+exchange is also captured into a cassette: status, headers, raw body and
+how long it took, or the transport error it raised, or that it was
+cancelled. While a request is being replayed, exchanges are answered from
+a cassette instead of the network, either after their recorded latency or
+immediately.
+
+Cassettes are gzipped JSON lines in the cassette directory, one per API
+request. Outbound request headers are never stored, and request bodies only
+as a hash used for matching. The API request a cassette belongs to is
+stored with credentials and user identifiers in its JSON body redacted, and
+without its body if that isn't JSON.
+
+Inspect cassettes with:
+    python cassette.py list [--dir cassettes]
+    python cassette.py show <cassette id> [--dir cassettes]
+"""
+
+import argparse
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+import httpx
+
+REQUEST_HEADER = "X-Panorama-Cassette"
+TIMING_HEADER = "X-Panorama-Replay-Timing"
+RESPONSE_HEADER = "X-Cassette-Id"
+
+RECORD = "record"
+REPLAY = "replay"
+
+CASSETTE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# Fields of API request bodies that are never written to a cassette
+REDACTED_FIELDS = {"api_key", "user_id", "password", "email", "token"}
+REDACTED = "[redacted]"
+
+
+def _body_hash(body: bytes) -> str:
+    return hashlib.sha1(body).hexdigest()[:16]
+
+
+def _key(method: str, url: str, body: bytes) -> str:
+    return f"{method} {url} {_body_hash(body)}"
+
+
+def _redact(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if key in REDACTED_FIELDS and item is not None else _redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_redact(item) for item in value]
+    return value
+
+
+def redacted_body(body: bytes) -> str:
+    """An API request body as it may be stored: JSON with its secret fields redacted."""
+    if not body:
+        return ""
+    try:
+        return json.dumps(_redact(json.loads(body)))
+    except ValueError:
+        return f"<{len(body)} bytes, not JSON>"
+
+
+class Cassette:
+    """Outbound HTTP exchanges made while handling one API request."""
+
+    def __init__(self, cassette_id: str, request: Dict[str, Any], interactions: Optional[List[Dict[str, Any]]] = None):
+        self.id = cassette_id
+        self.request = request
+        self.interactions = interactions or []
+        self.started = time.perf_counter()
+        self.unmatched = 0
+        self._queues: Optional[Dict[str, Deque[Dict[str, Any]]]] = None
+
+    @classmethod
+    def new(cls, method: str, path: str, body: bytes = b"") -> "Cassette":
+        request = {
+            "method": method,
+            "path": path,
+            "body": redacted_body(body),
+            "recorded_at": datetime.now().isoformat(),
+        }
+        return cls(uuid.uuid4().hex, request)
+
+    @staticmethod
+    def path(directory: str, cassette_id: str) -> str:
+        if not CASSETTE_ID_PATTERN.match(cassette_id):
+            raise ValueError(f"Invalid cassette id: {cassette_id}")
+        return os.path.join(directory, f"{cassette_id}.jsonl.gz")
+
+    @classmethod
+    def load(cls, directory: str, cassette_id: str) -> "Cassette":
+        with gzip.open(cls.path(directory, cassette_id), "rt") as f:
+            header = json.loads(f.readline())
+            interactions = [json.loads(line) for line in f if line.strip()]
+        return cls(header["id"], header["request"], interactions)
+
+    def save(self, directory: str) -> str:
+        os.makedirs(directory, exist_ok=True)
+        path = self.path(directory, self.id)
+        with gzip.open(path, "wt") as f:
+            f.write(json.dumps({"id": self.id, "request": self.request}) + "\n")
+            for interaction in self.interactions:
+                f.write(json.dumps(interaction) + "\n")
+        return path
+
+    def record(self, request: httpx.Request, request_body: bytes, started: float, **outcome: Any) -> None:
+        self.interactions.append({
+            "key": _key(request.method, str(request.url), request_body),
+            "method": request.method,
+            "url": str(request.url),
+            "offset": round(started - self.started, 4),
+            "elapsed": round(time.perf_counter() - started, 4),
+            **outcome,
+        })
+
+    def match(self, request: httpx.Request, body: bytes) -> Optional[Dict[str, Any]]:
+        """
+        The recorded exchange for a request, by method, URL and body.
+
+        Identical requests get their recordings in order; once those run out
+        the last one is repeated.
+        """
+        if self._queues is None:
+            self._queues = defaultdict(deque)
+            for interaction in self.interactions:
+                self._queues[interaction["key"]].append(interaction)
+        queue = self._queues.get(_key(request.method, str(request.url), body))
+        if not queue:
+            self.unmatched += 1
+            return None
+        return queue.popleft() if len(queue) > 1 else queue[0]
+
+
+class _Session:
+    def __init__(self, cassette: Cassette, mode: str, realtime: bool = True):
+        self.cassette = cassette
+        self.mode = mode
+        self.realtime = realtime
+
+
+_session: ContextVar[Optional[_Session]] = ContextVar("cassette_session", default=None)
+
+
+@contextmanager
+def recording(cassette: Cassette) -> Iterator[Cassette]:
+    token = _session.set(_Session(cassette, RECORD))
+    try:
+        yield cassette
+    finally:
+        _session.reset(token)
+
+
+@contextmanager
+def replaying(cassette: Cassette, realtime: bool = True) -> Iterator[Cassette]:
+    """Answer outbound requests from ``cassette``, after their recorded latency if ``realtime``."""
+    token = _session.set(_Session(cassette, REPLAY, realtime))
+    try:
+        yield cassette
+    finally:
+        _session.reset(token)
+
+
+def active_id() -> Optional[str]:
+    """Id of the cassette being recorded or replayed, if any."""
+    session = _session.get()
+    return session.cassette.id if session else None
+
+
+def is_replaying() -> bool:
+    session = _session.get()
+    return bool(session and session.mode == REPLAY)
+
+
+def _pending_timeout(request: httpx.Request) -> float:
+    """How long a request whose recording never completed waits before timing out."""
+    return (request.extensions.get("timeout") or {}).get("read") or 30.0
+
+
+def _recorded_response(interaction: Dict[str, Any], request: httpx.Request) -> httpx.Response:
+    if interaction.get("cancelled"):
+        raise httpx.ReadTimeout("Recorded request was cancelled before it completed", request=request)
+    if "error" in interaction:
+        error_type = getattr(httpx, interaction["error"], httpx.TransportError)
+        raise error_type(interaction.get("message", "Recorded transport error"), request=request)
+    return httpx.Response(
+        interaction["status"],
+        headers=[tuple(pair) for pair in interaction["headers"]],
+        stream=httpx.ByteStream(base64.b64decode(interaction["body"])),
+        request=request,
+    )
+
+
+def _unmatched(request: httpx.Request) -> httpx.ConnectError:
+    return httpx.ConnectError(f"No recorded response for {request.method} {request.url}", request=request)
+
+
+def _recorded_outcome(response: httpx.Response, raw: bytes) -> Dict[str, Any]:
+    return {
+        "status": response.status_code,
+        "headers": [list(pair) for pair in response.headers.multi_items()],
+        "body": base64.b64encode(raw).decode("ascii"),
+    }
+
+
+class AsyncTransport(httpx.AsyncBaseTransport):
+    """Async transport that records or replays when a cassette session is active."""
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        session = _session.get()
+        if session is None:
+            return await self._transport.handle_async_request(request)
+
+        body = await request.aread()
+        if session.mode == REPLAY:
+            interaction = session.cassette.match(request, body)
+            if interaction is None:
+                raise _unmatched(request)
+            if interaction.get("cancelled"):
+                # It never answered while recording; hang until cancelled again or timed out
+                await asyncio.sleep(_pending_timeout(request))
+            elif session.realtime:
+                await asyncio.sleep(interaction["elapsed"])
+            return _recorded_response(interaction, request)
+
+        started = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+            raw = b"".join([chunk async for chunk in response.aiter_raw()])
+            await response.aclose()
+        except httpx.TransportError as e:
+            session.cassette.record(request, body, started, error=type(e).__name__, message=str(e))
+            raise
+        except asyncio.CancelledError:
+            # Speculative scrapes get cancelled; keep them so replays launch the same requests
+            session.cassette.record(request, body, started, cancelled=True)
+            raise
+        session.cassette.record(request, body, started, **_recorded_outcome(response, raw))
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=httpx.ByteStream(raw),
+            request=request,
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def _list(directory: str) -> None:
+    paths = sorted(
+        (os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".jsonl.gz")),
+        key=os.path.getmtime,
+    )
+    for path in paths:
+        tape = Cassette.load(directory, os.path.basename(path).split(".")[0])
+        upstream = sum(i["elapsed"] for i in tape.interactions)
+        print(
+            f"{tape.id}  {tape.request['recorded_at'][:19]}  {tape.request['method']} {tape.request['path']:<24}"
+            f"{len(tape.interactions):>5} exchanges {upstream:>8.2f}s upstream  {tape.request['body'][:60]}"
+        )
+
+
+def _show(directory: str, cassette_id: str) -> None:
+    tape = Cassette.load(directory, cassette_id)
+    print(f"{tape.request['method']} {tape.request['path']} recorded {tape.request['recorded_at']}")
+    print(f"body: {tape.request['body']}")
+    for interaction in sorted(tape.interactions, key=lambda i: i["offset"]):
+        outcome = "cancelled" if interaction.get("cancelled") else interaction.get("error") or interaction["status"]
+        print(f"{interaction['offset']:>8.3f}s {interaction['elapsed']:>7.3f}s  {outcome!s:<14} {interaction['method']} {interaction['url']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect recorded upstream traffic")
+    parser.add_argument("command", choices=["list", "show"])
+    parser.add_argument("cassette_id", nargs="?")
+    parser.add_argument("--dir", default=os.getenv("CASSETTE_DIR", "cassettes"))
+    args = parser.parse_args()
+    if args.command == "list":
+        _list(args.dir)
+    elif not args.cassette_id:
+        parser.error("show needs a cassette id")
+    else:
+        _show(args.dir, args.cassette_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Main-content extraction for scraped pages.
+
+A readability-style pass over the parsed page: boilerplate elements (scripts,
+navigation, footers, cookie banners, share bars, related-article rails) are
+dropped, every paragraph-like block adds a score to its parent and
+grandparent by how much prose it holds, and each container's score is
+discounted by its link density. The best-scoring container and those of its
+siblings that look like part of the same article are kept, with a blank
+line between paragraphs as /followup expects.
+
+When too little text survives, as on index pages or pages that render
+client-side, callers should fall back to the whole page's text.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+from bs4 import BeautifulSoup, NavigableString, Tag
+
+# Articles shorter than this are more likely a failed extraction than a real body
+MIN_ARTICLE_CHARS = 250
+
+# Blocks shorter than this don't count as prose
+MIN_PARAGRAPH_CHARS = 25
+
+# Elements that never hold article text
+BOILERPLATE_TAGS = {
+    "script", "style", "noscript", "template", "iframe", "svg", "canvas",
+    "form", "button", "input", "select", "textarea", "nav", "aside", "footer",
+}
+
+# class/id hints for boilerplate containers, unless they also look like content
+UNLIKELY_PATTERN = re.compile(
+    r"banner|breadcrumb|comment|cookie|consent|disqus|footer|masthead|menu|modal|"
+    r"navbar|newsletter|outbrain|pager|pagination|popup|promo|related|share|sharing|"
+    r"sidebar|skip|social|sponsor|subscribe|taboola|toolbar|widget|\bads?\b|advert",
+    re.I,
+)
+POSITIVE_PATTERN = re.compile(r"article|body|content|entry|main|post|story|text", re.I)
+NEGATIVE_PATTERN = re.compile(r"caption|comment|footer|meta|related|share|sidebar|social|tags", re.I)
+
+PARAGRAPH_TAGS = {"p", "pre", "td", "blockquote"}
+BLOCK_TAGS = {
+    "p", "pre", "td", "th", "blockquote", "li", "h1", "h2", "h3", "h4", "h5", "h6",
+    "div", "section", "article", "main", "ul", "ol", "table", "tr", "figure", "figcaption",
+}
+# Containers never removed by class/id hints, however they are named
+PROTECTED_TAGS = {"html", "body", "article", "main"}
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _hints(tag: Tag) -> str:
+    return " ".join(tag.get("class") or []) + " " + (tag.get("id") or "")
+
+
+def _class_weight(tag: Tag) -> float:
+    hints = _hints(tag)
+    weight = 0.0
+    if POSITIVE_PATTERN.search(hints):
+        weight += 25
+    if NEGATIVE_PATTERN.search(hints):
+        weight -= 25
+    if tag.name in ("article", "main"):
+        weight += 10
+    return weight
+
+
+def _link_density(tag: Tag, text_length: int) -> float:
+    if not text_length:
+        return 1.0
+    link_length = sum(
+        len(_normalize(a.get_text(" "))) for a in tag.descendants if isinstance(a, Tag) and a.name == "a"
+    )
+    return min(1.0, link_length / text_length)
+
+
+def _strip_boilerplate(root: Tag) -> None:
+    # Iterative, since unclosed tags can nest thousands deep
+    stack = [root]
+    while stack:
+        for child in list(stack.pop().children):
+            if not isinstance(child, Tag):
+                continue
+            if child.name in BOILERPLATE_TAGS:
+                child.decompose()
+                continue
+            if child.name not in PROTECTED_TAGS:
+                hints = _hints(child)
+                if UNLIKELY_PATTERN.search(hints) and not POSITIVE_PATTERN.search(hints):
+                    child.decompose()
+                    continue
+            stack.append(child)
+
+
+def _is_text_div(tag: Tag) -> bool:
+    """A div used as a paragraph: text, inline markup and <br>s, no nested blocks."""
+    return not any(isinstance(child, Tag) and child.name in BLOCK_TAGS for child in tag.children)
+
+
+def _score_candidates(root: Tag) -> Dict[int, Tuple[Tag, float]]:
+    candidates: Dict[int, Tuple[Tag, float]] = {}
+    paragraphs = [
+        tag for tag in root.descendants
+        if isinstance(tag, Tag) and (tag.name in PARAGRAPH_TAGS or (tag.name == "div" and _is_text_div(tag)))
+    ]
+    for paragraph in paragraphs:
+        text = _normalize(paragraph.get_text(" "))
+        if len(text) < MIN_PARAGRAPH_CHARS:
+            continue
+        score = 1 + text.count(",") + min(len(text) // 100, 3)
+        parent = paragraph.parent
+        grandparent = parent.parent if isinstance(parent, Tag) else None
+        for ancestor, share in ((parent, 1.0), (grandparent, 0.5)):
+            if not isinstance(ancestor, Tag) or isinstance(ancestor, BeautifulSoup):
+                continue
+            tag, current = candidates.get(id(ancestor), (ancestor, _class_weight(ancestor)))
+            candidates[id(ancestor)] = (tag, current + score * share)
+
+    # Containers that are mostly links are menus and link lists, whatever their prose score
+    for key, (tag, score) in candidates.items():
+        length = len(_normalize(tag.get_text(" ")))
+        candidates[key] = (tag, score * (1 - _link_density(tag, length)))
+    return candidates
+
+
+def _keep_sibling(sibling: Tag, score: Optional[float], threshold: float) -> bool:
+    if score is not None and score >= threshold:
+        return True
+    if sibling.name != "p":
+        return False
+    text = _normalize(sibling.get_text(" "))
+    density = _link_density(sibling, len(text))
+    if len(text) > 80:
+        return density < 0.25
+    return density == 0 and text.endswith(".")
+
+
+def _blocks(node: Tag, blocks: List[str]) -> None:
+    """Append the text of ``node`` to ``blocks``, one string per run of text between block elements."""
+    # Iterative like _strip_boilerplate: one frame of (remaining children, current run) per open block
+    stack = [(iter(node.children), [])]
+    while stack:
+        children, run = stack[-1]
+        for child in children:
+            if isinstance(child, Tag) and child.name in BLOCK_TAGS:
+                _flush(run, blocks)
+                stack.append((iter(child.children), []))
+                break
+            if isinstance(child, Tag):
+                run.append(child.get_text(" "))
+            elif type(child) is NavigableString:
+                run.append(child)
+        else:
+            _flush(run, blocks)
+            stack.pop()
+
+
+def _flush(run: List[str], blocks: List[str]) -> None:
+    text = _normalize(" ".join(run))
+    if text:
+        blocks.append(text)
+    run.clear()
+
+
+def extract_main_text(soup: BeautifulSoup, min_chars: int = MIN_ARTICLE_CHARS) -> Optional[str]:
+    """
+    The article body of a parsed page, paragraphs separated by blank lines.
+
+    Removes boilerplate from ``soup`` in place, so extract titles and
+    metadata first. Returns None when less than ``min_chars`` of text
+    survives.
+    """
+    root = soup.body or soup
+    _strip_boilerplate(root)
+    candidates = _score_candidates(root)
+    if not candidates:
+        return None
+
+    top, top_score = max(candidates.values(), key=lambda c: c[1])
+    threshold = max(10.0, top_score * 0.2)
+
+    parts: List[str] = []
+    parent = top.parent
+    siblings = parent.children if isinstance(parent, Tag) and not isinstance(parent, BeautifulSoup) else [top]
+    for sibling in siblings:
+        if not isinstance(sibling, Tag):
+            continue
+        if sibling is top or _keep_sibling(sibling, candidates.get(id(sibling), (None, None))[1], threshold):
+            _blocks(sibling, parts)
+
+    text = "\n\n".join(parts)
+    return text if len(text) >= min_chars else None
@@ -0,0 +1,66 @@
+"""
+Request-level deadlines.
+
+A Deadline is started once per request and carried in a context variable, so
+every task spawned while handling the request (Perplexity calls, scrapes, LLM
+enrichment) sees the same budget without threading it through each call.
+Stages ask for a timeout with ``stage_timeout()``, which caps their usual
+timeout by their share of whatever budget is left.
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+_current_deadline: contextvars.ContextVar = contextvars.ContextVar("deadline", default=None)
+
+
+class Deadline:
+    """A fixed point in time by which a request should respond."""
+
+    def __init__(self, seconds: float, reserve: float = 0.0):
+        self.budget = seconds
+        # Time kept back at the end of the budget for storing and responding
+        self.reserve = reserve
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def usable(self) -> float:
+        """Seconds left for work, after the reserve."""
+        return max(0.0, self.remaining() - self.reserve)
+
+    @property
+    def expired(self) -> bool:
+        return self.usable() <= 0.0
+
+    def timeout(self, default: float, share: float = 1.0) -> float:
+        """Timeout for a stage: its usual ``default``, capped by ``share`` of the usable time."""
+        return max(0.0, min(default, self.usable() * share))
+
+
+def current() -> Optional[Deadline]:
+    """Deadline of the request being handled, if any."""
+    return _current_deadline.get()
+
+
+def stage_timeout(default: float, share: float = 1.0) -> float:
+    """Timeout for a stage of the current request, or ``default`` outside one."""
+    deadline = current()
+    if deadline is None:
+        return default
+    return deadline.timeout(default, share)
+
+
+@contextmanager
+def deadline_scope(seconds: float, reserve: float = 0.0) -> Iterator[Deadline]:
+    """Start a deadline for everything run (and every task created) inside the block."""
+    deadline = Deadline(seconds, reserve)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
@@ -0,0 +1,196 @@
+"""
+Per-domain scrape health with negative caching of failing hosts.
+
+Every scrape outcome updates its domain's record: an EWMA of success rate
+and latency, the last status code, and a backoff window that grows with
+consecutive failures. /query uses the store to skip domains that are
+backing off and to try healthy domains first. Records are kept in memory
+and written through to MongoDB so they survive restarts and are shared by
+every worker.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional, Set
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest observation in the moving averages
+EWMA_ALPHA = 0.3
+
+# Priority given to domains we have never scraped
+UNKNOWN_SUCCESS_RATE = 0.75
+
+# Backoff (base seconds, cap seconds) by kind of failure; doubles per consecutive failure
+BLOCKED_BACKOFF = (3600.0, 86400.0)  # Paywalls and bot blocking
+RATE_LIMITED_BACKOFF = (600.0, 21600.0)
+SERVER_ERROR_BACKOFF = (120.0, 3600.0)
+NOT_FOUND_BACKOFF = (120.0, 3600.0)
+
+BLOCKED_STATUS_CODES = {401, 403, 451}
+# A 404 is about one URL, so only back off once a domain keeps returning them
+NOT_FOUND_BACKOFF_AFTER = 3
+# Likewise a single 5xx or timeout can be a blip; back off once they repeat
+SERVER_ERROR_BACKOFF_AFTER = 3
+
+
+def domain_of(url: str) -> str:
+    """Host part of a URL, lowercased and without a leading www."""
+    host = urlparse(url).netloc.lower().split("@")[-1].split(":")[0]
+    return host[4:] if host.startswith("www.") else host
+
+
+class DomainHealth:
+    """What we have learned about scraping one domain."""
+
+    def __init__(self, domain: str):
+        self.domain = domain
+        self.attempts = 0
+        self.successes = 0
+        self.success_rate = UNKNOWN_SUCCESS_RATE
+        self.latency_ewma: Optional[float] = None
+        self.last_status: Optional[int] = None
+        self.consecutive_failures = 0
+        self.backoff_until = 0.0
+        self.updated_at = 0.0
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any]) -> "DomainHealth":
+        health = cls(document["_id"])
+        for field in (
+            "attempts", "successes", "success_rate", "latency_ewma",
+            "last_status", "consecutive_failures", "backoff_until", "updated_at",
+        ):
+            if field in document:
+                setattr(health, field, document[field])
+        return health
+
+    def to_document(self) -> Dict[str, Any]:
+        return {
+            "_id": self.domain,
+            "attempts": self.attempts,
+            "successes": self.successes,
+            "success_rate": self.success_rate,
+            "latency_ewma": self.latency_ewma,
+            "last_status": self.last_status,
+            "consecutive_failures": self.consecutive_failures,
+            "backoff_until": self.backoff_until,
+            "updated_at": self.updated_at,
+        }
+
+    def record(self, status_code: int, latency: float, now: float) -> None:
+        success = status_code == 200
+        self.attempts += 1
+        self.last_status = status_code
+        self.updated_at = now
+        self.success_rate += EWMA_ALPHA * ((1.0 if success else 0.0) - self.success_rate)
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += EWMA_ALPHA * (latency - self.latency_ewma)
+
+        if success:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.backoff_until = 0.0
+            return
+
+        self.consecutive_failures += 1
+        if status_code in BLOCKED_STATUS_CODES:
+            base, cap = BLOCKED_BACKOFF
+        elif status_code == 429:
+            base, cap = RATE_LIMITED_BACKOFF
+        elif status_code == 404:
+            if self.consecutive_failures < NOT_FOUND_BACKOFF_AFTER:
+                return
+            base, cap = NOT_FOUND_BACKOFF
+        else:
+            if self.consecutive_failures < SERVER_ERROR_BACKOFF_AFTER:
+                return
+            base, cap = SERVER_ERROR_BACKOFF
+        backoff = min(cap, base * 2 ** (self.consecutive_failures - 1))
+        self.backoff_until = now + backoff
+
+    def backing_off(self, now: float) -> bool:
+        return self.backoff_until > now
+
+
+class DomainHealthStore:
+    """In-memory domain health table, written through to a MongoDB collection."""
+
+    def __init__(self, collection=None, latency_scale: float = 15.0):
+        self._collection = collection
+        # Latency at which a domain loses a quarter of its priority
+        self._latency_scale = latency_scale
+        self._domains: Dict[str, DomainHealth] = {}
+        self._loaded = False
+        self._writes: Set[asyncio.Task] = set()
+
+    async def load(self) -> None:
+        """Load persisted records once; later calls are no-ops."""
+        if self._loaded or self._collection is None:
+            return
+        self._loaded = True
+        try:
+            async for document in self._collection.find({}):
+                self._domains[document["_id"]] = DomainHealth.from_document(document)
+            logger.info(f"Loaded health records for {len(self._domains)} domains")
+        except Exception as e:
+            logger.error(f"Error loading domain health: {str(e)}")
+
+    def get(self, url_or_domain: str) -> Optional[DomainHealth]:
+        return self._domains.get(self._key(url_or_domain))
+
+    def is_blocked(self, url_or_domain: str) -> bool:
+        """Whether a domain is inside its backoff window."""
+        health = self.get(url_or_domain)
+        return bool(health and health.backing_off(time.time()))
+
+    def priority(self, url_or_domain: str) -> float:
+        """Higher is better: success rate, less a penalty for slow domains."""
+        health = self.get(url_or_domain)
+        if health is None:
+            return UNKNOWN_SUCCESS_RATE
+        penalty = 0.0
+        if health.latency_ewma is not None:
+            penalty = 0.25 * min(1.0, health.latency_ewma / self._latency_scale)
+        return health.success_rate - penalty
+
+    def record(self, url: str, status_code: int, latency: float) -> None:
+        """Update a domain with a scrape outcome and persist it in the background."""
+        key = self._key(url)
+        if not key:
+            return
+        health = self._domains.get(key)
+        if health is None:
+            health = self._domains[key] = DomainHealth(key)
+        health.record(status_code, latency, time.time())
+        if health.backing_off(time.time()):
+            logger.info(
+                f"Backing off {key} until {time.strftime('%H:%M:%S', time.localtime(health.backoff_until))} (last status {status_code})"
+            )
+
+        if self._collection is not None:
+            task = asyncio.create_task(self._persist(health.to_document()))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    def snapshot(self, limit: int = 100) -> list:
+        """Least healthy domains first, for debugging."""
+        ordered = sorted(self._domains.values(), key=lambda h: (h.success_rate, -h.attempts))
+        return [health.to_document() for health in ordered[:limit]]
+
+    async def _persist(self, document: Dict[str, Any]) -> None:
+        try:
+            await self._collection.replace_one({"_id": document["_id"]}, document, upsert=True)
+        except Exception as e:
+            logger.error(f"Error saving domain health for {document['_id']}: {str(e)}")
+
+    @staticmethod
+    def _key(url_or_domain: str) -> str:
+        if "://" in url_or_domain:
+            return domain_of(url_or_domain)
+        domain = url_or_domain.lower()
+        return domain[4:] if domain.startswith("www.") else domain
@@ -0,0 +1,138 @@
+"""
+Near-duplicate detection for article text.
+
+Wire stories (AP, Reuters, AFP) are republished by many outlets with little
+more than a new headline, so one search often scrapes the same article
+several times. Every scraped article gets a 64-bit SimHash of its word
+3-grams: texts that share most of their wording get fingerprints a few bits
+apart, unrelated texts differ in about half of the bits.
+
+Fingerprints are stored as signed 64-bit integers so they fit a BSON int64,
+together with their bands: the 64 bits cut into ``MAX_DISTANCE + 1`` runs.
+Two fingerprints at most ``MAX_DISTANCE`` bits apart agree on at least one
+band, so the recent corpus is searched with an index on the bands and the
+few sources found are compared bit by bit.
+"""
+
+import hashlib
+import logging
+import re
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+logger = logging.getLogger(__name__)
+
+BITS = 64
+MASK = (1 << BITS) - 1
+# Texts at most this many bits apart are near-duplicates: wire copies of 300 words or more
+# with a dateline and credit line added mostly are, unrelated articles are 20 or more apart
+MAX_DISTANCE = 5
+BANDS = MAX_DISTANCE + 1
+SHINGLE_WORDS = 3
+# Shorter texts (navigation, paywall stubs) say too little to compare
+MIN_SHINGLES = 30
+# Only the start of very long pages (live blogs) is fingerprinted
+MAX_WORDS = 10000
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def simhash(text: str) -> Optional[int]:
+    """SimHash of the word 3-grams of ``text``, as a signed 64-bit integer; None for short texts."""
+    words = WORD_PATTERN.findall(text.casefold())[:MAX_WORDS]
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    digests = b"".join(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest() for shingle in shingles)
+    # Count each bit over all shingle hashes byte by byte, so the counting runs in C
+    half = len(shingles) / 2
+    fingerprint = 0
+    for position in range(8):
+        ones = [0] * 8
+        for value, count in Counter(digests[position::8]).items():
+            for bit in range(8):
+                if value >> bit & 1:
+                    ones[bit] += count
+        for bit in range(8):
+            # A bit is set when it is set in most shingle hashes
+            if ones[bit] > half:
+                fingerprint |= 1 << (position * 8 + bit)
+    return fingerprint - (1 << BITS) if fingerprint >> (BITS - 1) else fingerprint
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of bits two fingerprints differ in."""
+    return bin((a ^ b) & MASK).count("1")
+
+
+def bands(fingerprint: int) -> List[int]:
+    """The fingerprint's bands, each tagged with its position so bands never collide."""
+    unsigned = fingerprint & MASK
+    edges = [BITS * band // BANDS for band in range(BANDS + 1)]
+    return [
+        (band << 16) | ((unsigned >> edges[band]) & ((1 << (edges[band + 1] - edges[band])) - 1))
+        for band in range(BANDS)
+    ]
+
+
+class NearDuplicates:
+    """Fingerprints seen during one search or batch, each with a value to find again."""
+
+    def __init__(self, max_distance: int = MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._entries: List[Tuple[int, Any]] = []
+
+    def find(self, fingerprint: int) -> Optional[Any]:
+        """The value added with the first fingerprint near ``fingerprint``, if any."""
+        for seen, value in self._entries:
+            if hamming(seen, fingerprint) <= self.max_distance:
+                return value
+        return None
+
+    def add(self, fingerprint: int, value: Any) -> None:
+        self._entries.append((fingerprint, value))
+
+
+class RecentDuplicates:
+    """Finds a near-duplicate of an article among the sources stored in the last ``window`` seconds."""
+
+    # Band matches compared per lookup, newest first
+    CANDIDATES = 200
+
+    def __init__(self, sources, window: float, max_distance: int = MAX_DISTANCE):
+        self._sources = sources
+        self.window = window
+        self.max_distance = max_distance
+        self._indexes_ready = False
+
+    async def _ensure_indexes(self) -> None:
+        if self._indexes_ready:
+            return
+        await self._sources.create_index("simhash_bands", sparse=True)
+        self._indexes_ready = True
+
+    async def find(self, fingerprint: int) -> Optional[Dict[str, Any]]:
+        """The closest recent enriched source, with its id, duplicate_of and metadata; None without one."""
+        if self.window <= 0:
+            return None
+        await self._ensure_indexes()
+        since = ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(seconds=self.window))
+        cursor = self._sources.find(
+            {
+                "simhash_bands": {"$in": bands(fingerprint)},
+                "_id": {"$gte": since},
+                "metadata.summary": {"$exists": True},
+            },
+            {"simhash": 1},
+        ).sort("_id", -1).limit(self.CANDIDATES)
+        best = None
+        async for document in cursor:
+            distance = hamming(document["simhash"], fingerprint)
+            if distance <= self.max_distance and (best is None or distance < best[0]):
+                best = (distance, document["_id"])
+        if best is None:
+            return None
+        return await self._sources.find_one({"_id": best[1]}, {"duplicate_of": 1, "metadata": 1})
@@ -0,0 +1,190 @@
+"""
+A durable job queue in MongoDB, for scraping on separate worker processes.
+
+API processes ``enqueue`` jobs and wait for their results; scrape_worker.py
+``claim``s the most urgent job available, renews its lease while working on
+it, and stores the result. A job whose worker died is queued again once its
+lease expires, up to ``max_attempts`` times. Jobs carry an absolute deadline
+from the request that queued them, and are not started after it.
+
+Waiting is done by polling: every API process runs one poller that looks up
+all the jobs it is waiting for in a single query, so the load on MongoDB
+doesn't grow with the number of concurrent requests.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Jobs for a user waiting on a response go before background work
+PRIORITY_INTERACTIVE = 10
+PRIORITY_BACKGROUND = 0
+
+MAX_ATTEMPTS = 3
+# Delay before a failed job is retried, doubled with each attempt
+RETRY_BACKOFF = 1.0
+LEASE_SECONDS = 30.0
+POLL_INTERVAL = 0.1
+# Finished and abandoned jobs are removed by a TTL index this long after they were queued
+JOB_TTL_SECONDS = 24 * 3600
+
+
+class JobQueue:
+    """Producer and consumer side of the job queue in one collection."""
+
+    def __init__(self, collection, poll_interval: float = POLL_INTERVAL):
+        self._collection = collection
+        self._poll_interval = poll_interval
+        self._waiters: Dict[ObjectId, asyncio.Future] = {}
+        self._poller: Optional[asyncio.Task] = None
+
+    async def ensure_indexes(self) -> None:
+        await self._collection.create_index([("status", 1), ("priority", -1), ("available_at", 1)])
+        await self._collection.create_index([("status", 1), ("lease_expires", 1)])
+        await self._collection.create_index("created", expireAfterSeconds=JOB_TTL_SECONDS)
+
+    async def enqueue(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        priority: int = PRIORITY_BACKGROUND,
+        timeout: Optional[float] = None,
+        max_attempts: int = MAX_ATTEMPTS,
+    ) -> ObjectId:
+        """Queue a job; it won't be started more than ``timeout`` seconds from now."""
+        now = time.time()
+        result = await self._collection.insert_one({
+            "kind": kind,
+            "payload": payload,
+            "priority": priority,
+            "status": QUEUED,
+            "attempts": 0,
+            "max_attempts": max_attempts,
+            "available_at": now,
+            "deadline": now + timeout if timeout is not None else None,
+            "created": datetime.now(),
+        })
+        return result.inserted_id
+
+    async def wait(self, job_id: ObjectId, timeout: float) -> Dict[str, Any]:
+        """The finished job document; raises asyncio.TimeoutError if it isn't done in time."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[job_id] = future
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll())
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._waiters.pop(job_id, None)
+
+    async def cancel(self, job_id: ObjectId) -> None:
+        """Drop a job nobody waits for any more, unless a worker already started it."""
+        await self._collection.update_one(
+            {"_id": job_id, "status": QUEUED},
+            {"$set": {"status": CANCELLED, "finished": datetime.now()}},
+        )
+
+    async def run(self, kind: str, payload: Dict[str, Any], priority: int, timeout: float) -> Dict[str, Any]:
+        """Queue a job and wait for it; cancels the job if the caller stops waiting."""
+        job_id = await self.enqueue(kind, payload, priority=priority, timeout=timeout)
+        try:
+            return await self.wait(job_id, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            try:
+                await asyncio.shield(self.cancel(job_id))
+            except Exception as e:
+                logger.warning(f"Could not cancel job {job_id}: {str(e)}")
+            raise
+
+    async def _poll(self) -> None:
+        while self._waiters:
+            await asyncio.sleep(self._poll_interval)
+            waiting = [job_id for job_id, future in self._waiters.items() if not future.done()]
+            if not waiting:
+                continue
+            try:
+                async for job in self._collection.find({"_id": {"$in": waiting}, "status": {"$in": FINISHED}}):
+                    future = self._waiters.get(job["_id"])
+                    if future is not None and not future.done():
+                        future.set_result(job)
+            except Exception as e:
+                logger.error(f"Error polling for job results: {str(e)}")
+
+    async def claim(self, owner: str, kinds: Iterable[str], lease: float = LEASE_SECONDS) -> Optional[Dict[str, Any]]:
+        """Take the most urgent available job of one of ``kinds``, or None if there is none."""
+        now = time.time()
+        return await self._collection.find_one_and_update(
+            {
+                "status": QUEUED,
+                "kind": {"$in": list(kinds)},
+                "available_at": {"$lte": now},
+                "$or": [{"deadline": None}, {"deadline": {"$gt": now}}],
+            },
+            {"$set": {"status": RUNNING, "owner": owner, "lease_expires": now + lease}, "$inc": {"attempts": 1}},
+            sort=[("priority", -1), ("available_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def renew(self, job: Dict[str, Any], owner: str, lease: float = LEASE_SECONDS) -> bool:
+        """Extend the lease on a running job; False if it was lost to another worker."""
+        result = await self._collection.update_one(
+            {"_id": job["_id"], "status": RUNNING, "owner": owner},
+            {"$set": {"lease_expires": time.time() + lease}},
+        )
+        return result.matched_count == 1
+
+    async def complete(self, job: Dict[str, Any], owner: str, result: Dict[str, Any]) -> None:
+        await self._collection.update_one(
+            {"_id": job["_id"], "status": RUNNING, "owner": owner},
+            {"$set": {"status": DONE, "result": result, "finished": datetime.now()}},
+        )
+
+    async def fail(self, job: Dict[str, Any], owner: str, error: str) -> None:
+        """Retry a job that raised, after a backoff, or give up once it has used its attempts."""
+        update: Dict[str, Any] = {"error": error}
+        if job["attempts"] < job["max_attempts"]:
+            update.update(status=QUEUED, available_at=time.time() + RETRY_BACKOFF * 2 ** (job["attempts"] - 1))
+        else:
+            update.update(status=FAILED, finished=datetime.now())
+        await self._collection.update_one(
+            {"_id": job["_id"], "status": RUNNING, "owner": owner},
+            {"$set": update, "$unset": {"owner": "", "lease_expires": ""}},
+        )
+
+    async def requeue_expired(self) -> int:
+        """Queue again the jobs of workers that stopped renewing their lease; returns how many."""
+        now = time.time()
+        expired = {"status": RUNNING, "lease_expires": {"$lt": now}}
+        given_up = await self._collection.update_many(
+            dict(expired, **{"$expr": {"$gte": ["$attempts", "$max_attempts"]}}),
+            {"$set": {"status": FAILED, "error": "Worker lease expired", "finished": datetime.now()}},
+        )
+        requeued = await self._collection.update_many(
+            expired,
+            {"$set": {"status": QUEUED, "available_at": now}, "$unset": {"owner": "", "lease_expires": ""}},
+        )
+        if requeued.modified_count or given_up.modified_count:
+            logger.warning(f"Requeued {requeued.modified_count} and failed {given_up.modified_count} jobs with expired leases")
+        return requeued.modified_count
+
+    async def aclose(self) -> None:
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
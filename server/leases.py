@@ -0,0 +1,53 @@
+"""
+Named leases in MongoDB, so that one worker out of many runs a singleton job.
+
+A lease is a document holding its owner and an expiry time. Acquiring it
+succeeds when nobody holds it, when its holder let it expire, or when we
+hold it already, which renews it. A worker that dies stops renewing and
+another takes over once the lease expires.
+"""
+
+import logging
+import os
+import socket
+import time
+import uuid
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+def owner_id() -> str:
+    """An id for this process, unique across hosts and restarts."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class Lease:
+    """A named, expiring lock held by one process at a time."""
+
+    def __init__(self, collection, name: str, ttl: float = 300.0):
+        self._collection = collection
+        self.name = name
+        self.ttl = ttl
+        self.owner = owner_id()
+
+    async def acquire(self) -> bool:
+        """Take or renew the lease; False while another process holds it."""
+        now = time.time()
+        try:
+            await self._collection.update_one(
+                {"_id": self.name, "$or": [{"owner": self.owner}, {"expires": {"$lt": now}}]},
+                {"$set": {"owner": self.owner, "expires": now + self.ttl}},
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            # The document exists and matched neither condition: someone else holds it
+            return False
+
+    async def release(self) -> None:
+        try:
+            await self._collection.delete_one({"_id": self.name, "owner": self.owner})
+        except Exception as e:
+            logger.warning(f"Could not release lease {self.name}: {str(e)}")
@@ -0,0 +1,8 @@
+"""
+Load testing against local stand-ins for Perplexity, OpenAI and news sites.
+
+``python -m loadtest.stubs`` runs the stand-ins on their own; ``python -m
+loadtest.run`` starts them (and optionally the API), drives the API at
+increasing concurrency and reports throughput, latency percentiles and
+error rates per endpoint.
+"""
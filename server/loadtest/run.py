@@ -0,0 +1,363 @@
+"""
+Drive the API at increasing concurrency against local stand-ins.
+
+Starts the Perplexity/OpenAI/news-farm stand-ins (see loadtest.stubs) and,
+with --start-app, the API itself pointed at them. Virtual users register
+once, then loop over a weighted mix of /query, /followup, history, login and
+bookmark calls. Each concurrency stage runs for a fixed time; the report
+gives requests/s, p50/p95/p99 latency and error rate per endpoint, and the
+stage where total throughput stops growing with concurrency.
+
+The API needs a MongoDB; use a throwaway database since the test creates
+users and sources. Without --start-app, run the API yourself with
+    PERPLEXITY_API_URL=http://127.0.0.1:8101/chat/completions
+    OPENAI_BASE_URL=http://127.0.0.1:8102/v1
+    PERPLEXITY_API_KEY=loadtest OPENAI_API_KEY=loadtest
+and a Perplexity rate limit high enough not to be the bottleneck.
+
+Usage (from the server directory):
+    python -m loadtest.run --start-app --mongodb-url mongodb://localhost:27017/panorama_loadtest
+        [--concurrency 1,2,4,8,16,32] [--stage-seconds 30] [--mix query=1,followup=2,history=2,login=1,bookmark=1]
+        [--output results.json] [stand-in options, see loadtest.stubs]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from loadtest import stubs
+
+logger = logging.getLogger(__name__)
+
+# Throughput must grow by this factor per stage to count as still scaling
+SCALING_FACTOR = 1.1
+
+TOPICS = [
+    "interest rates", "immigration policy", "climate bill", "supreme court ruling",
+    "trade tariffs", "housing costs", "school funding", "energy prices",
+    "election security", "healthcare reform", "minimum wage", "tech regulation",
+]
+
+
+class EndpointStats:
+    """Latencies and failures for one endpoint in one stage."""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.statuses: Dict[str, int] = {}
+
+    def record(self, seconds: float, status: str, failed: bool) -> None:
+        self.latencies.append(seconds)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if failed:
+            self.errors += 1
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+
+        def pct(p: float) -> float:
+            return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+        return {
+            "requests": len(ordered),
+            "rps": len(ordered) / elapsed,
+            "p50_ms": pct(50),
+            "p95_ms": pct(95),
+            "p99_ms": pct(99),
+            "mean_ms": statistics.mean(ordered) * 1000,
+            "error_rate": self.errors / len(ordered),
+            "statuses": self.statuses,
+        }
+
+
+class Workload:
+    """Shared state for the virtual users of a run."""
+
+    def __init__(self, client: httpx.AsyncClient, query_limit: int, distinct_queries: int):
+        self.client = client
+        self.query_limit = query_limit
+        self.distinct_queries = distinct_queries
+        self.source_ids: List[str] = []
+        self.stats: Dict[str, EndpointStats] = {}
+
+    async def call(self, endpoint: str, method: str, path: str, **kwargs) -> Optional[Any]:
+        """Make a request, record it under ``endpoint`` and return the JSON body on success."""
+        started = time.perf_counter()
+        body = None
+        try:
+            response = await self.client.request(method, path, **kwargs)
+            status = str(response.status_code)
+            failed = response.status_code >= 400
+            if not failed:
+                body = response.json()
+                # Some user endpoints report failures in a 200 body
+                failed = isinstance(body, dict) and "error" in body
+        except httpx.HTTPError as e:
+            status, failed = type(e).__name__, True
+        self.stats.setdefault(endpoint, EndpointStats()).record(
+            time.perf_counter() - started, status, failed
+        )
+        return None if failed else body
+
+    async def register(self, index: int, run_id: str) -> Optional[str]:
+        credentials = {"email": f"loadtest-{run_id}-{index}@example.com", "password": "loadtest-password"}
+        body = await self.call("POST /register", "POST", "/register", json=credentials)
+        return body and body.get("userId")
+
+
+class VirtualUser:
+    def __init__(self, workload: Workload, user_id: str, email: str):
+        self.workload = workload
+        self.user_id = user_id
+        self.email = email
+        self.sources: List[Dict[str, Any]] = []
+
+    async def query(self) -> None:
+        topic = random.choice(TOPICS)
+        request = {
+            "query": f"{topic} {random.randrange(self.workload.distinct_queries)}",
+            "limit": self.workload.query_limit,
+            "user_id": self.user_id,
+        }
+        body = await self.workload.call("POST /query", "POST", "/query", json=request)
+        if body:
+            self.sources = body.get("sources", [])
+
+    async def followup(self) -> None:
+        if not self.workload.source_ids:
+            return await self.query()
+        source_id = random.choice(self.workload.source_ids)
+        question = {"question": "What are the main points of this article?"}
+        await self.workload.call("POST /followup/{id}", "POST", f"/followup/{source_id}", json=question)
+
+    async def history(self) -> None:
+        await self.workload.call("GET /user/{id}/history", "GET", f"/user/{self.user_id}/history")
+
+    async def login(self) -> None:
+        credentials = {"email": self.email, "password": "loadtest-password"}
+        await self.workload.call("POST /login", "POST", "/login", json=credentials)
+
+    async def bookmark(self) -> None:
+        if not self.sources:
+            return await self.query()
+        bookmark = {"user_id": self.user_id, "news_source": random.choice(self.sources)}
+        await self.workload.call("POST /bookmark", "POST", "/bookmark", json=bookmark)
+
+    async def loop(self, actions: List[str], weights: List[float], stop_at: float) -> None:
+        while time.monotonic() < stop_at:
+            action = random.choices(actions, weights)[0]
+            await getattr(self, action)()
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for pair in filter(None, spec.split(",")):
+        action, _, weight = pair.partition("=")
+        if action not in ("query", "followup", "history", "login", "bookmark"):
+            raise argparse.ArgumentTypeError(f"Unknown action in mix: {action}")
+        mix[action] = float(weight or 1)
+    return mix
+
+
+def recent_source_ids(mongodb_url: Optional[str], limit: int = 500) -> List[str]:
+    """Ids of stored sources, for /followup calls."""
+    if not mongodb_url:
+        return []
+    try:
+        from pymongo import MongoClient
+
+        client = MongoClient(mongodb_url, serverSelectionTimeoutMS=2000)
+        sources = client.get_default_database().sources
+        ids = [str(doc["_id"]) for doc in sources.find({}, {"_id": 1}).sort("_id", -1).limit(limit)]
+        client.close()
+        return ids
+    except Exception as e:
+        logger.warning(f"Could not load source ids for /followup: {str(e)}")
+        return []
+
+
+async def run_stage(
+    workload: Workload,
+    users: List[VirtualUser],
+    mix: Dict[str, float],
+    seconds: float,
+    mongodb_url: Optional[str],
+) -> Dict[str, Any]:
+    workload.source_ids = await asyncio.to_thread(recent_source_ids, mongodb_url) or workload.source_ids
+    workload.stats = {}
+    started = time.monotonic()
+    actions, weights = list(mix), list(mix.values())
+    await asyncio.gather(*(user.loop(actions, weights, started + seconds) for user in users))
+    elapsed = time.monotonic() - started
+
+    endpoints = {name: stats.summary(elapsed) for name, stats in sorted(workload.stats.items())}
+    total = sum(row["requests"] for row in endpoints.values())
+    errors = sum(row["requests"] * row["error_rate"] for row in endpoints.values())
+    return {
+        "concurrency": len(users),
+        "seconds": elapsed,
+        "rps": total / elapsed,
+        "ok_rps": (total - errors) / elapsed,
+        "error_rate": errors / total if total else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+def saturation_point(stages: List[Dict[str, Any]], max_error_rate: float) -> Optional[Dict[str, Any]]:
+    """The first stage where successful throughput stops growing or errors pass ``max_error_rate``."""
+    for previous, stage in zip(stages, stages[1:]):
+        if stage["error_rate"] > max_error_rate or stage["ok_rps"] < previous["ok_rps"] * SCALING_FACTOR:
+            return stage
+    return None
+
+
+def print_stage(stage: Dict[str, Any]) -> None:
+    print(
+        f"\nconcurrency {stage['concurrency']}: {stage['rps']:.2f} req/s "
+        f"({stage['ok_rps']:.2f} ok), {stage['error_rate']:.1%} errors"
+    )
+    print(f"  {'endpoint':<26}{'reqs':>7}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}")
+    for name, row in stage["endpoints"].items():
+        print(
+            f"  {name:<26}{row['requests']:>7}{row['rps']:>9.2f}{row['p50_ms']:>10.0f}"
+            f"{row['p95_ms']:>10.0f}{row['p99_ms']:>10.0f}{row['error_rate']:>9.1%}"
+        )
+
+
+def start_process(args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    logger.info(f"Starting: {' '.join(args)}")
+    return subprocess.Popen(args, env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+async def wait_until_ready(url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+            await asyncio.sleep(0.5)
+
+
+async def main_async(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    processes = []
+    try:
+        stub_args = [
+            sys.executable, "-m", "loadtest.stubs",
+            "--perplexity", args.perplexity, "--openai", args.openai, "--news", args.news,
+            "--sites", str(args.sites), "--blocked-share", str(args.blocked_share),
+            "--perplexity-port", str(args.perplexity_port), "--openai-port", str(args.openai_port),
+            "--news-port", str(args.news_port),
+        ]
+        processes.append(start_process(stub_args, dict(os.environ)))
+
+        if args.start_app:
+            env = dict(
+                os.environ,
+                MONGODB_URL=args.mongodb_url,
+                PERPLEXITY_API_URL=f"http://127.0.0.1:{args.perplexity_port}/chat/completions",
+                OPENAI_BASE_URL=f"http://127.0.0.1:{args.openai_port}/v1",
+                PERPLEXITY_API_KEY="loadtest",
+                OPENAI_API_KEY="loadtest",
+            )
+            # Our own Perplexity pacing would cap throughput long before the event loop does
+            env.setdefault("PERPLEXITY_RATE_PER_SECOND", "1000")
+            env.setdefault("PERPLEXITY_BURST", "1000")
+            # Measure the pipeline rather than the result cache, unless asked to
+            env.setdefault("QUERY_CACHE_TTL_SECONDS", "0")
+            port = httpx.URL(args.app_url).port or 8000
+            processes.append(start_process(
+                [sys.executable, "-m", "uvicorn", "api:create_app", "--factory", "--port", str(port),
+                 "--workers", str(args.workers), "--log-level", "warning"],
+                env,
+            ))
+
+        await wait_until_ready(f"http://127.0.0.1:{args.perplexity_port}/docs")
+        await wait_until_ready(f"{args.app_url}/")
+        for process in processes:
+            if process.poll() is not None:
+                raise RuntimeError(f"{' '.join(process.args[1:4])} exited early; are its ports free?")
+
+        limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+        async with httpx.AsyncClient(base_url=args.app_url, timeout=args.timeout, limits=limits) as client:
+            workload = Workload(client, args.query_limit, args.distinct_queries)
+            run_id = uuid.uuid4().hex[:8]
+            users = []
+            for i in range(max(args.concurrency)):
+                user_id = await workload.register(i, run_id)
+                if user_id:
+                    users.append(VirtualUser(workload, user_id, f"loadtest-{run_id}-{i}@example.com"))
+            if len(users) < max(args.concurrency):
+                raise RuntimeError(f"Only {len(users)} of {max(args.concurrency)} users could register; is MongoDB up?")
+
+            stages = []
+            for concurrency in args.concurrency:
+                stage = await run_stage(workload, users[:concurrency], args.mix, args.stage_seconds, args.mongodb_url)
+                print_stage(stage)
+                stages.append(stage)
+        return stages
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--app-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--start-app", action="store_true", help="start the API pointed at the stand-ins")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers with --start-app")
+    parser.add_argument("--mongodb-url", default=os.getenv("MONGODB_URL", "mongodb://localhost:27017/panorama_loadtest"))
+    parser.add_argument(
+        "--concurrency", default=[1, 2, 4, 8, 16, 32],
+        type=lambda s: [int(n) for n in s.split(",")], help="comma-separated concurrency stages",
+    )
+    parser.add_argument("--stage-seconds", type=float, default=30.0)
+    parser.add_argument("--mix", default="query=1,followup=2,history=2,login=1,bookmark=1", type=parse_mix)
+    parser.add_argument("--query-limit", type=int, default=9, help="sources requested per /query")
+    parser.add_argument("--distinct-queries", type=int, default=1000, help="pool of query texts; smaller means more coalescing")
+    parser.add_argument("--timeout", type=float, default=120.0, help="client timeout per request")
+    parser.add_argument("--max-error-rate", type=float, default=0.05)
+    parser.add_argument("--output", help="write stage results as JSON to this file")
+    stubs.add_arguments(parser)
+    args = parser.parse_args()
+    for spec in (args.perplexity, args.openai, args.news):
+        # Fail on a bad profile here rather than in the stand-in process
+        stubs.Profile.parse(spec)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    stages = asyncio.run(main_async(args))
+
+    saturated = saturation_point(stages, args.max_error_rate)
+    if saturated:
+        print(
+            f"\nThroughput stops scaling at concurrency {saturated['concurrency']}: "
+            f"{saturated['ok_rps']:.2f} ok req/s, {saturated['error_rate']:.1%} errors"
+        )
+    else:
+        print("\nThroughput kept scaling through the last stage")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"stages": stages, "saturated_at": saturated and saturated["concurrency"]}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
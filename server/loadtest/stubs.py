@@ -0,0 +1,267 @@
+"""
+Stand-in Perplexity, OpenAI and news-site servers for load tests.
+
+Each stand-in answers like the real service, after a latency drawn from its
+``Profile`` and with a configurable share of errors and stalls:
+
+  - Perplexity: POST /chat/completions returns a numbered markdown list of
+    articles whose URLs point at the news farm,
+  - OpenAI: POST /v1/chat/completions returns a SUMMARY/KEYWORDS/QUESTIONS
+    answer, which serves both metadata extraction and follow-up questions,
+  - news farm: GET on any path returns one of the saved pages in
+    benchmarks/fixtures/html. A share of sites always answer 403, like
+    paywalled or bot-blocking outlets.
+
+The farm listens on 127.0.0.2, 127.0.0.3, ... so every site is a separate
+domain to the scraper's per-domain health tracking. Where only 127.0.0.1 is
+routable (macOS), all sites share one address and one domain.
+
+Usage (from the server directory):
+    python -m loadtest.stubs [--perplexity latency=2,jitter=0.5,errors=0.02,status=429]
+        [--openai latency=1.5] [--news latency=0.3,errors=0.05] [--sites 30]
+"""
+
+import argparse
+import asyncio
+import errno
+import logging
+import random
+import socket
+import time
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+logger = logging.getLogger(__name__)
+
+PAGES_DIR = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures" / "html"
+
+DEFAULT_PERPLEXITY_PORT = 8101
+DEFAULT_OPENAI_PORT = 8102
+DEFAULT_NEWS_PORT = 8103
+
+TOPIC_WORDS = (
+    "budget vote council report inquiry markets election court ruling trade talks "
+    "strike union climate plan energy prices health policy housing schools"
+).split()
+
+
+class Profile:
+    """Latency and failure behaviour of a stand-in service."""
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        jitter: float = 0.2,
+        errors: float = 0.0,
+        status: int = 500,
+        stalls: float = 0.0,
+        stall_seconds: float = 60.0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.errors = errors
+        self.status = status
+        self.stalls = stalls
+        self.stall_seconds = stall_seconds
+
+    @classmethod
+    def parse(cls, spec: str) -> "Profile":
+        """Build a profile from ``key=value`` pairs, e.g. ``latency=0.8,errors=0.05,status=429``."""
+        kwargs = {}
+        for pair in filter(None, spec.split(",")):
+            key, _, value = pair.partition("=")
+            key = key.strip().replace("-", "_")
+            kwargs[key] = int(value) if key == "status" else float(value)
+        return cls(**kwargs)
+
+    def __repr__(self) -> str:
+        return (
+            f"Profile(latency={self.latency}, jitter={self.jitter}, errors={self.errors}, "
+            f"status={self.status}, stalls={self.stalls})"
+        )
+
+    async def apply(self) -> Optional[int]:
+        """Wait like the real service would; returns an error status to answer with, if any."""
+        if self.stalls and random.random() < self.stalls:
+            await asyncio.sleep(self.stall_seconds)
+        await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+        if self.errors and random.random() < self.errors:
+            return self.status
+        return None
+
+
+def error_response(status: int) -> JSONResponse:
+    headers = {"Retry-After": "1"} if status == 429 else None
+    return JSONResponse({"error": {"message": f"Stand-in error {status}"}}, status_code=status, headers=headers)
+
+
+def perplexity_app(profile: Profile, site_urls: List[str], articles: int = 10) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        status = await profile.apply()
+        if status:
+            return error_response(status)
+
+        question = payload["messages"][-1]["content"]
+        lines = [f"Here are recent articles about {question}:", ""]
+        for i in range(1, articles + 1):
+            site = random.randrange(len(site_urls))
+            words = random.sample(TOPIC_WORDS, 5)
+            slug = "-".join(words) + f"-{uuid.uuid4().hex[:8]}"
+            lines.extend([
+                f"{i}. **{' '.join(words).capitalize()} as talks continue**",
+                f"   - **Source:** Stand-in News {site}",
+                f"   - **URL:** {site_urls[site]}/news/{slug}",
+                f"   - **Snippet:** Officials discussed the {words[0]} and the {words[1]} on Tuesday.",
+                "",
+            ])
+        return {
+            "id": uuid.uuid4().hex,
+            "model": payload.get("model", "sonar"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "\n".join(lines)}}],
+        }
+
+    return app
+
+
+def openai_app(profile: Profile) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        status = await profile.apply()
+        if status:
+            return error_response(status)
+
+        words = random.sample(TOPIC_WORDS, 5)
+        content = (
+            f"SUMMARY:\nThe article covers the {words[0]} and the {words[1]}. Officials expect a decision soon.\n\n"
+            f"KEYWORDS:\n{', '.join(words)}\n\n"
+            f"QUESTIONS:\n1. What happens to the {words[0]}?\n2. Who supports the {words[1]}?\n3. When is the next vote?"
+        )
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "gpt-3.5-turbo"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {"prompt_tokens": 400, "completion_tokens": 80, "total_tokens": 480},
+        }
+
+    return app
+
+
+def news_farm_app(profile: Profile, blocked_hosts: List[str]) -> FastAPI:
+    app = FastAPI()
+    pages = [path.read_bytes() for path in sorted(PAGES_DIR.glob("*.html"))]
+    blocked = set(blocked_hosts)
+
+    @app.get("/{path:path}")
+    async def page(path: str, request: Request):
+        status = await profile.apply()
+        if request.url.hostname in blocked:
+            status = 403
+        if status:
+            return Response(b"<html><body>Access denied</body></html>", status_code=status, media_type="text/html")
+        return Response(random.choice(pages), media_type="text/html")
+
+    return app
+
+
+def farm_sockets(sites: int, port: int) -> List[socket.socket]:
+    """One listening socket per site address, falling back to 127.0.0.1 alone."""
+    sockets = []
+    for i in range(sites):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind((f"127.0.0.{i + 2}", port))
+        except OSError as e:
+            sock.close()
+            if e.errno == errno.EADDRINUSE:
+                raise
+            break
+        sockets.append(sock)
+
+    if len(sockets) < sites:
+        for sock in sockets:
+            sock.close()
+        logger.warning("Only 127.0.0.1 is usable; all stand-in news sites will share one domain")
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("127.0.0.1", port))
+        sockets = [sock]
+    return sockets
+
+
+async def serve(
+    perplexity: Profile,
+    openai: Profile,
+    news: Profile,
+    sites: int = 30,
+    blocked_share: float = 0.1,
+    perplexity_port: int = DEFAULT_PERPLEXITY_PORT,
+    openai_port: int = DEFAULT_OPENAI_PORT,
+    news_port: int = DEFAULT_NEWS_PORT,
+) -> None:
+    sockets = farm_sockets(sites, news_port)
+    hosts = [sock.getsockname()[0] for sock in sockets]
+    if len(hosts) == 1:
+        site_urls = [f"http://127.0.0.1:{news_port}/site{i}" for i in range(sites)]
+    else:
+        site_urls = [f"http://{host}:{news_port}" for host in hosts]
+    blocked_hosts = hosts[:int(len(hosts) * blocked_share)] if len(hosts) > 1 else []
+
+    servers = [
+        uvicorn.Server(uvicorn.Config(perplexity_app(perplexity, site_urls), host="127.0.0.1", port=perplexity_port, log_level="warning")),
+        uvicorn.Server(uvicorn.Config(openai_app(openai), host="127.0.0.1", port=openai_port, log_level="warning")),
+    ]
+    farm = uvicorn.Server(uvicorn.Config(news_farm_app(news, blocked_hosts), log_level="warning"))
+
+    logger.info(f"Perplexity stand-in: http://127.0.0.1:{perplexity_port}/chat/completions {perplexity}")
+    logger.info(f"OpenAI stand-in: http://127.0.0.1:{openai_port}/v1 {openai}")
+    logger.info(f"News farm: {len(site_urls)} sites on {len(hosts)} addresses, {len(blocked_hosts)} blocked {news}")
+    await asyncio.gather(*(server.serve() for server in servers), farm.serve(sockets=sockets))
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Stand-in options; profiles stay strings so they can be passed on to a subprocess."""
+    parser.add_argument("--perplexity", default="latency=2.0,jitter=0.5", help="Perplexity profile")
+    parser.add_argument("--openai", default="latency=1.5,jitter=0.5", help="OpenAI profile")
+    parser.add_argument("--news", default="latency=0.3,jitter=0.2,errors=0.05,status=503", help="news site profile")
+    parser.add_argument("--sites", type=int, default=30, help="number of stand-in news sites")
+    parser.add_argument("--blocked-share", type=float, default=0.1, help="share of sites that always answer 403")
+    parser.add_argument("--perplexity-port", type=int, default=DEFAULT_PERPLEXITY_PORT)
+    parser.add_argument("--openai-port", type=int, default=DEFAULT_OPENAI_PORT)
+    parser.add_argument("--news-port", type=int, default=DEFAULT_NEWS_PORT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    asyncio.run(serve(
+        Profile.parse(args.perplexity), Profile.parse(args.openai), Profile.parse(args.news),
+        args.sites, args.blocked_share,
+        args.perplexity_port, args.openai_port, args.news_port,
+    ))
+
+
+if __name__ == "__main__":
+    main()
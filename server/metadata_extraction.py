@@ -10,26 +10,20 @@ from typing import Dict, Any, List
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def extract_metadata(text: str, title: str, url: str, api_key: str) -> Dict[str, Any]:
+async def extract_metadata(client, text: str, title: str, url: str) -> Dict[str, Any]:
     """
     Extract metadata from text using OpenAI directly instead of LlamaIndex.
     
     Args:
+        client: The worker's shared AsyncOpenAI client
         text: The article text to analyze
         title: The article title
         url: The article URL
-        api_key: OpenAI API key
         
     Returns:
         Dictionary containing extracted metadata
     """
     try:
-        # Import OpenAI client
-        from openai import OpenAI
-        
-        # Initialize client
-        client = OpenAI(api_key=api_key)
-        
         # Create prompt for metadata extraction
         prompt = f"""
         Extract metadata from the following news article.
@@ -59,7 +53,7 @@ async def extract_metadata(text: str, title: str, url: str, api_key: str) -> Dic
         """
         
         # Call OpenAI API
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": "You extract metadata from news articles in a structured format."},
@@ -0,0 +1,249 @@
+"""
+Minimal Prometheus-style metrics.
+
+Counters, gauges and histograms with labels, rendered in the Prometheus text
+exposition format by ``render()`` for the /metrics endpoint. Metrics live in
+process memory, so with several workers each worker reports its own series;
+every sample carries a ``worker`` label with the process id to tell them apart
+and let queries sum across workers. Values that are tracked elsewhere (such as the Perplexity gateway counters)
+can be exported with ``register_collector()``.
+"""
+
+import abc
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+# Latency buckets in seconds, from fast Mongo writes to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, "_Metric"] = {}
+        _registry.append(self)
+
+    def labels(self, **labels: str):
+        values = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """A fresh child holding the values for one set of label values."""
+
+    def _series(self) -> Iterable[Tuple[LabelValues, "_Metric"]]:
+        if self.labelnames:
+            return self._children.items()
+        return [((), self._default())]
+
+    def _default(self):
+        return self.labels()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._series():
+            lines.extend(child._render_child(self.name, self.labelnames, values))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def _render_child(self, name, labelnames, values) -> List[str]:
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+
+class _GaugeChild(_CounterChild):
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    @contextmanager
+    def track_inprogress(self) -> Iterator[None]:
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default().dec(amount)
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+    def track_inprogress(self):
+        return self._default().track_inprogress()
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def _render_child(self, name, labelnames, values) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, le)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+_registry: List[_Metric] = []
+_collectors: List[Callable[[], Iterable[str]]] = []
+
+
+def register_collector(collector: Callable[[], Iterable[str]]) -> None:
+    """Add a function that returns extra exposition lines at render time."""
+    _collectors.append(collector)
+
+
+def _with_worker(line: str, worker: str) -> str:
+    """A sample line with the worker label added; comment lines are returned as they are."""
+    if line.startswith("#"):
+        return line
+    label = f'worker="{worker}"'
+    series, _, value = line.rpartition(" ")
+    if series.endswith("}"):
+        return f"{series[:-1]},{label}}} {value}"
+    return f"{series}{{{label}}} {value}"
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format, labelled with this worker's pid."""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        lines.extend(collector())
+    worker = str(os.getpid())
+    return "\n".join(_with_worker(line, worker) for line in lines) + "\n"
+
+
+# Metrics for the /query pipeline and the endpoints around it
+QUERY_SECONDS = Histogram(
+    "panorama_query_seconds", "End-to-end /query time by where the response came from", ["served_from"]
+)
+PERPLEXITY_SECONDS = Histogram(
+    "panorama_perplexity_seconds", "Perplexity call time per political leaning", ["leaning"]
+)
+FETCH_SECONDS = Histogram(
+    "panorama_fetch_seconds", "Time to download a news page"
+)
+PARSE_SECONDS = Histogram(
+    "panorama_parse_seconds", "Time spent parsing, by what was parsed", ["kind"]
+)
+LLM_SECONDS = Histogram(
+    "panorama_llm_seconds", "OpenAI call time by operation", ["operation"]
+)
+MONGO_WRITE_SECONDS = Histogram(
+    "panorama_mongo_write_seconds", "MongoDB write time by collection", ["collection"]
+)
+SCRAPE_OUTCOMES = Counter(
+    "panorama_scrape_outcomes_total", "Completed scrapes by HTTP status code", ["status"]
+)
+CACHE_REQUESTS = Counter(
+    "panorama_cache_requests_total", "Cache lookups by cache and result", ["cache", "result"]
+)
+NEAR_DUPLICATES = Counter(
+    "panorama_near_duplicates_total", "Articles whose enrichment was reused from a near-duplicate, by where it was found", ["found_in"]
+)
+SCRAPES_IN_FLIGHT = Gauge(
+    "panorama_scrapes_in_flight", "Page scrapes currently running"
+)
+QUERIES_IN_FLIGHT = Gauge(
+    "panorama_queries_in_flight", "/query pipelines currently running"
+)
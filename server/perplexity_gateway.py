@@ -0,0 +1,270 @@
+"""
+Rate-limit-aware gateway for the Perplexity chat completions API.
+
+All Perplexity calls go through one gateway per process, which
+  - paces requests per API key with a token bucket, so bursts of users on
+    one key queue briefly instead of being throttled by Perplexity,
+  - retries 429s, 5xx responses and transport errors with jittered
+    exponential backoff, honouring Retry-After,
+  - opens a per-key circuit breaker after repeated upstream failures so
+    calls fail fast while Perplexity is down, and
+  - keeps counters of what happened for the metrics endpoints.
+"""
+
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import httpx
+
+import cassette
+from deadline import stage_timeout
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class PerplexityError(Exception):
+    """A Perplexity call failed and will not be retried."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(PerplexityError):
+    """The circuit breaker for this API key is open."""
+
+
+class TokenBucket:
+    """Allows ``rate`` requests per second on average, with bursts up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, max_wait: float) -> bool:
+        """Take a token, waiting up to ``max_wait`` seconds. Returns False on timeout."""
+        async with self._lock:
+            self._refill()
+            wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+            if wait > max_wait:
+                return False
+            if wait:
+                await asyncio.sleep(wait)
+                self._refill()
+            self.tokens -= 1
+            return True
+
+
+class CircuitBreaker:
+    """Opens after ``threshold`` consecutive failures; lets one trial call through after ``reset_timeout``."""
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def release(self) -> None:
+        """Give back a trial call that ended without telling whether Perplexity is healthy."""
+        self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date."""
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class PerplexityGateway:
+    """Shared client for Perplexity chat completions."""
+
+    def __init__(
+        self,
+        url: str,
+        rate_per_second: float = 1.0,
+        burst: int = 6,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 8.0,
+        breaker_threshold: int = 5,
+        breaker_reset: float = 30.0,
+    ):
+        self.url = url
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self.metrics: Dict[str, int] = {
+            "requests": 0,
+            "successes": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "server_errors": 0,
+            "transport_errors": 0,
+            "client_errors": 0,
+            "throttled_locally": 0,
+            "circuit_rejections": 0,
+        }
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(transport=cassette.AsyncTransport())
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+
+    def breaker_states(self) -> Dict[str, str]:
+        return {key: breaker.state for key, breaker in self._breakers.items()}
+
+    def _key_id(self, api_key: str) -> str:
+        # Never keep raw keys around as dictionary keys or in logs
+        return hashlib.sha256(api_key.encode()).hexdigest()[:12]
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    async def chat_completion(self, api_key: str, payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """
+        POST a chat completion and return the decoded JSON body.
+
+        ``timeout`` bounds each attempt; retries and rate-limit waits are also
+        kept within the current request's deadline. Raises PerplexityError
+        when the call cannot succeed.
+        """
+        key_id = self._key_id(api_key)
+        bucket = self._buckets.setdefault(key_id, TokenBucket(self.rate_per_second, self.burst))
+        breaker = self._breakers.setdefault(
+            key_id, CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+        )
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+
+        attempt = 0
+        while True:
+            if breaker.state == "open":
+                self.metrics["circuit_rejections"] += 1
+                raise CircuitOpenError(f"Perplexity circuit open for key {key_id}")
+
+            if not await bucket.acquire(max_wait=stage_timeout(timeout)):
+                self.metrics["throttled_locally"] += 1
+                raise PerplexityError("Perplexity rate limit budget exhausted", 429)
+
+            if not breaker.allow():
+                self.metrics["circuit_rejections"] += 1
+                raise CircuitOpenError(f"Perplexity circuit open for key {key_id}")
+
+            self.metrics["requests"] += 1
+            retry_delay = None
+            try:
+                response = await self.client.post(
+                    self.url, headers=headers, json=payload, timeout=stage_timeout(timeout)
+                )
+            except httpx.TransportError as e:
+                self.metrics["transport_errors"] += 1
+                breaker.record_failure()
+                error = PerplexityError(f"Perplexity request failed: {type(e).__name__}: {str(e)}")
+            except BaseException:
+                # Cancelled, or failed before Perplexity answered: give a trial call back
+                breaker.release()
+                raise
+            else:
+                if response.status_code == 200:
+                    breaker.record_success()
+                    self.metrics["successes"] += 1
+                    return response.json()
+
+                error = PerplexityError(
+                    f"Error from Perplexity API: {response.status_code} {response.text[:200]}",
+                    response.status_code,
+                )
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    # Our request or key is the problem, not Perplexity's health
+                    self.metrics["client_errors"] += 1
+                    breaker.record_success()
+                    raise error
+
+                if response.status_code == 429:
+                    # Says nothing about Perplexity's health; a half-open breaker tries again
+                    self.metrics["rate_limited"] += 1
+                    breaker.release()
+                else:
+                    self.metrics["server_errors"] += 1
+                    breaker.record_failure()
+                retry_delay = retry_after_seconds(response)
+
+            if attempt >= self.max_retries:
+                raise error
+
+            delay = retry_delay if retry_delay is not None else self._backoff(attempt)
+            if delay >= stage_timeout(timeout):
+                logger.warning(f"Not retrying Perplexity call: retry in {delay:.1f}s exceeds the time budget")
+                raise error
+
+            attempt += 1
+            self.metrics["retries"] += 1
+            logger.info(f"Retrying Perplexity call in {delay:.2f}s (attempt {attempt}): {str(error)}")
+            await asyncio.sleep(delay)
@@ -0,0 +1,291 @@
+"""
+Single-pass parser for Perplexity news-collection responses.
+
+Perplexity answers our system prompt with a markdown list: one numbered or
+bulleted item per article, usually with the title in bold and the source,
+URL and snippet on the following lines. The response is split into items in
+one pass over its lines and every item is parsed on its own, so a title,
+source or snippet can never be borrowed from a neighbouring article.
+All patterns are compiled once at import time.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from url_canonical import canonical_url
+
+# URLs as Perplexity writes them (bare, bold, or inside markdown links and <autolinks>);
+# a URL never ends in the punctuation of the sentence around it
+URL_PATTERN = re.compile(r"https?://[^\s)\]<>\"*`]*[^\s)\]<>\"*`.,;:!?'’”»]")
+DOMAIN_PATTERN = re.compile(r"https?://(?:www\.)?([^/]+)")
+
+# Line classification
+LIST_MARKER_PATTERN = re.compile(r"^(?:\d{1,3}[.)]|[-*+•])\s+")
+HEADING_PATTERN = re.compile(r"^#{1,6}\s+")
+FIELD_LABEL_PATTERN = re.compile(
+    r"^\**\s*(?:source(?:\s*name)?|publication|outlet|url|link|snippet|summary|"
+    r"brief\s+summary|description|published|date|author)\s*\**\s*:",
+    re.IGNORECASE,
+)
+TITLE_LABEL_PATTERN = re.compile(r"^\**\s*(?:article\s+)?title\s*\**\s*:", re.IGNORECASE)
+
+# Field extraction within a single item
+BOLD_PATTERN = re.compile(r"\*\*([^*]+)\*\*")
+LINK_TEXT_PATTERN = re.compile(r"\[([^\]]+)\]\(\s*https?://")
+TITLE_FIELD_PATTERN = re.compile(
+    r"(?:article\s+)?title\s*\**\s*:\s*\**\s*([^\n]+)", re.IGNORECASE
+)
+SOURCE_FIELD_PATTERN = re.compile(
+    r"\b(?:source(?:\s*name)?|publication|outlet)\s*\**\s*:\s*\**\s*([^,\n]+)",
+    re.IGNORECASE,
+)
+SNIPPET_FIELD_PATTERN = re.compile(
+    r"\b(?:snippet|brief\s+summary|summary|description)\s*\**\s*:\s*\**\s*([^\n]+)",
+    re.IGNORECASE,
+)
+
+# Labels and markdown Perplexity leaves around extracted fields
+TITLE_PREFIX_PATTERN = re.compile(r"^(Article Title:?\s*|Title:?\s*)")
+SOURCE_PREFIX_PATTERN = re.compile(r"^(Name:?\s*\*\*|Source:?\s*)")
+TRAILING_BOLD_PATTERN = re.compile(r"\*\*$")
+SNIPPET_LABEL_PATTERN = re.compile(r"\*\*(Summary|Brief Summary):?\s*\*\*")
+INLINE_BOLD_PATTERN = re.compile(r"\*\*([^*]+)\*\*")
+EDGE_PUNCTUATION_PATTERN = re.compile(r"^[\s*_\-–—:;,.|)\]]+|[\s*_\-–—:;,|(\[]+$")
+MARKDOWN_LINK_PATTERN = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+# "[Title](https://...) — Outlet" or "https://... (Outlet)": the outlet named right after the URL
+ATTRIBUTION_PATTERN = re.compile(r"^\)?[ \t]*(?:[-–—|][ \t]*|\()\**_?([^\n()*_]+?)_?\**\)?[ \t]*$")
+PARAGRAPH_BREAK_PATTERN = re.compile(r"\n\s*\n")
+
+MIN_TITLE_LENGTH = 10
+MAX_TITLE_LENGTH = 200
+SNIPPET_LENGTH = 150
+MAX_SOURCE_LENGTH = 40
+
+
+def _is_item_start(stripped: str, indent: int, base_indent: Optional[int], has_url: bool) -> bool:
+    """Decide whether a line opens a new article item."""
+    if HEADING_PATTERN.match(stripped):
+        return True
+
+    marker = LIST_MARKER_PATTERN.match(stripped)
+    body = stripped[marker.end():] if marker else stripped
+
+    if TITLE_LABEL_PATTERN.match(body):
+        # "Title: ..." only opens an item once the current one is complete
+        return has_url
+    if FIELD_LABEL_PATTERN.match(body):
+        return False
+
+    top_level = base_indent is None or indent <= base_indent
+    if marker:
+        return top_level
+    # "**1. Some headline**" written without a list marker
+    return top_level and stripped.startswith("**")
+
+
+def split_items(content: str) -> List[str]:
+    """
+    Split a Perplexity response into one text block per list item.
+
+    Text before the first item is returned as its own block. Responses without
+    any list structure fall back to blank-line separated paragraphs.
+    """
+    items: List[List[str]] = [[]]
+    base_indent: Optional[int] = None
+    has_url = False
+    saw_item = False
+
+    for line in content.splitlines():
+        stripped = line.lstrip()
+        if not stripped:
+            items[-1].append("")
+            continue
+
+        indent = len(line) - len(stripped)
+        if _is_item_start(stripped, indent, base_indent, has_url):
+            if base_indent is None and LIST_MARKER_PATTERN.match(stripped):
+                base_indent = indent
+            saw_item = True
+            items.append([])
+            has_url = False
+
+        items[-1].append(stripped)
+        if not has_url and "http" in stripped and URL_PATTERN.search(stripped):
+            has_url = True
+
+    if not saw_item:
+        return [block.strip() for block in PARAGRAPH_BREAK_PATTERN.split(content) if block.strip()]
+
+    return ["\n".join(lines).strip() for lines in items if any(lines)]
+
+
+def _clean_title(title: str) -> str:
+    title = MARKDOWN_LINK_PATTERN.sub(r"\1", title)
+    title = URL_PATTERN.sub("", title)
+    title = LIST_MARKER_PATTERN.sub("", title.strip())
+    title = TITLE_PREFIX_PATTERN.sub("", title.strip("* ")).strip()
+    title = EDGE_PUNCTUATION_PATTERN.sub("", title).strip('"“” ')
+    return title[:MAX_TITLE_LENGTH]
+
+
+def _find_title(text: str) -> str:
+    """Pick the most title-like text out of the part of an item before its URL."""
+    for match in BOLD_PATTERN.finditer(text):
+        candidate = match.group(1).strip()
+        if candidate.endswith(":") or FIELD_LABEL_PATTERN.match(candidate + ":"):
+            continue
+        candidate = _clean_title(candidate)
+        if len(candidate) >= 5 and not FIELD_LABEL_PATTERN.match(candidate):
+            return candidate
+
+    title_field = TITLE_FIELD_PATTERN.search(text)
+    if title_field:
+        candidate = _clean_title(title_field.group(1))
+        if candidate:
+            return candidate
+
+    for match in LINK_TEXT_PATTERN.finditer(text):
+        candidate = _clean_title(match.group(1))
+        if len(candidate) >= MIN_TITLE_LENGTH and not candidate.startswith("http"):
+            return candidate
+
+    for line in text.split("\n"):
+        body = LIST_MARKER_PATTERN.sub("", line.strip())
+        if not body or FIELD_LABEL_PATTERN.match(body):
+            continue
+        candidate = _clean_title(body)
+        if len(candidate) >= MIN_TITLE_LENGTH and candidate[0].isalnum():
+            return candidate
+
+    return ""
+
+
+def _attribution(after_url: str) -> str:
+    """The outlet named on the rest of the URL's line, if that is all the line holds."""
+    match = ATTRIBUTION_PATTERN.match(after_url.partition("\n")[0])
+    if not match:
+        return ""
+    source = match.group(1).strip()
+    if len(source) > MAX_SOURCE_LENGTH or source.endswith(".") or "http" in source:
+        return ""
+    return source
+
+
+def _find_source(text: str, before_url: str, after_url: str, title: str) -> str:
+    match = SOURCE_FIELD_PATTERN.search(text)
+    if not match:
+        # "[Title](https://...) — Outlet" names the outlet after the link
+        attribution = _attribution(after_url)
+        if attribution:
+            return attribution
+        # "[Outlet Name](https://...)" names the outlet in the link text, unless that text is the title
+        if before_url.endswith("]("):
+            link_text = before_url[before_url.rfind("[") + 1:-2].strip()
+            if (
+                0 < len(link_text) <= MAX_SOURCE_LENGTH
+                and "http" not in link_text
+                and _clean_title(link_text) != title
+            ):
+                return link_text
+        return ""
+    source = MARKDOWN_LINK_PATTERN.sub(r"\1", match.group(1))
+    source = SOURCE_PREFIX_PATTERN.sub("", source.strip()).strip()
+    source = TRAILING_BOLD_PATTERN.sub("", source).strip()
+    return EDGE_PUNCTUATION_PATTERN.sub("", source)
+
+
+def _find_snippet(text: str, after_url: str) -> str:
+    match = SNIPPET_FIELD_PATTERN.search(text)
+    if match:
+        snippet = match.group(1)
+    else:
+        # No labelled snippet: use the item text that follows the URL and its attribution
+        if _attribution(after_url):
+            after_url = after_url.partition("\n")[2]
+        snippet = MARKDOWN_LINK_PATTERN.sub(r"\1", after_url)
+        snippet = URL_PATTERN.sub("", snippet)
+        snippet = " ".join(
+            line for line in snippet.split("\n") if not FIELD_LABEL_PATTERN.match(
+                LIST_MARKER_PATTERN.sub("", line.strip())
+            )
+        )
+        snippet = EDGE_PUNCTUATION_PATTERN.sub("", snippet)[:SNIPPET_LENGTH]
+
+    snippet = SNIPPET_LABEL_PATTERN.sub("", snippet).strip()
+    return INLINE_BOLD_PATTERN.sub(r"\1", snippet).strip()
+
+
+def _url_segments(item: str) -> List[Tuple[str, int, int, int]]:
+    """
+    Return (url, segment_start, url_start, segment_end) for each distinct URL.
+
+    An item usually holds one article. When it holds several URLs (prose
+    answers, or several links under one heading) each URL only sees the text
+    between its neighbours.
+    """
+    matches = list(URL_PATTERN.finditer(item))
+    segments = []
+    seen = set()
+    for i, match in enumerate(matches):
+        url = match.group(0)
+        if url in seen:
+            continue
+        seen.add(url)
+        start = 0
+        if i:
+            start = item.find("\n", matches[i - 1].end())
+            start = len(item) if start == -1 else start + 1
+        end = len(item)
+        if i + 1 < len(matches):
+            end = item.rfind("\n", match.end(), matches[i + 1].start())
+            end = matches[i + 1].start() if end == -1 else end
+        segments.append((url, min(start, match.start()), match.start(), max(end, match.end())))
+    return segments
+
+
+def parse_articles(content: str, query: str, political_leaning: str) -> List[Dict[str, Any]]:
+    """
+    Parse a Perplexity response into article records.
+
+    Each record has the keys ``get_articles_from_perplexity`` has always
+    returned: title, url, source_name, snippet, domain, favicon_url and
+    political_leaning. URLs are canonicalized and reported once, in order
+    of first appearance.
+    """
+    articles = []
+    seen_urls = set()
+
+    for item in split_items(content):
+        if "http" not in item:
+            continue
+
+        for written_url, start, url_start, end in _url_segments(item):
+            url = canonical_url(written_url)
+            if url in seen_urls:
+                continue
+            seen_urls.add(url)
+
+            segment = item[start:end]
+            before_url = item[start:url_start]
+            after_url = item[url_start + len(written_url):end]
+
+            title = _find_title(before_url) or _find_title(segment) or f"Article about {query}"
+
+            domain = ""
+            domain_match = DOMAIN_PATTERN.match(url)
+            if domain_match:
+                domain = domain_match.group(1)
+
+            articles.append(
+                {
+                    "title": title,
+                    "url": url,
+                    "source_name": _find_source(segment, before_url, after_url, title) or domain or "Unknown Source",
+                    "snippet": _find_snippet(segment, after_url),
+                    "domain": domain,
+                    "favicon_url": f"https://www.google.com/s2/favicons?domain={domain}&sz=128",
+                    "political_leaning": political_leaning,
+                }
+            )
+
+    return articles
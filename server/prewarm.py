@@ -0,0 +1,135 @@
+"""
+Scheduled pre-warming of hot and recurring searches.
+
+Every cycle, one API worker (the one holding the ``prewarm`` lease) picks
+the searches most likely to be run again soon and refreshes their cached
+results before they expire:
+
+- hot: searched at least ``HOT_MIN_SEARCHES`` times in the last
+  ``HOT_WINDOW_HOURS`` hours, according to the query log;
+- recurring: searched on at least ``RECURRING_MIN_DAYS`` different days of
+  the last ``RECURRING_WINDOW_DAYS``, in the query log or by the same user
+  in their search history.
+
+Candidates whose cached result is still younger than ``refresh_age`` are
+skipped, and at most ``budget`` searches are refreshed per cycle, one at a
+time, so pre-warming has a fixed upstream cost per cycle.
+"""
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Set, Tuple
+
+from leases import Lease
+from query_cache import QueryCache, cache_key
+
+logger = logging.getLogger(__name__)
+
+HOT_WINDOW_HOURS = 6
+HOT_MIN_SEARCHES = 3
+RECURRING_WINDOW_DAYS = 7
+RECURRING_MIN_DAYS = 2
+
+# Searches from history have no limit of their own
+DEFAULT_LIMIT = 27
+
+RefreshFn = Callable[[str, int], Awaitable[None]]
+NormalizeFn = Callable[[str], str]
+
+
+class Prewarmer:
+    """Refreshes the cached results of hot and recurring searches on a schedule."""
+
+    def __init__(
+        self,
+        cache: QueryCache,
+        users,
+        refresh: RefreshFn,
+        normalize: NormalizeFn,
+        lease: Lease,
+        interval: float,
+        budget: int,
+        refresh_age: float,
+    ):
+        self._cache = cache
+        self._users = users
+        self._refresh = refresh
+        self._normalize = normalize
+        self._lease = lease
+        self.interval = interval
+        self.budget = budget
+        self.refresh_age = refresh_age
+
+    async def run(self) -> None:
+        while True:
+            try:
+                if await self._lease.acquire():
+                    await self.run_once()
+            except Exception as e:
+                logger.error(f"Error pre-warming queries: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> int:
+        """Refresh the most wanted stale searches, up to the budget; returns how many were refreshed."""
+        candidates = await self.candidates()
+        ages = await self._cache.ages([key for key, *_ in candidates])
+        due = [c for c in candidates if ages.get(c[0], float("inf")) >= self.refresh_age][: self.budget]
+        refreshed = 0
+        for key, query, limit, reason in due:
+            started = time.monotonic()
+            try:
+                await self._refresh(query, limit)
+                refreshed += 1
+                logger.info(f"Pre-warmed {reason} query {query!r} in {time.monotonic() - started:.1f}s")
+            except Exception as e:
+                logger.error(f"Error pre-warming query {query!r}: {str(e)}")
+            # Keep the lease while refreshing; stop if another worker took over
+            if not await self._lease.acquire():
+                break
+        if candidates:
+            logger.info(f"Pre-warm cycle: {len(candidates)} candidates, {len(due)} due, {refreshed} refreshed")
+        return refreshed
+
+    async def candidates(self) -> List[Tuple[str, str, int, str]]:
+        """(cache key, query, limit, reason) of searches worth keeping warm, most wanted first."""
+        scored: Dict[str, Tuple[float, str, int, str]] = {}
+
+        def add(key: str, query: str, limit: int, score: float, reason: str):
+            if key not in scored or scored[key][0] < score:
+                scored[key] = (score, query, limit, reason)
+
+        for entry in await self._cache.logged_queries(RECURRING_WINDOW_DAYS * 24):
+            if len(entry["days"]) >= RECURRING_MIN_DAYS:
+                add(entry["_id"], entry["query"], entry["limit"], len(entry["days"]), "recurring")
+
+        # Hot searches go first: they are the ones about to be run again
+        for entry in await self._cache.logged_queries(HOT_WINDOW_HOURS):
+            if entry["count"] >= HOT_MIN_SEARCHES:
+                add(entry["_id"], entry["query"], entry["limit"], 1000 + entry["count"], "hot")
+
+        for query, days in (await self._history_days()).items():
+            if len(days) >= RECURRING_MIN_DAYS:
+                add(cache_key(query, DEFAULT_LIMIT), query, DEFAULT_LIMIT, len(days), "tracked")
+
+        ranked = sorted(scored.items(), key=lambda item: -item[1][0])
+        return [(key, query, limit, reason) for key, (_, query, limit, reason) in ranked]
+
+    async def _history_days(self) -> Dict[str, Set[str]]:
+        """Normalized query -> days a single user searched it on, for the most regular user of each."""
+        since = (datetime.now() - timedelta(days=RECURRING_WINDOW_DAYS)).isoformat()
+        cursor = self._users.aggregate([
+            {"$unwind": "$searchHistory"},
+            {"$match": {"searchHistory.timestamp": {"$gte": since}}},
+            {"$project": {"query": "$searchHistory.query", "timestamp": "$searchHistory.timestamp"}},
+        ])
+        per_user: Dict[Tuple[Any, str], Set[str]] = defaultdict(set)
+        async for entry in cursor:
+            per_user[(entry["_id"], self._normalize(entry["query"]))].add(entry["timestamp"][:10])
+        days: Dict[str, Set[str]] = {}
+        for (_, query), user_days in per_user.items():
+            if len(user_days) > len(days.get(query, ())):
+                days[query] = user_days
+        return days
@@ -0,0 +1,103 @@
+"""
+Opt-in cProfile profiling of individual requests.
+
+When profiling is enabled, a request carrying the profiling token in the
+``X-Panorama-Profile`` header runs under cProfile. The profile is written
+to the profile directory as a ``.prof`` file (readable with pstats or
+snakeviz) and its id is returned in the ``X-Profile-Id`` response header.
+
+cProfile traces the whole event loop thread, so the profile also contains
+whatever other requests ran in the meantime. Only one request is profiled
+at a time; others that ask while a profile is running are served normally.
+"""
+
+import asyncio
+import cProfile
+import hmac
+import io
+import logging
+import os
+import pstats
+import re
+import uuid
+from typing import Awaitable, Callable, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+REQUEST_HEADER = "X-Panorama-Profile"
+RESPONSE_HEADER = "X-Profile-Id"
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+T = TypeVar("T")
+
+
+class RequestProfiler:
+    """Profiles requests that present ``token``, keeping the newest ``keep`` profiles."""
+
+    def __init__(self, directory: str, token: Optional[str], enabled: bool = False, keep: int = 50):
+        self.directory = directory
+        self.token = token
+        # Profiling without a token would let anyone slow the server down
+        self.enabled = enabled and bool(token)
+        self.keep = keep
+        self._lock = asyncio.Lock()
+
+        if enabled and not token:
+            logger.warning("Profiling is enabled but PROFILING_TOKEN is not set; profiling stays off")
+
+    def authorized(self, header_value: Optional[str]) -> bool:
+        if not self.enabled or not header_value:
+            return False
+        return hmac.compare_digest(header_value, self.token)
+
+    async def run(self, call: Callable[[], Awaitable[T]]) -> Tuple[T, Optional[str]]:
+        """Await ``call()`` under cProfile. Returns its result and the profile id, if one was taken."""
+        if self._lock.locked():
+            logger.info("Skipping profile request: another profile is running")
+            return await call(), None
+
+        async with self._lock:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                result = await call()
+            finally:
+                profiler.disable()
+
+            profile_id = uuid.uuid4().hex
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                profiler.dump_stats(self.path(profile_id))
+                self._prune()
+            except OSError as e:
+                logger.error(f"Could not save profile: {str(e)}")
+                return result, None
+
+        logger.info(f"Saved request profile {profile_id}")
+        return result, profile_id
+
+    def path(self, profile_id: str) -> str:
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            raise ValueError(f"Invalid profile id: {profile_id}")
+        return os.path.join(self.directory, f"{profile_id}.prof")
+
+    def exists(self, profile_id: str) -> bool:
+        return bool(PROFILE_ID_PATTERN.match(profile_id)) and os.path.exists(self.path(profile_id))
+
+    def report(self, profile_id: str, sort: str = "cumulative", limit: int = 60) -> str:
+        """The profile's hottest functions as pstats text."""
+        output = io.StringIO()
+        stats = pstats.Stats(self.path(profile_id), stream=output)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def _prune(self) -> None:
+        profiles = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".prof")
+        ]
+        profiles.sort(key=os.path.getmtime)
+        for path in profiles[:-self.keep]:
+            os.remove(path)
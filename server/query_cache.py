@@ -0,0 +1,130 @@
+"""
+Cached /query results and the query log they are chosen from.
+
+A cached result holds the ids of the sources a search stored, not the
+sources themselves, and when and how it was refreshed, so a hit costs one
+read of the sources collection and the response can say how old it is.
+The query log counts searches per normalized query and hour; prewarm.py
+mines it for hot and recurring queries.
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Cached results nobody refreshed for this long are removed
+RESULT_RETENTION_SECONDS = 7 * 24 * 3600
+# Query log buckets are kept this long
+LOG_RETENTION_SECONDS = 14 * 24 * 3600
+
+
+def cache_key(normalized_query: str, limit: int) -> str:
+    return f"{limit}:{normalized_query}"
+
+
+class QueryCache:
+    """Cached search results in ``results`` and hourly search counts in ``log``."""
+
+    def __init__(self, results, log, ttl: float):
+        self._results = results
+        self._log = log
+        self.ttl = ttl
+        self._indexes_ready = False
+
+    async def _ensure_indexes(self) -> None:
+        if self._indexes_ready:
+            return
+        await self._results.create_index("refreshed_at", expireAfterSeconds=RESULT_RETENTION_SECONDS)
+        await self._log.create_index("hour")
+        await self._log.create_index("created", expireAfterSeconds=LOG_RETENTION_SECONDS)
+        self._indexes_ready = True
+
+    async def latest(self, key: str) -> Optional[Dict[str, Any]]:
+        """The last result cached for ``key``, however old; its ``age`` is in seconds."""
+        entry = await self._results.find_one({"_id": key})
+        if entry is not None:
+            entry["age"] = max(0.0, time.time() - entry["refreshed_ts"])
+        return entry
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """The cached result for ``key`` if it is younger than the TTL."""
+        entry = await self.latest(key)
+        if entry is None or entry["age"] > self.ttl:
+            return None
+        return entry
+
+    async def ages(self, keys: List[str]) -> Dict[str, float]:
+        """Seconds since each of ``keys`` was refreshed, for those that are cached."""
+        now = time.time()
+        entries = self._results.find({"_id": {"$in": keys}}, {"refreshed_ts": 1})
+        return {entry["_id"]: now - entry["refreshed_ts"] async for entry in entries}
+
+    async def put(
+        self,
+        key: str,
+        query: str,
+        limit: int,
+        source_ids: List[str],
+        statistics: Dict[str, int],
+        timeline_positioning: Dict[str, float],
+        seconds: float,
+        refreshed_by: str,
+    ) -> None:
+        """Cache a complete search result; ``seconds`` is how long the search took."""
+        await self._ensure_indexes()
+        await self._results.update_one(
+            {"_id": key},
+            {
+                "$set": {
+                    "query": query,
+                    "limit": limit,
+                    "source_ids": source_ids,
+                    "statistics": statistics,
+                    "timeline_positioning": timeline_positioning,
+                    "refreshed_at": datetime.now(),
+                    "refreshed_ts": time.time(),
+                    "refresh_seconds": seconds,
+                    "refreshed_by": refreshed_by,
+                },
+                "$inc": {"refreshes": 1},
+            },
+            upsert=True,
+        )
+
+    async def record_hit(self, key: str) -> None:
+        await self._results.update_one({"_id": key}, {"$inc": {"hits": 1}, "$set": {"last_hit": datetime.now()}})
+
+    async def log(self, key: str, query: str, limit: int) -> None:
+        """Count a search in the query log."""
+        await self._ensure_indexes()
+        now = datetime.now()
+        hour = now.strftime("%Y-%m-%dT%H")
+        await self._log.update_one(
+            {"_id": f"{hour}|{key}"},
+            {
+                "$inc": {"count": 1},
+                "$set": {"query": query, "last": now},
+                "$setOnInsert": {"key": key, "limit": limit, "hour": hour, "day": hour[:10], "created": now},
+            },
+            upsert=True,
+        )
+
+    async def logged_queries(self, hours: float) -> List[Dict[str, Any]]:
+        """Per logged query over the last ``hours``: its searches and the days it was searched on."""
+        since = (datetime.now() - timedelta(hours=hours)).strftime("%Y-%m-%dT%H")
+        cursor = self._log.aggregate([
+            {"$match": {"hour": {"$gte": since}}},
+            # Oldest hour first, so $last takes the most recent spelling of the query
+            {"$sort": {"hour": 1}},
+            {"$group": {
+                "_id": "$key",
+                "query": {"$last": "$query"},
+                "limit": {"$last": "$limit"},
+                "count": {"$sum": "$count"},
+                "days": {"$addToSet": "$day"},
+            }},
+        ])
+        return await cursor.to_list(None)
@@ -0,0 +1,193 @@
+"""
+Query jobs: searches run in the background and followed by polling or SSE.
+
+``POST /queries`` starts the search pipeline in the API process that
+received it and returns a query id at once. Each source is appended to the
+job's document as soon as it is stored, so any API process can answer for
+the job's status, the results so far, and its event stream, whichever
+worker runs it.
+
+The process running a job keeps its heartbeat fresh and watches for two
+reasons to stop it early: a client asked to cancel it, or nobody has polled
+or subscribed to it for ``idle_timeout`` seconds. Finished jobs are removed
+by a TTL index.
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Dict, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Running jobs nobody polled or subscribed to for this long are cancelled
+IDLE_TIMEOUT_SECONDS = 60.0
+# Jobs are removed this long after they were submitted
+JOB_TTL_SECONDS = 3600
+# How often the running process checks its jobs and refreshes their heartbeat
+WATCH_INTERVAL = 1.0
+# A running job whose heartbeat is older than this lost the process running it
+STALE_SECONDS = 30.0
+# Reads refresh last_seen at most this often, to keep polling from turning into writes
+TOUCH_INTERVAL = 5.0
+
+
+class QueryJobs:
+    """Query job documents, plus the tasks running this process's jobs."""
+
+    def __init__(self, collection, owner: str, idle_timeout: float = IDLE_TIMEOUT_SECONDS):
+        self._collection = collection
+        self.owner = owner
+        self.idle_timeout = idle_timeout
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._watcher: Optional[asyncio.Task] = None
+        self._indexes_ready = False
+
+    async def _ensure_indexes(self) -> None:
+        if self._indexes_ready:
+            return
+        await self._collection.create_index("idempotency_key", unique=True, sparse=True)
+        await self._collection.create_index("created", expireAfterSeconds=JOB_TTL_SECONDS)
+        self._indexes_ready = True
+
+    async def create(
+        self, job_id: str, request: Dict[str, Any], request_hash: str, idempotency_key: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Record a new running job, or return the one already submitted with ``idempotency_key``.
+
+        The second element is True when this process should run the job:
+        it is new, or the earlier run under the same key failed or was
+        cancelled and is restarted under the same id.
+        """
+        await self._ensure_indexes()
+        now = time.time()
+        document = {
+            "_id": job_id,
+            "request": request,
+            "request_hash": request_hash,
+            "status": RUNNING,
+            "sources": [],
+            "source_count": 0,
+            "owner": self.owner,
+            "heartbeat": now,
+            "last_seen": now,
+            "created": datetime.now(),
+        }
+        if idempotency_key:
+            document["idempotency_key"] = idempotency_key
+        try:
+            await self._collection.insert_one(document)
+            return document, True
+        except DuplicateKeyError:
+            if not idempotency_key:
+                raise
+
+        existing = await self._collection.find_one({"idempotency_key": idempotency_key})
+        if existing is None or existing["request_hash"] != request_hash:
+            return existing, False
+        restarted = await self._collection.find_one_and_update(
+            {"_id": existing["_id"], "status": {"$in": [FAILED, CANCELLED]}},
+            {
+                "$set": {
+                    "status": RUNNING, "sources": [], "source_count": 0, "owner": self.owner,
+                    "heartbeat": now, "last_seen": now, "cancel_requested": False,
+                },
+                "$unset": {"error": "", "statistics": "", "timeline_positioning": "", "partial": ""},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+        if restarted is not None:
+            return restarted, True
+        return existing, False
+
+    def start(self, job_id: str, work: Awaitable[None]) -> None:
+        """Run ``work`` for a job in this process, in a context of its own."""
+        # A fresh context, so the job doesn't report into the submitting request's timings or cassette
+        task = contextvars.Context().run(asyncio.get_running_loop().create_task, work)
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def get(self, job_id: str, since: int = 0) -> Optional[Dict[str, Any]]:
+        """A job with its sources from index ``since`` on; reading it counts as the client still being there."""
+        projection = {"sources": {"$slice": [since, 10 ** 6]}} if since else None
+        job = await self._collection.find_one({"_id": job_id}, projection)
+        if job is None:
+            return None
+        now = time.time()
+        if job["status"] == RUNNING and now - job["heartbeat"] > STALE_SECONDS:
+            await self.finish(job_id, FAILED, error="The server running this query stopped")
+            job.update(status=FAILED, error="The server running this query stopped")
+        elif now - job["last_seen"] > TOUCH_INTERVAL:
+            await self._collection.update_one({"_id": job_id}, {"$set": {"last_seen": now}})
+        return job
+
+    async def add_source(self, job_id: str, source: Dict[str, Any]) -> None:
+        await self._collection.update_one(
+            {"_id": job_id, "status": RUNNING},
+            {"$push": {"sources": source}, "$inc": {"source_count": 1}},
+        )
+
+    async def finish(self, job_id: str, status: str, **fields: Any) -> None:
+        if "sources" in fields:
+            fields["source_count"] = len(fields["sources"])
+        await self._collection.update_one(
+            {"_id": job_id, "status": RUNNING},
+            {"$set": dict(fields, status=status, finished=datetime.now())},
+        )
+
+    async def request_cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Ask whichever process runs the job to stop it; returns the job, or None if it doesn't exist."""
+        return await self._collection.find_one_and_update(
+            {"_id": job_id},
+            {"$set": {"cancel_requested": True}},
+            projection={"sources": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _watch(self) -> None:
+        while self._tasks:
+            await asyncio.sleep(WATCH_INTERVAL)
+            job_ids = list(self._tasks)
+            if not job_ids:
+                continue
+            now = time.time()
+            try:
+                await self._collection.update_many(
+                    {"_id": {"$in": job_ids}, "status": RUNNING}, {"$set": {"heartbeat": now}}
+                )
+                stop = self._collection.find(
+                    {
+                        "_id": {"$in": job_ids},
+                        "$or": [{"cancel_requested": True}, {"last_seen": {"$lt": now - self.idle_timeout}}],
+                    },
+                    {"cancel_requested": 1},
+                )
+                async for job in stop:
+                    task = self._tasks.get(job["_id"])
+                    if task is not None:
+                        reason = "cancelled by the client" if job.get("cancel_requested") else "abandoned"
+                        logger.info(f"Stopping query job {job['_id']}: {reason}")
+                        task.cancel()
+            except Exception as e:
+                logger.error(f"Error watching query jobs: {str(e)}")
+
+    async def aclose(self) -> None:
+        tasks = list(self._tasks.values())
+        if self._watcher is not None:
+            tasks.append(self._watcher)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,128 @@
+"""
+Per-process resources, opened and closed by the app's lifespan.
+
+The MongoDB client, the connection pool used for scraping, the OpenAI client
+and the thread pool all hold sockets or threads, so none of them is created
+at import, and neither is anything read from disk, like the domain bias
+index. With several workers (``uvicorn --workers N``) every worker process
+opens its own when it starts serving.
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Sequence
+
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import cassette
+from bias_index import BiasIndex
+from domain_health import DomainHealthStore
+from fingerprint import RecentDuplicates
+from job_queue import JobQueue
+from leases import owner_id
+from query_cache import QueryCache
+from query_jobs import QueryJobs
+from text_store import TextStore
+
+try:
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+except ImportError:
+    AsyncOpenAI = None
+
+logger = logging.getLogger(__name__)
+
+
+class Resources:
+    """Clients, pools and stores shared by every request a worker serves."""
+
+    def __init__(self):
+        self.mongo_client: Optional[AsyncIOMotorClient] = None
+        self.db = None
+        self.sources_collection = None
+        self.queries_collection = None
+        self.users_collection = None
+        self.search_history_collection = None
+        self.domain_health_collection = None
+        self.text_dictionaries_collection = None
+        self.leases_collection = None
+        self.scrape_jobs_collection = None
+        self.query_jobs_collection = None
+        self.query_log_collection = None
+        self.domain_health: Optional[DomainHealthStore] = None
+        self.text_store: Optional[TextStore] = None
+        self.jobs: Optional[JobQueue] = None
+        self.query_jobs: Optional[QueryJobs] = None
+        self.query_cache: Optional[QueryCache] = None
+        self.recent_duplicates: Optional[RecentDuplicates] = None
+        self.bias_index: Optional[BiasIndex] = None
+        self.http: Optional[httpx.AsyncClient] = None
+        self.openai = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+
+    async def open(
+        self,
+        mongodb_url: str,
+        openai_api_key: Optional[str] = None,
+        scrape_connections: int = 100,
+        threads: Optional[int] = None,
+        scrape_timeout: float = 15.0,
+        query_cache_ttl: float = 900.0,
+        near_duplicate_window: float = 48 * 3600.0,
+        domain_bias_files: Sequence[str] = (),
+    ) -> None:
+        # Used by asyncio.to_thread: cassette files, large response compression, dictionary training
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="panorama")
+        asyncio.get_running_loop().set_default_executor(self.executor)
+
+        # Motor connects lazily, on the first operation
+        self.mongo_client = AsyncIOMotorClient(mongodb_url)
+        self.db = self.mongo_client.get_default_database()
+        self.sources_collection = self.db.sources  # Collection to store news responses
+        self.queries_collection = self.db.queries  # Cached query results
+        self.query_log_collection = self.db.queryLog  # Searches per query and hour, for pre-warming
+        self.users_collection = self.db.users  # Collection to store users
+        self.search_history_collection = self.db.searchHistory
+        self.domain_health_collection = self.db.domainHealth  # Scrape outcomes per news domain
+        self.text_dictionaries_collection = self.db.textDictionaries  # zstd dictionaries for compressed source text
+        self.leases_collection = self.db.leases  # Singleton jobs shared between workers
+        self.scrape_jobs_collection = self.db.scrapeJobs  # Queue feeding scrape_worker.py
+        self.query_jobs_collection = self.db.queryJobs  # Searches submitted to POST /queries
+        logger.info(f"Using MongoDB database: {self.db.name}")
+
+        self.domain_health = DomainHealthStore(self.domain_health_collection, latency_scale=scrape_timeout)
+        self.text_store = TextStore(self.text_dictionaries_collection)
+        self.jobs = JobQueue(self.scrape_jobs_collection)
+        self.query_jobs = QueryJobs(self.query_jobs_collection, owner_id())
+        self.query_cache = QueryCache(self.queries_collection, self.query_log_collection, query_cache_ttl)
+        self.recent_duplicates = RecentDuplicates(self.sources_collection, near_duplicate_window)
+        # Rated news domains, for scoring and classifying candidates locally
+        self.bias_index = BiasIndex.load(domain_bias_files)
+
+        # One pool for every page fetch, so repeat domains reuse their connections
+        limits = httpx.Limits(max_connections=scrape_connections, max_keepalive_connections=scrape_connections // 2)
+        self.http = httpx.AsyncClient(
+            follow_redirects=True,
+            transport=cassette.AsyncTransport(httpx.AsyncHTTPTransport(limits=limits)),
+        )
+
+        if openai_api_key and AsyncOpenAI is not None:
+            self.openai = AsyncOpenAI(
+                api_key=openai_api_key,
+                http_client=DefaultAsyncHttpxClient(transport=cassette.AsyncTransport()),
+            )
+
+    async def aclose(self) -> None:
+        if self.query_jobs is not None:
+            await self.query_jobs.aclose()
+        if self.jobs is not None:
+            await self.jobs.aclose()
+        if self.http is not None:
+            await self.http.aclose()
+        if self.openai is not None:
+            await self.openai.close()
+        if self.mongo_client is not None:
+            self.mongo_client.close()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,276 @@
+"""
+Speculative scraping for /query.
+
+Each political leaning needs a fixed number of successfully scraped sources.
+Instead of scraping exactly that many candidates and replacing failures one
+at a time afterwards, the scheduler keeps a few surplus candidates in flight
+per leaning, keeps the first successes and cancels whatever is still running
+once a leaning is full. A scrape that runs longer than the recent latency
+percentile launches the next candidate for the same leaning early, on top
+of the surplus. This is over-provisioning rather than a hedged request: the
+slow URL is not fetched a second time, since scrapes are shared per URL.
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+Slot = Tuple[int, int]
+ScrapeFn = Callable[[str], Awaitable[Dict[str, Any]]]
+ResultFn = Callable[[Slot, Dict[str, Any], Dict[str, Any]], Awaitable[None]]
+OutcomeFn = Callable[[str, Dict[str, Any], float], None]
+DuplicateFn = Callable[[Dict[str, Any], Dict[str, Any]], bool]
+
+# Failed sources with these status codes are dropped from the response entirely
+DROPPED_STATUS_CODES = {403, 404}
+
+
+class LatencyTracker:
+    """
+    Rolling window of scrape latencies used to pick the early-launch threshold.
+
+    Scrapes cancelled before finishing are censored: their true latency is
+    only known to be longer than they ran. One cancelled after running past
+    the threshold is known to be in the tail and is recorded with the time it
+    ran; one cancelled sooner says nothing about the tail and is left out.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 90.0,
+        window: int = 200,
+        min_samples: int = 20,
+        default: float = 8.0,
+    ):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default = default
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def record_censored(self, seconds: float) -> None:
+        """Record a scrape cancelled after ``seconds``, before it finished."""
+        if seconds >= self.threshold():
+            self.samples.append(seconds)
+
+    def threshold(self) -> float:
+        """Latency above which a scrape gets another candidate launched early."""
+        if len(self.samples) < self.min_samples:
+            return self.default
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return ordered[index]
+
+
+class _LeaningState:
+    def __init__(self, index: int, target: int):
+        self.index = index
+        self.target = target
+        self.candidates = 0
+        self.accepted = 0
+        # Heap of (-priority, rank, candidate): healthiest candidates launch first
+        self.pending: List[Tuple[float, int, Dict[str, Any]]] = []
+        self.running: Dict[asyncio.Task, Tuple[int, Dict[str, Any]]] = {}
+        self.failures: List[Tuple[int, Dict[str, Any], Dict[str, Any]]] = []
+
+    @property
+    def full(self) -> bool:
+        return self.accepted >= self.target
+
+    @property
+    def finished(self) -> bool:
+        return not self.running and (self.full or not self.pending)
+
+
+class ScrapeScheduler:
+    """
+    Scrape candidates for one query, keeping the first ``target`` successes
+    per leaning.
+
+    Candidates are added as they arrive with ``add()``. Every accepted
+    result is handed to ``on_result`` with its slot (leaning index, candidate
+    rank) as soon as it lands, and every completed scrape (success or
+    failure, but not cancellation) is reported to ``on_outcome`` with its
+    latency. Successes that ``is_duplicate`` (candidate, result) says
+    repeat a result already accepted are handed to ``on_result`` too, but
+    don't count toward the target. Once ``close()`` has been called and every
+    leaning is either full or out of candidates, ``wait()`` returns, after
+    reporting failed candidates as fallbacks for leanings that came up short.
+    """
+
+    def __init__(
+        self,
+        scrape_fn: ScrapeFn,
+        on_result: ResultFn,
+        leanings: List[str],
+        target: int,
+        surplus: int,
+        concurrency: int,
+        latency: LatencyTracker,
+        on_outcome: Optional[OutcomeFn] = None,
+        is_duplicate: Optional[DuplicateFn] = None,
+    ):
+        self._scrape_fn = scrape_fn
+        self._is_duplicate = is_duplicate
+        self._on_result = on_result
+        self._on_outcome = on_outcome
+        self._surplus = surplus
+        self._latency = latency
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._states = {leaning: _LeaningState(i, target) for i, leaning in enumerate(leanings)}
+        self._tasks: Set[asyncio.Task] = set()
+        self._closed = False
+        self._done = asyncio.Event()
+        self.early_launches = 0
+        self.cancelled = 0
+        self.duplicates = 0
+
+    def add(self, leaning: str, candidate: Dict[str, Any], priority: float = 0.0) -> None:
+        """
+        Queue a candidate and start scraping it if the leaning has room.
+
+        Among queued candidates, higher ``priority`` ones are scraped first.
+        """
+        state = self._states[leaning]
+        heapq.heappush(state.pending, (-priority, state.candidates, candidate))
+        state.candidates += 1
+        self._launch(leaning)
+
+    async def accept(self, leaning: str, candidate: Dict[str, Any], result: Dict[str, Any]) -> None:
+        """Take a candidate whose successful result is already known, without scraping it."""
+        state = self._states[leaning]
+        rank = state.candidates
+        state.candidates += 1
+        if state.full:
+            return
+        if self._is_duplicate is not None and self._is_duplicate(candidate, result):
+            self.duplicates += 1
+        else:
+            state.accepted += 1
+            if state.full:
+                self._cancel_running(leaning)
+        await self._on_result((state.index, rank), candidate, result)
+        self._check_done()
+
+    def spare(self, leaning: str) -> int:
+        """Candidates received beyond the leaning's current target."""
+        state = self._states[leaning]
+        return state.candidates - state.target
+
+    def raise_target(self, leaning: str, extra: int) -> None:
+        self._states[leaning].target += extra
+        self._launch(leaning)
+
+    def close(self) -> None:
+        """Signal that no more candidates will be added."""
+        self._closed = True
+        self._check_done()
+
+    async def wait(self) -> None:
+        await self._done.wait()
+
+        # Leanings that ran out of candidates keep their non-404/403 failures
+        for state in self._states.values():
+            missing = state.target - state.accepted
+            fallbacks = [
+                failure for failure in sorted(state.failures, key=lambda f: f[0])
+                if failure[2].get("status_code") not in DROPPED_STATUS_CODES
+            ]
+            for rank, candidate, result in fallbacks[:max(0, missing)]:
+                await self._on_result((state.index, rank), candidate, result)
+
+    def cancel(self) -> None:
+        """Cancel every scrape still in flight."""
+        for task in self._tasks:
+            task.cancel()
+
+    def _launch(self, leaning: str, early: bool = False) -> None:
+        state = self._states[leaning]
+        if state.full:
+            return
+
+        wanted = state.target - state.accepted + self._surplus
+        while state.pending and (early or len(state.running) < wanted):
+            _, rank, candidate = heapq.heappop(state.pending)
+            task = asyncio.create_task(self._scrape(leaning, rank, candidate))
+            state.running[task] = (rank, candidate)
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            early = False
+
+    def _launch_early(self, leaning: str, url: str) -> None:
+        state = self._states[leaning]
+        if state.full or not state.pending:
+            return
+        logger.info(f"Scrape of {url} is slow, launching another {leaning} candidate early")
+        self.early_launches += 1
+        self._launch(leaning, early=True)
+
+    def _cancel_running(self, leaning: str) -> None:
+        state = self._states[leaning]
+        for task in state.running:
+            task.cancel()
+        self.cancelled += len(state.running)
+        state.running.clear()
+        state.pending.clear()
+
+    def _check_done(self) -> None:
+        if self._closed and all(state.finished for state in self._states.values()):
+            self._done.set()
+
+    async def _scrape(self, leaning: str, rank: int, candidate: Dict[str, Any]) -> None:
+        state = self._states[leaning]
+        task = asyncio.current_task()
+        url = candidate["url"]
+        early_timer = None
+
+        try:
+            async with self._semaphore:
+                started = time.monotonic()
+                early_timer = asyncio.get_running_loop().call_later(
+                    self._latency.threshold(), self._launch_early, leaning, url
+                )
+                try:
+                    result = await self._scrape_fn(url)
+                except asyncio.CancelledError:
+                    self._latency.record_censored(time.monotonic() - started)
+                    raise
+                except Exception as e:
+                    result = {"success": False, "error": str(e), "status_code": 500, "url": url}
+                elapsed = time.monotonic() - started
+                self._latency.record(elapsed)
+        finally:
+            if early_timer:
+                early_timer.cancel()
+            state.running.pop(task, None)
+
+        if self._on_outcome:
+            self._on_outcome(url, result, elapsed)
+
+        if result["success"]:
+            if not state.full:
+                if self._is_duplicate is not None and self._is_duplicate(candidate, result):
+                    # Grouped with the copy already accepted; the slot goes to distinct coverage
+                    self.duplicates += 1
+                    await self._on_result((state.index, rank), candidate, result)
+                    self._launch(leaning)
+                else:
+                    state.accepted += 1
+                    if state.full:
+                        self._cancel_running(leaning)
+                    await self._on_result((state.index, rank), candidate, result)
+        else:
+            logger.warning(
+                f"Scraping failed for {url}: {result.get('error', 'Unknown error')} (Status code: {result.get('status_code', 0)})"
+            )
+            state.failures.append((rank, candidate, result))
+            self._launch(leaning)
+
+        self._check_done()
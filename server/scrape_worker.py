@@ -0,0 +1,167 @@
+"""
+Standalone scrape worker.
+
+Claims scrape jobs from the MongoDB job queue, fetches and extracts the
+pages with scraper.py, and stores the results for the API process waiting
+on them. API processes queue their scrapes here when SCRAPE_QUEUE_ENABLED
+is set, so scraping capacity scales with the number of workers running,
+on any machine that can reach MongoDB, independently of API replicas.
+
+Usage (from the server directory):
+    python scrape_worker.py [--concurrency 16] [--lease 30]
+
+Stops claiming on SIGINT/SIGTERM and finishes the jobs it holds first.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import logging
+import os
+import signal
+import time
+from typing import Any, Dict
+
+from dotenv import load_dotenv
+
+from deadline import deadline_scope
+import job_queue
+from leases import owner_id
+from resources import Resources
+import scraper
+import server_timing
+
+logger = logging.getLogger(__name__)
+
+SCRAPE_WORKER_CONCURRENCY = int(os.getenv("SCRAPE_WORKER_CONCURRENCY", "16"))
+# How often an idle worker looks for new jobs
+IDLE_POLL_SECONDS = 0.1
+# How often expired leases of dead workers are released
+REAPER_INTERVAL = 10.0
+
+
+class ScrapeWorker:
+    """Runs up to ``concurrency`` scrape jobs at a time."""
+
+    def __init__(self, resources: Resources, concurrency: int, lease: float = job_queue.LEASE_SECONDS):
+        self.resources = resources
+        self.concurrency = concurrency
+        self.lease = lease
+        self.owner = owner_id()
+        self.completed = 0
+
+    async def run(self, stop: asyncio.Event) -> None:
+        jobs = self.resources.jobs
+        slots = asyncio.Semaphore(self.concurrency)
+        running = set()
+        next_reap = 0.0
+        logger.info(f"Scrape worker {self.owner} running up to {self.concurrency} jobs")
+        while not stop.is_set():
+            if time.monotonic() >= next_reap:
+                next_reap = time.monotonic() + REAPER_INTERVAL
+                try:
+                    await jobs.requeue_expired()
+                except Exception as e:
+                    logger.error(f"Error requeueing expired jobs: {str(e)}")
+
+            await slots.acquire()
+            if stop.is_set():
+                # Stopped while every slot was busy
+                slots.release()
+                break
+            try:
+                job = await jobs.claim(self.owner, ["scrape"], self.lease)
+            except Exception as e:
+                logger.error(f"Error claiming a job: {str(e)}")
+                job = None
+            if job is None:
+                slots.release()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(stop.wait(), IDLE_POLL_SECONDS)
+                continue
+
+            task = asyncio.create_task(self._execute(job))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+        if running:
+            logger.info(f"Finishing {len(running)} jobs before stopping")
+            await asyncio.gather(*running, return_exceptions=True)
+
+    async def _execute(self, job: Dict[str, Any]) -> None:
+        jobs = self.resources.jobs
+        heartbeat = asyncio.create_task(self._renew(job))
+        try:
+            result = await self._scrape(job)
+            await jobs.complete(job, self.owner, result)
+            self.completed += 1
+        except Exception as e:
+            logger.error(f"Scrape job {job['_id']} failed: {str(e)}")
+            with contextlib.suppress(Exception):
+                await jobs.fail(job, self.owner, str(e))
+        finally:
+            heartbeat.cancel()
+
+    async def _scrape(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        payload = job["payload"]
+        timing = server_timing.start()
+        # Keep to the deadline of the request that queued the job
+        budget = job["deadline"] - time.time() if job.get("deadline") else None
+        scope = deadline_scope(budget) if budget is not None else contextlib.nullcontext()
+        with scope:
+            result = await scraper.scrape_website(
+                payload["url"],
+                self.resources.http,
+                # API processes enrich themselves, to share enrichment between near-duplicates
+                self.resources.openai if payload.get("enrich", True) else None,
+                store_raw_text=payload.get("store_raw_text", False),
+            )
+        result["timings"] = {name: seconds for name, (seconds, _) in timing.stages.items()}
+        return result
+
+    async def _renew(self, job: Dict[str, Any]) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                if not await self.resources.jobs.renew(job, self.owner, self.lease):
+                    logger.warning(f"Lost the lease on job {job['_id']}")
+                    return
+            except Exception as e:
+                logger.error(f"Error renewing the lease on job {job['_id']}: {str(e)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run scrape jobs from the MongoDB job queue")
+    parser.add_argument("--concurrency", type=int, default=SCRAPE_WORKER_CONCURRENCY, help="jobs run at a time")
+    parser.add_argument("--lease", type=float, default=job_queue.LEASE_SECONDS, help="seconds a job is held without renewal")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    load_dotenv()
+
+    async def run():
+        resources = Resources()
+        await resources.open(
+            os.getenv("MONGODB_URL"),
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            scrape_connections=int(os.getenv("SCRAPE_CONNECTIONS", "100")),
+            scrape_timeout=scraper.SCRAPE_TIMEOUT,
+        )
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        worker = ScrapeWorker(resources, args.concurrency, args.lease)
+        try:
+            await resources.jobs.ensure_indexes()
+            await worker.run(stop)
+        finally:
+            await resources.aclose()
+            logger.info(f"Scrape worker {worker.owner} stopped after {worker.completed} jobs")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
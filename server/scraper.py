@@ -0,0 +1,343 @@
+"""
+Fetching and extracting a single news page.
+
+Used by the API process to scrape in place, and by scrape_worker.py to run
+scrape jobs from the queue; it only needs an HTTP client and, for
+enrichment, an OpenAI client, so it can run in either.
+"""
+
+import asyncio
+import logging
+import re
+import time
+from datetime import datetime
+from typing import Any, Dict
+from urllib.parse import urlparse
+
+import httpx
+from bs4 import BeautifulSoup
+
+from content_extraction import extract_main_text
+from deadline import stage_timeout
+from fingerprint import simhash
+from url_canonical import page_canonical_url
+import metrics
+import server_timing
+
+logger = logging.getLogger(__name__)
+
+# Per-stage timeouts, each further capped by the request's remaining budget
+SCRAPE_TIMEOUT = 15.0
+LLM_TIMEOUT = 20.0
+# Share of the remaining budget a single page fetch may use
+FETCH_BUDGET_SHARE = 0.5
+# Articles shorter than this are not worth an LLM call
+MIN_ENRICHMENT_CHARS = 200
+# Metadata written by enrichment, shared between near-duplicate articles
+ENRICHMENT_KEYS = ("summary", "keywords", "questions", "error", "enrichment_missing", "extraction_error")
+
+try:
+    # Import metadata extraction module
+    from metadata_extraction import extract_metadata
+
+    logger.info("Imported metadata extraction module")
+except ImportError:
+    logger.warning(
+        "Could not import metadata extraction module, will use basic extraction"
+    )
+
+    async def extract_metadata(client, text, title, url):
+        return {"title": title, "url": url}
+
+
+async def enrich(llm_client, text: str, title: str, url: str) -> Dict[str, Any]:
+    """
+    Summary, keywords and questions for an article, from the LLM.
+
+    Returns the metadata to merge into the article's, with
+    ``enrichment_missing`` or ``extraction_error`` set if it failed.
+    """
+    try:
+        # Use the external metadata extraction function if imported,
+        # within whatever is left of the request's deadline
+        llm_timeout = stage_timeout(LLM_TIMEOUT)
+        if llm_timeout <= 0:
+            raise asyncio.TimeoutError()
+        with server_timing.stage("llm", metrics.LLM_SECONDS.labels(operation="metadata")):
+            advanced_metadata = await asyncio.wait_for(
+                extract_metadata(
+                    client=llm_client,
+                    text=text[:5000],  # Limit text to avoid token limits
+                    title=title,
+                    url=url,
+                ),
+                timeout=llm_timeout,
+            )
+        logger.info(f"Extracted advanced metadata for {url}")
+        return advanced_metadata
+    except asyncio.TimeoutError:
+        logger.warning(f"Skipped advanced metadata for {url}: deadline reached")
+        return {"enrichment_missing": True}
+    except Exception as e:
+        logger.error(f"Error extracting advanced metadata: {str(e)}")
+        return {"extraction_error": str(e)}
+
+
+def shared_enrichment(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """The enrichment in an article's metadata, to reuse for a near-duplicate of it."""
+    return {key: metadata[key] for key in ENRICHMENT_KEYS if key in metadata}
+
+
+async def scrape_website(
+    url: str, http: httpx.AsyncClient, llm_client=None, store_raw_text: bool = False
+) -> Dict[str, Any]:
+    """
+    Scrape a website and extract its content and metadata.
+
+    Pages are fetched with ``http``; with an OpenAI ``llm_client`` the article
+    is also summarized. ``store_raw_text`` keeps the whole page's text as
+    ``raw_text`` next to the extracted article body. Successful results carry
+    the ``simhash`` fingerprint of the article body and the page's
+    ``canonical_url``. A fetch that timed out within a timeout the request's
+    deadline had cut short is marked ``deadline_timeout``: it says nothing
+    about the host.
+    """
+    metrics.SCRAPES_IN_FLIGHT.inc()
+    fetch_timeout = SCRAPE_TIMEOUT
+    try:
+        logger.info(f"Scraping website: {url}")
+        headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+        }
+        fetch_timeout = stage_timeout(SCRAPE_TIMEOUT, FETCH_BUDGET_SHARE)
+        with server_timing.stage("fetch", metrics.FETCH_SECONDS):
+            response = await http.get(url, headers=headers, timeout=fetch_timeout)
+        if response.status_code != 200:
+            logger.warning(f"Failed to fetch URL: {url} - Status code: {response.status_code}")
+            return {
+                "success": False,
+                "error": f"Failed to fetch URL: {response.status_code}",
+                "status_code": response.status_code,
+                "url": url
+            }
+        
+        parse_started = time.perf_counter()
+        html = response.text
+        soup = BeautifulSoup(html, 'html.parser')
+        
+        # Extract text content
+        # Remove script and style elements
+        for script in soup(["script", "style"]):
+            script.extract()
+        
+        # Get text
+        page_text = soup.get_text(separator=' ', strip=True)
+        
+        # Extract title using multiple sources in order of preference
+        title = None
+        title_debug = {}
+        
+        # Check for domain-specific patterns first
+        domain = urlparse(url).netloc.lower()
+        
+        # Fathom Journal specific pattern (based on screenshots)
+        if "fathomjournal.org" in domain:
+            fathom_title_element = soup.select_one('div.the-title h2')
+            if fathom_title_element and fathom_title_element.get_text(strip=True):
+                title = fathom_title_element.get_text(strip=True)
+                title_debug["selected_from"] = "fathom_journal_specific"
+                title_debug["fathom_title"] = title
+        
+        # If no domain-specific match, try generic patterns
+        if not title:
+            # 1. Check for article/post specific title elements with more specific selectors
+            article_title_candidates = [
+                # Common article title classes
+                soup.find(class_=lambda c: c and any(x in str(c).lower() for x in ['article-title', 'post-title', 'entry-title', 'headline', 'title-text', 'the-title'])),
+                # Look for h2 inside div.the-title (common pattern)
+                soup.select_one('div.the-title h2'),
+                # Look for h1 inside article
+                soup.find('article').find('h1') if soup.find('article') else None,
+                # Look for h1 inside main
+                soup.find('main').find('h1') if soup.find('main') else None,
+                # Look for h1 inside header
+                soup.find('header').find('h1') if soup.find('header') else None,
+                # Look for first h1
+                soup.find('h1'),
+                # Look for first h2
+                soup.find('h2'),
+                # Look for specific div with title class
+                soup.find('div', class_='the-title'),
+            ]
+            
+            # Try to extract title from each candidate
+            for i, candidate in enumerate(article_title_candidates):
+                if candidate and candidate.get_text(strip=True):
+                    candidate_text = candidate.get_text(strip=True)
+                    title_debug[f"candidate_{i}"] = candidate_text
+                    if not title and len(candidate_text) > 5:
+                        title = candidate_text
+                        title_debug["selected_from"] = f"candidate_{i}"
+        
+        # 2. Check Open Graph metadata
+        og_title_tag = soup.find("meta", attrs={"property": "og:title"})
+        if og_title_tag and og_title_tag.get("content"):
+            og_title = og_title_tag.get("content")
+            title_debug["og_title"] = og_title
+            if (not title or len(title) < 10) and len(og_title) > 5:
+                title = og_title
+                title_debug["selected_from"] = "og_title"
+
+        # 3. Fallback to page title
+        if soup.title and soup.title.string:
+            page_title = soup.title.string
+            title_debug["page_title"] = page_title
+            if (not title or len(title) < 10) and len(page_title) > 5:
+                title = page_title
+                title_debug["selected_from"] = "page_title"
+
+        # 4. Try to extract from URL if still no title
+        if not title or len(title) < 5:
+            # Extract potential title from URL path
+            path = urlparse(url).path
+            if path:
+                path_parts = path.strip("/").split("/")
+                if path_parts:
+                    last_part = path_parts[-1]
+                    # Convert slug to readable title
+                    if last_part and "-" in last_part:
+                        url_title = " ".join(
+                            word.capitalize()
+                            for word in re.sub(r"\d+$", "", last_part).split("-")
+                        )
+                        title_debug["url_title"] = url_title
+                        title = url_title
+                        title_debug["selected_from"] = "url_title"
+
+        # Log title extraction debug info
+        logger.debug(f"Title extraction debug for {url}: {title_debug}")
+
+        # Extract Open Graph metadata
+        og_title = None
+        og_description = None
+        og_image = None
+        og_site_name = None
+
+        og_title_tag = soup.find("meta", attrs={"property": "og:title"})
+        if og_title_tag:
+            og_title = og_title_tag.get("content")
+
+        og_desc_tag = soup.find("meta", attrs={"property": "og:description"})
+        if og_desc_tag:
+            og_description = og_desc_tag.get("content")
+
+        og_image_tag = soup.find("meta", attrs={"property": "og:image"})
+        if og_image_tag:
+            og_image = og_image_tag.get("content")
+
+        og_site_tag = soup.find("meta", attrs={"property": "og:site_name"})
+        if og_site_tag:
+            og_site_name = og_site_tag.get("content")
+
+        # The URL the page names as its own, after any redirects
+        canonical_tag = soup.find("link", rel="canonical")
+        canonical = page_canonical_url(str(response.url), canonical_tag.get("href") if canonical_tag else None)
+
+        # Extract favicon
+        favicon = None
+        favicon_tag = soup.find(
+            "link", rel=lambda rel: rel and "icon" in rel.lower()
+        )
+        if favicon_tag:
+            favicon = favicon_tag.get("href")
+            # Handle relative URLs
+            if favicon and not favicon.startswith(("http://", "https://")):
+                # Extract domain from URL
+                domain_match = re.search(r"https?://(?:www\.)?([^/]+)", url)
+                if domain_match:
+                    domain = domain_match.group(0)
+                    favicon = f"{domain.rstrip('/')}/{favicon.lstrip('/')}"
+
+        # Extract publication date
+        published_date = None
+        try:
+            date_tag = soup.find(
+                "meta", attrs={"property": "article:published_time"}
+            )
+            if date_tag:
+                published_date = date_tag.get("content")
+
+            if not published_date:
+                # Try other common date meta tags
+                date_tags = [
+                    soup.find("meta", attrs={"property": "article:published_time"}),
+                    soup.find("meta", attrs={"name": "publication_date"}),
+                    soup.find("meta", attrs={"name": "publish_date"}),
+                    soup.find("meta", attrs={"name": "date"}),
+                    soup.find("time"),
+                ]
+
+                for tag in date_tags:
+                    if tag:
+                        date_content = tag.get("content") or tag.get("datetime")
+                        if date_content:
+                            published_date = date_content
+                            break
+        except Exception as e:
+            logger.warning(f"Error extracting publication date: {str(e)}")
+
+        # Extract domain
+        domain = None
+        domain_match = re.search(r"https?://(?:www\.)?([^/]+)", url)
+        if domain_match:
+            domain = domain_match.group(1)
+
+        # Keep the article body; strips boilerplate from the soup, so it runs last.
+        # Index pages and client-rendered pages fall back to the whole page
+        text = extract_main_text(soup) or page_text
+
+        # Basic metadata dictionary
+        metadata = {
+            "title": title or og_title,
+            "description": og_description,
+            "site_name": og_site_name,
+            "processed_date": datetime.now().isoformat(),
+        }
+        parse_seconds = time.perf_counter() - parse_started
+        server_timing.record("html", parse_seconds)
+        metrics.PARSE_SECONDS.labels(kind="html").observe(parse_seconds)
+
+        # Skip OpenAI processing if no API key or if text is too short
+        if llm_client is not None and len(text) > MIN_ENRICHMENT_CHARS:
+            metadata.update(await enrich(llm_client, text, title or og_title or "Untitled", url))
+
+        result = {
+            "success": True,
+            "url": url,
+            "canonical_url": canonical,
+            "title": title or og_title or "Untitled",
+            "text": text,
+            "og_image": og_image,
+            "favicon_url": favicon
+            or f"https://www.google.com/s2/favicons?domain={domain}&sz=128",
+            "published_date": published_date,
+            "domain": domain,
+            "metadata": metadata,
+            "simhash": simhash(text),
+        }
+        if store_raw_text:
+            result["raw_text"] = page_text
+        return result
+    except Exception as e:
+        logger.error(f"Error scraping website {url}: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e),
+            "status_code": 500,  # Internal error as default
+            "url": url,
+            "error_type": type(e).__name__,
+            "deadline_timeout": isinstance(e, (httpx.TimeoutException, asyncio.TimeoutError))
+            and fetch_timeout < SCRAPE_TIMEOUT,
+        }
+    finally:
+        metrics.SCRAPES_IN_FLIGHT.dec()
@@ -0,0 +1,82 @@
+"""
+Per-request stage timings for the Server-Timing response header.
+
+Middleware starts a ``ServerTiming`` for every request; code anywhere below
+it wraps its stages in ``stage()``, which adds the elapsed time to the
+current request's timings and, optionally, to a metrics histogram. Tasks
+spawned while handling the request inherit the same timings, so concurrent
+stages (one fetch per source, say) add up, and the header reports their
+summed time and how many times each ran.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+HEADER = "Server-Timing"
+
+_current: ContextVar[Optional["ServerTiming"]] = ContextVar("server_timing", default=None)
+
+
+class ServerTiming:
+    """Stage durations collected while handling one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        # name -> [total seconds, count], in the order stages first ran
+        self.stages: Dict[str, List[float]] = {}
+        self.notes: Dict[str, str] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        entry = self.stages.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+    def note(self, name: str, description: str) -> None:
+        """A metric without a duration, such as a cache hit."""
+        self.notes[name] = description
+
+    def header_value(self) -> str:
+        entries = []
+        for name, (seconds, count) in self.stages.items():
+            entry = f"{name};dur={seconds * 1000:.1f}"
+            if count > 1:
+                entry += f';desc="{count}x"'
+            entries.append(entry)
+        for name, description in self.notes.items():
+            entries.append(f'{name};desc="{description}"')
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def start() -> ServerTiming:
+    """Begin collecting timings for the current request."""
+    timing = ServerTiming()
+    _current.set(timing)
+    return timing
+
+
+def record(name: str, seconds: float) -> None:
+    timing = _current.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+
+def note(name: str, description: str) -> None:
+    timing = _current.get()
+    if timing is not None:
+        timing.note(name, description)
+
+
+@contextmanager
+def stage(name: str, histogram=None) -> Iterator[None]:
+    """Time a block as stage ``name``, also observing ``histogram`` if given."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        record(name, elapsed)
+        if histogram is not None:
+            histogram.observe(elapsed)
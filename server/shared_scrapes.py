@@ -0,0 +1,60 @@
+"""
+Scrapes shared between the queries of a batch.
+
+Topics tracked together overlap heavily, so the same articles come back
+from Perplexity for several of them. Every query of a batch scrapes through
+one ``SharedScrapes``: each URL is fetched and enriched at most once, later
+queries reuse the result, and one semaphore bounds how many scrapes the
+whole batch runs at a time.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from scrape_scheduler import OutcomeFn, ScrapeFn
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class SharedScrapes:
+    """Scrape results kept for the lifetime of a batch, with concurrency shared across its queries."""
+
+    def __init__(self, scrape_fn: ScrapeFn, concurrency: int, on_outcome: Optional[OutcomeFn] = None):
+        self._scrape_fn = scrape_fn
+        self._on_outcome = on_outcome
+        self._slots = asyncio.Semaphore(concurrency)
+        self._flights = SingleFlight()
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self.requested = 0
+        self.reused = 0
+
+    async def scrape(self, url: str) -> Dict[str, Any]:
+        """The scrape result for ``url``, scraping it only if no query of the batch has yet."""
+        self.requested += 1
+        result = self._results.get(url)
+        if result is not None:
+            self.reused += 1
+            return result
+        # Queries asking while the first scrape runs wait for it; it is
+        # only cancelled once none of them wants it any more
+        result, shared = await self._flights.do(url, lambda: self._scrape(url))
+        if shared:
+            self.reused += 1
+        return result
+
+    async def _scrape(self, url: str) -> Dict[str, Any]:
+        async with self._slots:
+            started = time.monotonic()
+            result = await self._scrape_fn(url)
+            elapsed = time.monotonic() - started
+        self._results[url] = result
+        # Outcomes are recorded once per fetch, not once per query that used it
+        if self._on_outcome:
+            self._on_outcome(url, result, elapsed)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        return {"scrapes_requested": self.requested, "scrapes_reused": self.reused}
@@ -0,0 +1,60 @@
+"""
+Single-flight coalescing of identical concurrent calls.
+
+When a story breaks, many users run the same search within seconds. The
+first caller for a key (the leader) starts the work; every caller that
+arrives while it is still running awaits the same result instead of
+repeating the upstream calls.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Run at most one call per key at a time and share its result."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+
+    def in_flight(self) -> int:
+        """Number of keys currently being computed."""
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Return ``fn()``'s result, running it only if no call for ``key`` is in flight.
+
+        The second element of the returned tuple is True when the result came
+        from another caller's run. The work runs in its own task, so a caller
+        that disconnects does not cancel it for the others; it is only
+        cancelled once every caller waiting on it has gone.
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._calls[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda t: self._forget(key, t))
+
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task), shared
+        except asyncio.CancelledError:
+            if self._waiters.get(key) == 1 and not task.done():
+                logger.info(f"Cancelling in-flight call with no remaining waiters: {key!r}")
+                task.cancel()
+            raise
+        finally:
+            if self._calls.get(key) is task:
+                self._waiters[key] -= 1
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+            del self._waiters[key]
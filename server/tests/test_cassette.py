@@ -0,0 +1,68 @@
+import asyncio
+import gzip
+
+import httpx
+from fastapi import FastAPI, Request
+
+import api
+import cassette
+
+API_KEY = "pplx-test-secret-key"
+
+
+class Body(httpx.AsyncByteStream):
+    async def __aiter__(self):
+        yield b'{"ok": true}'
+
+
+class Upstream(httpx.AsyncBaseTransport):
+    """Answers like a network transport, with a body that is streamed rather than read up front."""
+
+    async def handle_async_request(self, request):
+        return httpx.Response(200, headers={"Content-Type": "application/json"}, stream=Body())
+
+
+def recording_app():
+    """An app with the cassette middleware whose /query makes one upstream call."""
+    upstream = httpx.AsyncClient(transport=cassette.AsyncTransport(Upstream()))
+    app = FastAPI()
+    app.middleware("http")(api.record_and_replay)
+
+    @app.post("/query")
+    async def query(request: Request):
+        body = await request.json()
+        await upstream.post(
+            "https://perplexity.test/chat/completions",
+            headers={"Authorization": f"Bearer {body['api_key']}"},
+            json={"query": body["query"]},
+        )
+        return {"query": body["query"]}
+
+    return app
+
+
+def test_recorded_query_cassette_holds_no_credentials(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "CASSETTE_MODE", "record")
+    monkeypatch.setattr(api, "CASSETTE_DIR", str(tmp_path))
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=recording_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/query", json={"query": "fed rates", "api_key": API_KEY, "user_id": "user-1"})
+
+    response = asyncio.run(scenario())
+    cassette_id = response.headers[cassette.RESPONSE_HEADER]
+
+    with gzip.open(tmp_path / f"{cassette_id}.jsonl.gz", "rt") as f:
+        recorded = f.read()
+    assert API_KEY not in recorded
+    assert "user-1" not in recorded
+
+    tape = cassette.Cassette.load(str(tmp_path), cassette_id)
+    assert '"query": "fed rates"' in tape.request["body"]
+    assert '"api_key": "[redacted]"' in tape.request["body"]
+    assert len(tape.interactions) == 1
+
+
+def test_non_json_bodies_are_not_stored():
+    assert cassette.redacted_body(b"api_key=pplx-test-secret-key") == "<28 bytes, not JSON>"
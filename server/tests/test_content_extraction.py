@@ -0,0 +1,54 @@
+import asyncio
+from pathlib import Path
+
+import httpx
+from bs4 import BeautifulSoup
+
+import scraper
+from content_extraction import extract_main_text
+
+FIXTURE_DIR = Path(__file__).parent.parent / "benchmarks" / "fixtures" / "html"
+
+PARAGRAPH = "<p>The council voted on Tuesday to expand the program, which officials said would reach every district by spring.</p>"
+
+
+def deeply_nested_page(depth: int) -> str:
+    """An article whose last paragraph sits inside ``depth`` unclosed <section> tags."""
+    return "<html><body><article>" + PARAGRAPH * 5 + "<section>" * depth + PARAGRAPH + "</article></body></html>"
+
+
+def test_article_body_is_extracted_without_boilerplate():
+    soup = BeautifulSoup((FIXTURE_DIR / "standard_article.html").read_bytes(), "html.parser")
+
+    text = extract_main_text(soup)
+
+    assert text is not None
+    assert "\n\n" in text
+    assert "Subscribe" not in text
+
+
+def test_too_little_text_returns_none():
+    soup = BeautifulSoup((FIXTURE_DIR / "minimal_page.html").read_bytes(), "html.parser")
+
+    assert extract_main_text(soup) is None
+
+
+def test_deeply_nested_unclosed_tags():
+    text = extract_main_text(BeautifulSoup(deeply_nested_page(5000), "html.parser"))
+
+    assert text is not None
+    assert text.count("The council voted") == 6
+
+
+def test_scrape_succeeds_on_deeply_nested_pages():
+    page = deeply_nested_page(5000)
+
+    async def scenario():
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, html=page))
+        async with httpx.AsyncClient(transport=transport) as http:
+            return await scraper.scrape_website("https://news.example.com/story", http)
+
+    result = asyncio.run(scenario())
+
+    assert result["success"]
+    assert result["text"].count("The council voted") == 6
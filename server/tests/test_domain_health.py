@@ -0,0 +1,89 @@
+import asyncio
+
+import httpx
+
+import api
+import scraper
+from deadline import deadline_scope
+from domain_health import SERVER_ERROR_BACKOFF_AFTER, DomainHealthStore
+
+URL = "https://www.example.com/story"
+
+
+def test_single_server_error_does_not_back_off():
+    store = DomainHealthStore()
+
+    store.record(URL, 500, 15.0)
+
+    assert not store.is_blocked(URL)
+
+
+def test_repeated_server_errors_back_off():
+    store = DomainHealthStore()
+
+    for _ in range(SERVER_ERROR_BACKOFF_AFTER - 1):
+        store.record(URL, 503, 1.0)
+    assert not store.is_blocked(URL)
+
+    store.record(URL, 503, 1.0)
+    assert store.is_blocked(URL)
+
+
+def test_success_resets_the_failure_count():
+    store = DomainHealthStore()
+
+    for _ in range(SERVER_ERROR_BACKOFF_AFTER - 1):
+        store.record(URL, 500, 1.0)
+    store.record(URL, 200, 1.0)
+    store.record(URL, 500, 1.0)
+
+    assert not store.is_blocked(URL)
+    assert store.get(URL).consecutive_failures == 1
+
+
+def test_blocking_backs_off_at_once():
+    store = DomainHealthStore()
+
+    store.record(URL, 403, 1.0)
+
+    assert store.is_blocked(URL)
+
+
+def timing_out_scrape(budget=None):
+    """Scrape a page whose host never answers, inside a deadline of ``budget`` seconds if given."""
+
+    def handler(request):
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            if budget is None:
+                return await scraper.scrape_website(URL, http)
+            with deadline_scope(budget):
+                return await scraper.scrape_website(URL, http)
+
+    return asyncio.run(scenario())
+
+
+def test_timeouts_cut_short_by_the_deadline_are_not_held_against_the_host(monkeypatch):
+    store = DomainHealthStore()
+    monkeypatch.setattr(api.resources, "domain_health", store)
+
+    for _ in range(SERVER_ERROR_BACKOFF_AFTER + 1):
+        result = timing_out_scrape(budget=2.0)
+        assert result["deadline_timeout"]
+        api.record_scrape_outcome(URL, result, 1.0)
+
+    assert store.get(URL) is None
+    assert not store.is_blocked(URL)
+
+
+def test_timeouts_with_the_full_fetch_timeout_count(monkeypatch):
+    store = DomainHealthStore()
+    monkeypatch.setattr(api.resources, "domain_health", store)
+
+    result = timing_out_scrape()
+    assert not result["deadline_timeout"]
+    api.record_scrape_outcome(URL, result, 15.0)
+
+    assert store.get(URL).consecutive_failures == 1
@@ -0,0 +1,19 @@
+import os
+
+import metrics
+
+WORKER = f'worker="{os.getpid()}"'
+
+
+def test_every_sample_is_labelled_with_the_worker():
+    counter = metrics.Counter("test_worker_events_total", "Events", ["kind"])
+    counter.labels(kind="a b").inc()
+    gauge = metrics.Gauge("test_worker_in_flight", "In flight")
+    gauge.set(2)
+
+    lines = metrics.render().splitlines()
+
+    assert f'test_worker_events_total{{kind="a b",{WORKER}}} 1' in lines
+    assert f"test_worker_in_flight{{{WORKER}}} 2" in lines
+    assert all(WORKER in line for line in lines if not line.startswith("#"))
+
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from perplexity_gateway import CircuitOpenError, PerplexityError, PerplexityGateway
+
+COMPLETION = {"choices": [{"message": {"content": "1. **A headline** https://example.com/a"}}]}
+
+
+def gateway_with(responses):
+    """A gateway whose Perplexity answers with ``responses`` (status codes) in turn."""
+    gateway = PerplexityGateway(
+        "https://perplexity.test/chat/completions",
+        rate_per_second=1000,
+        burst=1000,
+        max_retries=0,
+        breaker_threshold=5,
+        breaker_reset=0.05,
+    )
+    statuses = iter(responses)
+
+    def handler(request):
+        status = next(statuses)
+        return httpx.Response(status, json=COMPLETION if status == 200 else {"error": "upstream"})
+
+    gateway._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return gateway
+
+
+async def call(gateway):
+    return await gateway.chat_completion("test-key", {"model": "sonar", "messages": []}, timeout=5)
+
+
+def test_breaker_opens_after_repeated_server_errors():
+    async def scenario():
+        gateway = gateway_with([503] * 5)
+        for _ in range(5):
+            with pytest.raises(PerplexityError):
+                await call(gateway)
+        with pytest.raises(CircuitOpenError):
+            await call(gateway)
+        return gateway
+
+    gateway = asyncio.run(scenario())
+
+    assert list(gateway.breaker_states().values()) == ["open"]
+    assert gateway.metrics["circuit_rejections"] == 1
+
+
+def test_rate_limited_trial_call_lets_the_next_call_try_again():
+    async def scenario():
+        gateway = gateway_with([503] * 5 + [429, 200])
+        for _ in range(5):
+            with pytest.raises(PerplexityError):
+                await call(gateway)
+        time.sleep(0.06)
+
+        # The half-open trial call is rate limited: no verdict on Perplexity's health
+        with pytest.raises(PerplexityError) as error:
+            await call(gateway)
+        assert not isinstance(error.value, CircuitOpenError)
+        assert list(gateway.breaker_states().values()) == ["half_open"]
+
+        return gateway, await call(gateway)
+
+    gateway, body = asyncio.run(scenario())
+
+    assert body == COMPLETION
+    assert list(gateway.breaker_states().values()) == ["closed"]
+
+
+def test_server_error_on_the_trial_call_reopens_the_breaker():
+    async def scenario():
+        gateway = gateway_with([503] * 6)
+        for _ in range(5):
+            with pytest.raises(PerplexityError):
+                await call(gateway)
+        time.sleep(0.06)
+        with pytest.raises(PerplexityError):
+            await call(gateway)
+        return gateway
+
+    gateway = asyncio.run(scenario())
+
+    assert list(gateway.breaker_states().values()) == ["open"]
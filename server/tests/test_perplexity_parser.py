@@ -0,0 +1,103 @@
+from pathlib import Path
+
+import pytest
+
+from perplexity_parser import parse_articles, split_items
+
+FIXTURE_DIR = Path(__file__).parent.parent / "benchmarks" / "fixtures" / "perplexity"
+
+
+def parse_fixture(name: str):
+    return parse_articles((FIXTURE_DIR / f"{name}.md").read_text(), "test query", "center")
+
+
+def test_numbered_items_with_nested_fields():
+    articles = parse_fixture("numbered_nested")
+
+    assert len(articles) == 5
+    assert articles[0]["title"] == "Senate Passes Landmark Climate Bill After Marathon Session"
+    assert articles[0]["source_name"] == "The Guardian"
+    assert articles[0]["url"] == "https://www.theguardian.com/environment/2025/apr/02/senate-passes-climate-bill"
+    assert articles[0]["snippet"].startswith("The bill commits $370bn")
+    assert articles[0]["domain"] == "theguardian.com"
+    assert articles[0]["political_leaning"] == "center"
+
+
+def test_bold_headers_with_bulleted_fields():
+    articles = parse_fixture("bold_headers_flat_fields")
+
+    assert [article["source_name"] for article in articles] == [
+        "Reuters",
+        "Associated Press",
+        "Bloomberg",
+        "The Wall Street Journal",
+    ]
+    assert articles[1]["title"] == "Powell Signals Patience as Inflation Cools"
+
+
+def test_bulleted_items_with_inline_outlet_links():
+    articles = parse_fixture("inline_links")
+
+    assert len(articles) == 5
+    assert articles[0]["title"] == "Border Crossings Fall to Lowest Level in Years"
+    assert articles[0]["source_name"] == "Fox News"
+    assert articles[0]["snippet"] == "Officials credit new enforcement measures for the decline."
+
+
+def test_headings():
+    articles = parse_fixture("headings")
+
+    assert [article["source_name"] for article in articles] == ["NPR", "Axios", "The Hill"]
+
+
+def test_linked_titles_take_the_outlet_from_the_attribution():
+    articles = parse_fixture("linked_titles")
+
+    assert [article["title"] for article in articles] == [
+        "Fed Cuts Rates Again as Job Growth Slows",
+        "Mortgage Rates Drop to Lowest Level Since 2022",
+        "What the Rate Cut Means for Your Savings Account",
+    ]
+    # The link text is the title; the outlet follows the link, or is the domain
+    assert [article["source_name"] for article in articles] == ["CNN", "The Washington Post", "nbcnews.com"]
+    assert articles[0]["snippet"].startswith("Policymakers lowered")
+
+
+def test_linked_title_urls_are_canonical():
+    articles = parse_fixture("linked_titles")
+
+    assert articles[1]["url"] == "https://www.washingtonpost.com/business/2025/09/18/mortgage-rates-drop/"
+    assert articles[2]["url"] == "https://www.nbcnews.com/business/consumer/rate-cut-savings-accounts-rcna2301"
+
+
+def test_prose_falls_back_to_paragraphs():
+    content = (FIXTURE_DIR / "prose_citations.md").read_text()
+    articles = parse_fixture("prose_citations")
+
+    assert len(split_items(content)) == 3
+    # Each URL is reported once, though the citation list repeats it
+    assert [article["domain"] for article in articles] == ["bbc.com", "aljazeera.com", "cbsnews.com"]
+    assert articles[0]["url"] == "https://www.bbc.com/news/world-middle-east-ceasefire-talks-stall"
+    assert articles[2]["url"] == "https://www.cbsnews.com/news/aid-deliveries-below-need-report/"
+
+
+def test_items_without_a_title_are_named_after_the_query():
+    articles = parse_articles("- https://www.example.com/story", "test query", "left")
+
+    assert articles[0]["title"] == "Article about test query"
+    assert articles[0]["source_name"] == "example.com"
+
+
+@pytest.mark.parametrize(
+    "written",
+    [
+        "See https://www.example.com/story.",
+        "(https://www.example.com/story)",
+        "**https://www.example.com/story**",
+        "<https://www.example.com/story>",
+    ],
+)
+def test_urls_never_end_in_surrounding_punctuation(written):
+    articles = parse_articles(f"- **Some Example Story Title**\n  {written}", "test query", "left")
+
+    assert articles[0]["url"] == "https://www.example.com/story"
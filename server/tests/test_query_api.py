@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import api
+
+CACHED = api.NewsResponse(query="climate", sources=[], statistics={"cached": 1})
+FRESH = api.NewsResponse(query="climate", sources=[], statistics={"fresh": 1})
+
+
+def run_query(monkeypatch, **fields):
+    """Send a /query request with a cached result on hand; returns the body and the pipeline runs."""
+    runs = []
+
+    async def log_query(key, request):
+        pass
+
+    async def cached_response(key, request):
+        return CACHED, 60.0
+
+    async def run_and_cache_query(request, api_key, key):
+        runs.append(key)
+        return FRESH
+
+    monkeypatch.setattr(api, "QUERY_CACHE_TTL_SECONDS", 300)
+    monkeypatch.setattr(api, "log_query", log_query)
+    monkeypatch.setattr(api, "cached_response", cached_response)
+    monkeypatch.setattr(api, "run_and_cache_query", run_and_cache_query)
+    request = api.NewsRequest(query="climate", api_key="test-key", **fields)
+    response = asyncio.run(api.query(request))
+    return json.loads(response.body), runs
+
+
+def test_query_serves_the_cached_result(monkeypatch):
+    body, runs = run_query(monkeypatch)
+
+    assert body["statistics"] == {"cached": 1}
+    assert runs == []
+
+
+def test_non_incremental_query_skips_the_cache_and_refreshes_it(monkeypatch):
+    body, runs = run_query(monkeypatch, incremental=False)
+
+    assert body["statistics"] == {"fresh": 1}
+    assert runs == [api.cache_key(api.normalize_query("climate"), 27)]
+
+
+def test_previous_sources_are_found_under_the_url_they_were_scraped_from(monkeypatch):
+    documents = {
+        "1": {
+            "_id": "1",
+            "title": "Moved story",
+            "url": "https://www.example.com/news/story",
+            "requested_url": "https://example.com/2026/10/story",
+            "source_name": "Example",
+            "political_leaning": "center",
+            "text": "Text.",
+        },
+        "2": {
+            "_id": "2",
+            "title": "Older story",
+            "url": "https://WWW.example.com/older#top",
+            "source_name": "Example",
+            "political_leaning": "center",
+            "text": "Text.",
+        },
+    }
+
+    class QueryCache:
+        async def latest(self, key):
+            return {"source_ids": list(documents)}
+
+    async def load_sources(ids):
+        return documents
+
+    monkeypatch.setattr(api.resources, "query_cache", QueryCache())
+    monkeypatch.setattr(api, "load_sources", load_sources)
+
+    previous = asyncio.run(api.previous_sources("key"))
+
+    assert set(previous) == {"https://example.com/2026/10/story", "https://www.example.com/older"}
+    assert previous["https://example.com/2026/10/story"].url == "https://www.example.com/news/story"
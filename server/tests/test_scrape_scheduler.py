@@ -0,0 +1,46 @@
+import asyncio
+
+from scrape_scheduler import LatencyTracker, ScrapeScheduler
+
+
+def test_censored_latencies_count_only_past_the_threshold():
+    tracker = LatencyTracker(percentile=90, min_samples=10)
+    for _ in range(20):
+        tracker.record(1.0)
+
+    tracker.record_censored(0.2)
+    assert len(tracker.samples) == 20
+
+    for _ in range(5):
+        tracker.record_censored(6.0)
+    assert len(tracker.samples) == 25
+    assert tracker.threshold() == 6.0
+
+
+def test_slow_scrape_launches_the_next_candidate_early_and_is_recorded_when_cancelled():
+    async def scenario():
+        tracker = LatencyTracker(default=0.05)
+        accepted = []
+
+        async def scrape(url):
+            await asyncio.sleep(10 if url.endswith("slow") else 0.01)
+            return {"success": True, "url": url}
+
+        async def on_result(slot, candidate, result):
+            accepted.append(candidate["url"])
+
+        scheduler = ScrapeScheduler(scrape, on_result, ["center"], target=1, surplus=0, concurrency=4, latency=tracker)
+        scheduler.add("center", {"url": "https://example.com/slow"})
+        scheduler.add("center", {"url": "https://example.com/fast"})
+        scheduler.close()
+        await asyncio.wait_for(scheduler.wait(), timeout=2)
+        await asyncio.sleep(0)
+        return scheduler, tracker, accepted
+
+    scheduler, tracker, accepted = asyncio.run(scenario())
+
+    assert accepted == ["https://example.com/fast"]
+    assert scheduler.early_launches == 1
+    assert scheduler.cancelled == 1
+    # The fast scrape, and the slow one cancelled after running past the threshold
+    assert len(tracker.samples) == 2
@@ -0,0 +1,50 @@
+import asyncio
+from types import SimpleNamespace
+
+from scrape_worker import ScrapeWorker
+
+
+class Jobs:
+    """A queue with endless jobs that only finish when ``finish`` is set."""
+
+    def __init__(self):
+        self.claimed = 0
+        self.finish = asyncio.Event()
+
+    async def requeue_expired(self):
+        return 0
+
+    async def claim(self, owner, kinds, lease):
+        self.claimed += 1
+        return {"_id": self.claimed, "payload": {"url": "https://example.com"}}
+
+    async def complete(self, job, owner, result):
+        pass
+
+    async def renew(self, job, owner, lease):
+        return True
+
+
+def test_stop_while_every_slot_is_busy_claims_no_more_jobs():
+    async def scenario():
+        jobs = Jobs()
+        worker = ScrapeWorker(SimpleNamespace(jobs=jobs), concurrency=2)
+
+        async def scrape(job):
+            await jobs.finish.wait()
+            return {"success": True}
+
+        worker._scrape = scrape
+        stop = asyncio.Event()
+        run = asyncio.create_task(worker.run(stop))
+        await asyncio.sleep(0.05)
+        # Both slots are busy and the worker waits for one; stop, then let the jobs finish
+        stop.set()
+        jobs.finish.set()
+        await asyncio.wait_for(run, timeout=2)
+        return jobs, worker
+
+    jobs, worker = asyncio.run(scenario())
+
+    assert jobs.claimed == 2
+    assert worker.completed == 2
@@ -0,0 +1,69 @@
+import asyncio
+
+from bson import ObjectId
+from fastapi import Response
+
+import api
+from text_store import TextStore
+
+SOURCE_ID = ObjectId()
+
+DOCUMENT = {
+    "_id": SOURCE_ID,
+    "url": "https://www.example.com/story",
+    "title": "A story",
+    "text": "The story's text.",
+    "raw_text": "Menu Home The story's text. Footer",
+}
+
+
+class FakeSources:
+    """A sources collection holding one document that applies Mongo projections."""
+
+    def __init__(self):
+        self.projections = []
+
+    async def find_one(self, query, projection=None):
+        self.projections.append(projection)
+        if query["_id"] != SOURCE_ID:
+            return None
+        projection = projection or {}
+        if any(projection.values()):
+            return {name: value for name, value in DOCUMENT.items() if name == "_id" or projection.get(name)}
+        return {name: value for name, value in DOCUMENT.items() if name not in projection}
+
+
+def fetch_source(monkeypatch, fields=None):
+    sources = FakeSources()
+    monkeypatch.setattr(api.resources, "sources_collection", sources)
+    monkeypatch.setattr(api.resources, "text_store", TextStore())
+    source = asyncio.run(api.get_source(str(SOURCE_ID), Response(), fields=fields, if_none_match=None))
+    return source, sources.projections[0]
+
+
+def test_source_leaves_out_raw_text_by_default(monkeypatch):
+    source, _ = fetch_source(monkeypatch)
+
+    assert source["text"] == DOCUMENT["text"]
+    assert "raw_text" not in source
+
+
+def test_source_fields_with_only_unknown_names_return_no_raw_text(monkeypatch):
+    source, projection = fetch_source(monkeypatch, fields="nonexistent, also_missing")
+
+    assert projection == {"nonexistent": 1, "also_missing": 1}
+    assert source == {"_id": str(SOURCE_ID)}
+
+
+def test_source_fields_select_text_and_its_compressed_copy(monkeypatch):
+    source, projection = fetch_source(monkeypatch, fields="title,text")
+
+    assert projection == {"title": 1, "text": 1, "text_z": 1, "duplicate_of": 1}
+    assert source == {"_id": str(SOURCE_ID), "title": DOCUMENT["title"], "text": DOCUMENT["text"]}
+
+
+def test_source_raw_text_when_named(monkeypatch):
+    source, projection = fetch_source(monkeypatch, fields="raw_text")
+
+    assert projection == {"raw_text": 1, "raw_text_z": 1}
+    assert source["raw_text"] == DOCUMENT["raw_text"]
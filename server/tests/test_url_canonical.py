@@ -0,0 +1,34 @@
+import pytest
+
+from url_canonical import canonical_url, page_canonical_url
+
+
+@pytest.mark.parametrize(
+    "written, canonical",
+    [
+        ("https://www.example.com/story.", "https://www.example.com/story"),
+        ("HTTPS://WWW.Example.COM:443/story#comments", "https://www.example.com/story"),
+        ("https://www.example.com/story?utm_source=x&fbclid=y&id=2&page=1", "https://www.example.com/story?id=2&page=1"),
+        ("https://www.example.com/story/amp/", "https://www.example.com/story/"),
+        ("https://www.example.com/amp/story", "https://www.example.com/story"),
+        ("https://www.example.com/story.amp.html", "https://www.example.com/story.html"),
+        ("https://www-example-com.cdn.ampproject.org/c/s/www.example.com/story/amp", "https://www.example.com/story"),
+        ("http://www.example.com:8080/story", "http://www.example.com:8080/story"),
+        ("http://[::1]:8080/x", "http://[::1]:8080/x"),
+        ("http://[2001:DB8::1]/x?utm_medium=y", "http://[2001:db8::1]/x"),
+    ],
+)
+def test_canonical_url(written, canonical):
+    assert canonical_url(written) == canonical
+
+
+def test_scheme_is_kept():
+    assert canonical_url("http://www.example.com/story") == "http://www.example.com/story"
+
+
+def test_rel_canonical_is_followed_only_on_the_same_site():
+    assert page_canonical_url("https://www.example.com/story?ref=home", "/2025/story") == "https://www.example.com/2025/story"
+    assert page_canonical_url("https://m.example.com/story", "https://www.example.com/story") == "https://www.example.com/story"
+    # A syndicated copy stays attributed to the outlet that ran it
+    assert page_canonical_url("https://news.other.com/story", "https://apnews.com/article/1") == "https://news.other.com/story"
+    assert page_canonical_url("https://www.example.com/story", None) == "https://www.example.com/story"
@@ -0,0 +1,284 @@
+"""
+Compressed storage of article text in source documents.
+
+Article bodies (``text``, and ``raw_text`` when kept) are stored as a
+``text_z`` / ``raw_text_z`` subdocument of codec, dictionary id and
+compressed bytes, and only decompressed by the endpoints that return or
+answer from the text. zstd is used with a dictionary trained on stored
+articles, which is what makes short news texts compress well; dictionaries
+are kept in their own collection so every worker can read text compressed
+with any of them. Without the zstandard package text is stored with zlib.
+
+Documents written before compression keep a plain ``text`` field and stay
+readable; ``migrate`` converts them in the background.
+
+Maintenance from the command line:
+    python text_store.py stats      # storage by codec and dictionary
+    python text_store.py train      # train a new dictionary from stored articles
+    python text_store.py migrate    # compress documents still stored as plain text
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSED_FIELDS = ("text", "raw_text")
+
+ZSTD = "zstd"
+ZLIB = "zlib"
+
+ZSTD_LEVEL = 6
+ZLIB_LEVEL = 6
+
+# Dictionary training: enough samples for a useful dictionary, few enough to train in seconds
+DICTIONARY_SIZE = 112 * 1024
+TRAIN_MIN_SAMPLES = 200
+TRAIN_MAX_SAMPLES = 2000
+
+# Documents converted per batch, and the pause between batches to leave MongoDB to live traffic
+MIGRATION_BATCH = 100
+MIGRATION_PAUSE = 0.5
+
+
+def _stored_name(field: str) -> str:
+    return f"{field}_z"
+
+
+class TextStore:
+    """Compresses text fields on write and decompresses them on read."""
+
+    def __init__(self, dictionaries=None, level: int = ZSTD_LEVEL):
+        self._collection = dictionaries
+        self._level = level
+        self._dictionaries: Dict[int, Any] = {}
+        self._compressor = None
+        self._decompressors: Dict[Optional[int], Any] = {}
+        self.active_dictionary: Optional[int] = None
+        self._loaded = False
+
+    @property
+    def codec(self) -> str:
+        return ZSTD if zstandard else ZLIB
+
+    async def load(self) -> None:
+        """Load trained dictionaries once; the newest is used for new text."""
+        if self._loaded or self._collection is None or zstandard is None:
+            self._loaded = True
+            return
+        self._loaded = True
+        try:
+            async for document in self._collection.find({}).sort("created", 1):
+                self._add_dictionary(document["_id"], document["data"])
+            if self.active_dictionary is not None:
+                logger.info(f"Compressing text with dictionary {self.active_dictionary}")
+        except Exception as e:
+            logger.error(f"Error loading text dictionaries: {str(e)}")
+
+    def _add_dictionary(self, dictionary_id: int, data: bytes) -> None:
+        self._dictionaries[dictionary_id] = zstandard.ZstdCompressionDict(data)
+        self.active_dictionary = dictionary_id
+        self._compressor = None
+
+    async def _dictionary(self, dictionary_id: int) -> Any:
+        # Trained by another worker since we loaded
+        if dictionary_id not in self._dictionaries and self._collection is not None:
+            document = await self._collection.find_one({"_id": dictionary_id})
+            if document:
+                self._dictionaries[dictionary_id] = zstandard.ZstdCompressionDict(document["data"])
+        if dictionary_id not in self._dictionaries:
+            raise KeyError(f"Unknown text dictionary {dictionary_id}")
+        return self._dictionaries[dictionary_id]
+
+    def compress(self, text: str) -> Dict[str, Any]:
+        data = text.encode("utf-8")
+        if zstandard is None:
+            return {"codec": ZLIB, "dict": None, "data": zlib.compress(data, ZLIB_LEVEL)}
+        if self._compressor is None:
+            dictionary = self._dictionaries.get(self.active_dictionary)
+            self._compressor = zstandard.ZstdCompressor(level=self._level, dict_data=dictionary)
+        return {"codec": ZSTD, "dict": self.active_dictionary, "data": self._compressor.compress(data)}
+
+    async def decompress(self, stored: Dict[str, Any]) -> str:
+        if stored["codec"] == ZLIB:
+            return zlib.decompress(stored["data"]).decode("utf-8")
+        if zstandard is None:
+            raise RuntimeError("Text is zstd-compressed but the zstandard package is not installed")
+        dictionary_id = stored.get("dict")
+        decompressor = self._decompressors.get(dictionary_id)
+        if decompressor is None:
+            dictionary = await self._dictionary(dictionary_id) if dictionary_id is not None else None
+            decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+            self._decompressors[dictionary_id] = decompressor
+        return decompressor.decompress(stored["data"]).decode("utf-8")
+
+    def pack(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        """A copy of ``document`` to store, with its text fields compressed."""
+        packed = dict(document)
+        for field in COMPRESSED_FIELDS:
+            if isinstance(packed.get(field), str):
+                packed[_stored_name(field)] = self.compress(packed.pop(field))
+        return packed
+
+    async def read(self, document: Dict[str, Any], field: str = "text") -> Optional[str]:
+        """A text field of a stored document, compressed or not."""
+        stored = document.get(_stored_name(field))
+        if stored is None:
+            return document.get(field)
+        return await self.decompress(stored)
+
+    async def unpack(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace compressed fields of a stored document with their text, in place."""
+        for field in COMPRESSED_FIELDS:
+            if _stored_name(field) in document:
+                document[field] = await self.read(document, field)
+                del document[_stored_name(field)]
+        return document
+
+    async def train(self, sources, samples: int = TRAIN_MAX_SAMPLES) -> Optional[int]:
+        """Train and save a dictionary from a sample of stored articles; returns its id."""
+        if zstandard is None or self._collection is None:
+            return None
+        texts: List[bytes] = []
+        pipeline = [
+            {"$match": {"$or": [{"text": {"$type": "string"}}, {"text_z": {"$exists": True}}]}},
+            {"$sample": {"size": samples}},
+            {"$project": {"text": 1, "text_z": 1}},
+        ]
+        async for document in sources.aggregate(pipeline):
+            text = await self.read(document)
+            if text:
+                texts.append(text.encode("utf-8"))
+        if len(texts) < TRAIN_MIN_SAMPLES:
+            logger.info(f"Not training a text dictionary: {len(texts)} articles, need {TRAIN_MIN_SAMPLES}")
+            return None
+
+        dictionary = await asyncio.to_thread(zstandard.train_dictionary, DICTIONARY_SIZE, texts)
+        dictionary_id = dictionary.dict_id()
+        await self._collection.insert_one({
+            "_id": dictionary_id,
+            "data": dictionary.as_bytes(),
+            "samples": len(texts),
+            "created": datetime.now(),
+        })
+        self._add_dictionary(dictionary_id, dictionary.as_bytes())
+        logger.info(f"Trained text dictionary {dictionary_id} from {len(texts)} articles")
+        return dictionary_id
+
+    def _migration_filter(self) -> Dict[str, Any]:
+        plain = [{field: {"$type": "string"}} for field in COMPRESSED_FIELDS]
+        if self.active_dictionary is None:
+            return {"$or": plain}
+        # Text compressed before there was a dictionary is worth redoing once there is one
+        return {"$or": plain + [{"text_z": {"$exists": True}, "text_z.dict": None}]}
+
+    async def migrate(
+        self, sources, batch: int = MIGRATION_BATCH, pause: float = MIGRATION_PAUSE, lease=None
+    ) -> int:
+        """
+        Compress every source document still stored as plain text; returns how many were converted.
+
+        With a ``lease``, it is renewed before each batch and the migration stops if it was lost.
+        """
+        query = self._migration_filter()
+        projection = {name: 1 for field in COMPRESSED_FIELDS for name in (field, _stored_name(field))}
+        # Plain fields go either way: their text moves to the compressed field, or was empty
+        update_unset = {field: "" for field in COMPRESSED_FIELDS}
+        converted = 0
+        while True:
+            if lease is not None and not await lease.acquire():
+                logger.warning("Lost the text migration lease to another worker")
+                break
+            documents = await sources.find(query, projection).to_list(batch)
+            if not documents:
+                break
+            for document in documents:
+                await self.unpack(document)
+                packed = self.pack({field: document[field] for field in COMPRESSED_FIELDS if document.get(field)})
+                update: Dict[str, Any] = {"$unset": update_unset}
+                if packed:
+                    update["$set"] = packed
+                await sources.update_one({"_id": document["_id"]}, update)
+                converted += 1
+            logger.info(f"Compressed text of {converted} source documents so far")
+            await asyncio.sleep(pause)
+        return converted
+
+    async def maintain(self, sources, lease=None) -> None:
+        """
+        Background task: train a first dictionary once there are enough articles, then migrate.
+
+        With several workers, pass a ``lease`` so only the one holding it does the work.
+        """
+        try:
+            if lease is not None and not await lease.acquire():
+                logger.info("Another worker is maintaining source text")
+                return
+            await self.load()
+            if zstandard is not None and self.active_dictionary is None:
+                await self.train(sources)
+            converted = await self.migrate(sources, lease=lease)
+            if converted:
+                logger.info(f"Text migration done: compressed {converted} source documents")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error migrating source text: {str(e)}")
+        finally:
+            if lease is not None:
+                await lease.release()
+
+
+async def _stats(db) -> None:
+    pipeline = [
+        {"$project": {
+            "codec": {"$ifNull": ["$text_z.codec", {"$cond": [{"$eq": [{"$type": "$text"}, "string"]}, "plain", "none"]}]},
+            "dict": "$text_z.dict",
+            "size": {"$bsonSize": "$$ROOT"},
+        }},
+        {"$group": {"_id": {"codec": "$codec", "dict": "$dict"}, "documents": {"$sum": 1}, "bytes": {"$sum": "$size"}}},
+        {"$sort": {"documents": -1}},
+    ]
+    async for row in db.sources.aggregate(pipeline):
+        average = row["bytes"] / row["documents"]
+        print(f"{row['_id'].get('codec', 'none'):<6} dict {row['_id'].get('dict')!s:<12}{row['documents']:>8} documents {average:>10.0f} B average")
+
+
+def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Maintain compressed article text")
+    parser.add_argument("command", choices=["stats", "train", "migrate"])
+    parser.add_argument("--samples", type=int, default=TRAIN_MAX_SAMPLES, help="articles to train a dictionary on")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    load_dotenv()
+    db = AsyncIOMotorClient(os.getenv("MONGODB_URL")).get_default_database()
+    store = TextStore(db.textDictionaries)
+
+    async def run():
+        await store.load()
+        if args.command == "stats":
+            await _stats(db)
+        elif args.command == "train":
+            await store.train(db.sources, args.samples)
+        else:
+            print(f"Compressed {await store.migrate(db.sources)} documents")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
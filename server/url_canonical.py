@@ -0,0 +1,110 @@
+"""
+One spelling per article URL.
+
+Perplexity, and the pages it links to, spell the same article many ways:
+with trailing punctuation, tracking parameters, fragments, an AMP variant
+or an upper case host. Every place that keys on a URL (candidate dedupe, incremental
+reuse, scrape sharing, domain health) uses ``canonical_url`` so those
+spellings meet, and pages that name a ``rel=canonical`` URL on their own
+site are stored under it with ``page_canonical_url``.
+"""
+
+import logging
+import re
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+from bias_index import registrable_domain
+
+logger = logging.getLogger(__name__)
+
+# Punctuation that ends a sentence or markup around a URL, never the URL itself
+TRAILING_PUNCTUATION = ".,;:!?'\"*`>»”’"
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMETERS = {
+    "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "igshid",
+    "mc_cid", "mc_eid", "_ga", "_gl", "ocid", "cmpid", "smid", "taid", "ref_src", "ref_url",
+    "amp", "outputtype",
+}
+TRACKING_PREFIXES = ("utm_",)
+
+# Google's AMP cache: https://www-example-com.cdn.ampproject.org/c/s/www.example.com/path
+# (/c/s/ for https pages, /c/ for http ones)
+AMP_CACHE_PATTERN = re.compile(r"^/[cv]/(?P<secure>s/)?(?P<rest>.+)$")
+# /amp and /amp/ at the end of a path, /amp/ at its start, and article.amp.html
+AMP_PATH_PATTERNS = (
+    (re.compile(r"/amp(/?)$"), r"\1"),
+    (re.compile(r"^/amp/"), "/"),
+    (re.compile(r"\.amp(\.html?)$"), r"\1"),
+)
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def trim_url(url: str) -> str:
+    """``url`` without the punctuation a sentence or markdown left at its end."""
+    return url.rstrip(TRAILING_PUNCTUATION)
+
+
+def canonical_url(url: str) -> str:
+    """
+    The canonical spelling of an article URL.
+
+    Trailing punctuation, tracking parameters and the fragment are dropped,
+    the scheme and host are lowercased and a default port removed,
+    AMP variants and Google AMP cache URLs point at the regular page, and
+    the remaining query parameters are sorted. URLs that don't parse are
+    returned trimmed.
+    """
+    url = trim_url(url.strip())
+    try:
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or "").rstrip(".")
+        port = parts.port
+    except ValueError:
+        return url
+    if scheme not in DEFAULT_PORTS or not host:
+        return url
+
+    path = parts.path
+    if host.endswith(".cdn.ampproject.org"):
+        cached = AMP_CACHE_PATTERN.match(path)
+        if cached:
+            origin_scheme = "https" if cached.group("secure") else "http"
+            return canonical_url(f"{origin_scheme}://{cached.group('rest')}")
+
+    for pattern, replacement in AMP_PATH_PATTERNS:
+        path = pattern.sub(replacement, path)
+    path = path or "/"
+
+    query = [
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name.lower() not in TRACKING_PARAMETERS and not name.lower().startswith(TRACKING_PREFIXES)
+    ]
+
+    # IPv6 literals keep their brackets
+    netloc = f"[{host}]" if ":" in host else host
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{port}"
+    return urlunsplit((scheme, netloc, path, urlencode(sorted(query)), ""))
+
+
+def page_canonical_url(page_url: str, href: Optional[str]) -> str:
+    """
+    The URL a fetched page should be known by.
+
+    ``href`` is the page's ``<link rel="canonical">``, resolved against the
+    URL it was fetched from. It is only followed within the same site:
+    syndicated copies name the original publisher's page as canonical, and
+    the copy has to stay attributed to the outlet that ran it.
+    """
+    page = canonical_url(page_url)
+    if not href:
+        return page
+    declared = canonical_url(urljoin(page_url, href.strip()))
+    if not declared.startswith(("http://", "https://")) or registrable_domain(declared) != registrable_domain(page):
+        return page
+    return declared